@@ -1,61 +1,74 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from strategies import AdaptiveDCARecoveryStrategy
+import engine
+import cache
+import ledger
 
 class Backtester:
-    def __init__(self, df, strategy, budget_usd=1000):
+    def __init__(self, df, strategy, budget_usd=1000, intrabar=False, use_cache=True,
+                 ledger_dir=None, costs=None, invest_fraction=0.5):
         self.df = df
         self.strategy = strategy
+        self.intrabar = intrabar  # fill against each candle's high/low, not just its close
+        self.costs = costs  # costs.CostModel charged on every fill; None trades for free
+        self.invest_fraction = invest_fraction  # share of the budget put in per buy
+        self.cache = cache.ResultCache() if use_cache else None
         self.initial_budget = budget_usd
         self.budget = budget_usd
         self.coin = 0
-        self.trades = []
+        self.ledger = ledger.Ledger(ledger_dir)  # ledger_dir=None keeps trades in memory
         self.final_value = budget_usd
 
     def run(self):
         print("🔄 Starting backtest simulation...\n")
-        for _, row in self.df.iterrows():
-            price = row["close"]
-            date = row["date"]
+        ohlc = engine.ohlcv_arrays(self.df)
+        result = self.simulate(ohlc, self.invest_fraction)
+        dates = self.df["date"].array
+        self.ledger.clear()
+        self.ledger.record(result, ohlc["close"], self.budget)
 
-            # Buying logic
-            if self.strategy.should_buy(price):
-                amount_to_invest = self.budget * 0.5
-                if amount_to_invest > 10:
-                    quantity = amount_to_invest / price
-                    self.coin += quantity
-                    self.budget -= amount_to_invest
-                    self.strategy.on_buy(price, quantity)
-                    self.trades.append((date, "BUY", price))
-                    print(f"[{date}] BUY  | +{quantity:.6f} BTC at ${price:.2f} | USD left: ${self.budget:.2f}")
+        for i, action, price, quantity, budget in zip(
+                result["trade_index"].tolist(), result["trade_action"].tolist(),
+                result["trade_price"].tolist(), result["trade_quantity"].tolist(),
+                result["trade_budget"].tolist()):
+            date = dates[i]
+            label = engine.ACTION_NAMES[action]
+            if action == engine.BUY:
+                print(f"[{date}] BUY  | +{quantity:.6f} BTC at ${price:.2f} | USD left: ${budget:.2f}")
+            else:
+                print(f"[{date}] {label} | -{quantity:.6f} BTC at ${price:.2f} | USD now: ${budget:.2f}")
 
-            # Selling logic
-            elif self.strategy.should_sell(price):
-                proceeds = self.coin * price
-                self.budget += proceeds
-                self.strategy.on_sell()
-                self.trades.append((date, "SELL", price))
-                print(f"[{date}] SELL | -{self.coin:.6f} BTC at ${price:.2f} | USD now: ${self.budget:.2f}")
-                self.coin = 0
+        engine.sync_strategy(self.strategy, result)
+        self.budget = result["budget"]
+        self.coin = result["coin"]
+        self.final_value = result["final_value"]
+        print("\n✅ Simulation complete.\n")
 
-            # Emergency exit
-            elif self.strategy.should_exit(price):
-                proceeds = self.coin * price
-                self.budget += proceeds
-                self.strategy.on_sell()
-                self.trades.append((date, "FORCED EXIT", price))
-                print(f"[{date}] FORCED EXIT | -{self.coin:.6f} BTC at ${price:.2f} | USD now: ${self.budget:.2f}")
-                self.coin = 0
+    def simulate(self, ohlc, invest_fraction):
+        return cache.run_backtest(ohlc, self.strategy, self.budget, invest_fraction, self.intrabar, self.cache,
+                                  self.costs)
 
-        self.final_value = self.budget + self.coin * self.df["close"].iloc[-1]
-        print("\n✅ Simulation complete.\n")
+    @property
+    def trades(self):
+        return self.ledger.trade_list(self.df["date"].array)
 
     def report(self):
         print("====== 📊 BACKTEST SUMMARY ======")
         print(f"Initial budget:   ${self.initial_budget:.2f}")
         print(f"Final value:      ${self.final_value:.2f}")
         print(f"Net profit:       ${self.final_value - self.initial_budget:.2f}")
-        print(f"Trades executed:  {len(self.trades)}")
+        stats = self.ledger.metrics()
+        print(f"Trades executed:  {len(self.ledger)}")
+        if self.costs is not None:
+            print(f"Costs per fill:   {self.costs.fee_rate * 100:.3f}% fee + {self.costs.base_slippage * 100:.3f}% slippage")
+        print(f"Max drawdown:     {self.ledger.max_drawdown() * 100:.1f}%")
+        print(f"DD duration:      {stats['max_drawdown_duration']} bars")
+        print(f"Sharpe:           {stats['sharpe']:.2f}")
+        print(f"Sortino:          {stats['sortino']:.2f}")
+        print(f"Calmar:           {stats['calmar']:.2f}")
+        print(f"Exposure:         {stats['exposure'] * 100:.1f}%")
+        print(f"Turnover:         {stats['turnover']:.1f}x")
+        print(f"Round trips:      {stats['round_trips']} ({stats['win_rate'] * 100:.1f}% won)")
+        print(f"Profit factor:    {stats['profit_factor']:.2f}")
+        print(f"Avg trade:        ${stats['avg_trade']:.2f}")
         print(f"USD balance:      ${self.budget:.2f}")
         print(f"BTC balance:      {self.coin:.6f}")
         print("---------------------------------")
@@ -65,41 +78,37 @@ class Backtester:
         print("=================================\n")
         self.plot_trades()
 
-    def plot_trades(self):
-        df = self.df.copy()
-        df["signal"] = ""
-        for d, action, price in self.trades:
-            match = df["date"] == d
-            df.loc[match, "signal"] = action
-
+    def plot_trades(self, path=None):
+        import matplotlib.pyplot as plt
+        df = self.df
         plt.figure(figsize=(14, 6))
         plt.plot(df["date"], df["close"], label="BTC/USDT Price", color="black", alpha=0.4, zorder=1)
-        buys = df[df["signal"] == "BUY"]
-        sells = df[df["signal"] == "SELL"]
-        exits = df[df["signal"] == "FORCED EXIT"]
-        plt.scatter(buys["date"], buys["close"], marker="^", color="green", label="BUY")
-        plt.scatter(sells["date"], sells["close"], marker="v", color="blue", label="SELL")
-        plt.scatter(exits["date"], exits["close"], marker="x", color="red", label="FORCED EXIT")
+        # Trades are marked at their fill price, which with intrabar fills
+        # is not the candle's close (and includes fees and slippage).
+        for action, color, marker in [(engine.BUY, "green", "^"), (engine.SELL, "blue", "v"), (engine.EXIT, "red", "x")]:
+            dates, prices = self.ledger.points(df["date"].array, action)
+            plt.scatter(dates, prices, marker=marker, color=color, label=engine.ACTION_NAMES[action])
         plt.legend()
         plt.title("Strategy Backtest: Adaptive DCA Recovery")
         plt.xlabel("Date")
         plt.ylabel("Price ($)")
         plt.grid()
         plt.tight_layout()
-        plt.show()
-
-def load_data(filepath="btc_usdt_1y.csv"):
-    df = pd.read_csv(filepath, parse_dates=["date"])
-    df.sort_values("date", inplace=True)
-    return df
+        if path is None:
+            plt.show()
+        else:
+            plt.savefig(path)
+            plt.close()
 
 if __name__ == "__main__":
-    df = load_data()
-    strategy = AdaptiveDCARecoveryStrategy(
-        buy_threshold=0.05,    # Buy again if price dips 5% from last buy
-        sell_threshold=0.10,   # Sell if price is 10% above average buy
-        max_drawdown=0.30      # Force-sell if price drops 30% below avg
-    )
-    backtester = Backtester(df, strategy)
-    backtester.run()
-    backtester.report()
+    import cli
+    cli.show({
+        "data": "btc_usdt_1y.csv",
+        "strategy": "AdaptiveDCARecoveryStrategy",
+        "params": {
+            "buy_threshold": 0.05,    # Buy again if price dips 5% from last buy
+            "sell_threshold": 0.10,   # Sell if price is 10% above average buy
+            "max_drawdown": 0.30      # Force-sell if price drops 30% below avg
+        },
+        "costs": {"spread": 0.0002},
+    }, backtester=Backtester)
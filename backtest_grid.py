@@ -1,48 +1,39 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from strategies import GridStrategy
+import engine
+import cache
+import ledger
 
 class Backtester:
-    def __init__(self, df, strategy, budget_usd=10000):
+    def __init__(self, df, strategy, budget_usd=10000, intrabar=False, use_cache=True,
+                 ledger_dir=None, costs=None, invest_fraction=0.2):
         self.df = df
         self.strategy = strategy
+        self.intrabar = intrabar  # fill against each candle's high/low, not just its close
+        self.costs = costs  # costs.CostModel charged on every fill; None trades for free
+        self.invest_fraction = invest_fraction  # share of the budget put in per buy
+        self.cache = cache.ResultCache() if use_cache else None
         self.initial_budget = budget_usd
         self.budget = budget_usd
         self.coin = 0
-        self.trades = []
+        self.ledger = ledger.Ledger(ledger_dir)  # ledger_dir=None keeps trades in memory
         self.final_value = budget_usd
 
     def run(self):
-        for _, row in self.df.iterrows():
-            price = row["close"]
+        ohlc = engine.ohlcv_arrays(self.df)
+        result = self.simulate(ohlc, self.invest_fraction)
+        self.ledger.clear()
+        self.ledger.record(result, ohlc["close"], self.budget)
+        engine.sync_strategy(self.strategy, result)
+        self.budget = result["budget"]
+        self.coin = result["coin"]
+        self.final_value = result["final_value"]
 
-            # Buy level
-            if self.strategy.should_buy(price):
-                amount = self.budget * 0.2  # Invest 20% per grid step
-                if amount > 10:
-                    quantity = amount / price
-                    self.coin += quantity
-                    self.budget -= amount
-                    self.strategy.on_buy(price, quantity)
-                    self.trades.append((row["date"], "BUY", price))
+    def simulate(self, ohlc, invest_fraction):
+        return cache.run_backtest(ohlc, self.strategy, self.budget, invest_fraction, self.intrabar, self.cache,
+                                  self.costs)
 
-            # Sell level
-            elif self.coin > 0 and self.strategy.should_sell(price):
-                value = self.coin * price
-                self.budget += value
-                self.strategy.on_sell()
-                self.trades.append((row["date"], "SELL", price))
-                self.coin = 0
-
-            # Exit condition
-            elif self.coin > 0 and self.strategy.should_exit(price):
-                value = self.coin * price
-                self.budget += value
-                self.strategy.on_sell()
-                self.trades.append((row["date"], "FORCED EXIT", price))
-                self.coin = 0
-
-        self.final_value = self.budget + self.coin * self.df["close"].iloc[-1]
+    @property
+    def trades(self):
+        return self.ledger.trade_list(self.df["date"].array)
 
     def report(self):
         print("📊 Grid Strategy Backtest Summary")
@@ -50,24 +41,33 @@ class Backtester:
         print(f"Initial budget:  ${self.initial_budget:.2f}")
         print(f"Final value:     ${self.final_value:.2f}")
         print(f"Net profit:      ${self.final_value - self.initial_budget:.2f}")
-        print(f"Trades executed: {len(self.trades)}")
+        stats = self.ledger.metrics()
+        print(f"Trades executed: {len(self.ledger)}")
+        if self.costs is not None:
+            print(f"Costs per fill:  {self.costs.fee_rate * 100:.3f}% fee + {self.costs.base_slippage * 100:.3f}% slippage")
+        print(f"Max drawdown:    {self.ledger.max_drawdown() * 100:.1f}%")
+        print(f"DD duration:     {stats['max_drawdown_duration']} bars")
+        print(f"Sharpe:          {stats['sharpe']:.2f}")
+        print(f"Sortino:         {stats['sortino']:.2f}")
+        print(f"Calmar:          {stats['calmar']:.2f}")
+        print(f"Exposure:        {stats['exposure'] * 100:.1f}%")
+        print(f"Turnover:        {stats['turnover']:.1f}x")
+        print(f"Round trips:     {stats['round_trips']} ({stats['win_rate'] * 100:.1f}% won)")
+        print(f"Profit factor:   {stats['profit_factor']:.2f}")
+        print(f"Avg trade:       ${stats['avg_trade']:.2f}")
         print()
-        for d, action, price in self.trades:
-            pass
-            # print(f"{d} - {action} at ${price:.2f}")
         self.plot_trades()
 
-    def plot_trades(self):
-        df = self.df.copy()
-        df["signal"] = ""
-        for d, action, price in self.trades:
-            df.loc[df["date"] == d, "signal"] = action
-
+    def plot_trades(self, path=None):
+        import matplotlib.pyplot as plt
+        df = self.df
         plt.figure(figsize=(14, 6))
         plt.plot(df["date"], df["close"], label="BTC/USDT Price")
-        for label, color, marker in [("BUY", "green", "^"), ("SELL", "blue", "v"), ("FORCED EXIT", "red", "x")]:
-            points = df[df["signal"] == label]
-            plt.scatter(points["date"], points["close"], marker=marker, color=color, label=label)
+        # Trades are marked at their fill price, which with intrabar fills
+        # is not the candle's close (and includes fees and slippage).
+        for action, color, marker in [(engine.BUY, "green", "^"), (engine.SELL, "blue", "v"), (engine.EXIT, "red", "x")]:
+            dates, prices = self.ledger.points(df["date"].array, action)
+            plt.scatter(dates, prices, marker=marker, color=color, label=engine.ACTION_NAMES[action])
 
         plt.title("Grid Strategy Backtest")
         plt.xlabel("Date")
@@ -75,20 +75,21 @@ class Backtester:
         plt.grid(True)
         plt.legend()
         plt.tight_layout()
-        plt.show()
-
-def load_data(filepath="btc_usdt_5y.csv"):
-    df = pd.read_csv(filepath, parse_dates=["date"])
-    df.sort_values("date", inplace=True)
-    return df
+        if path is None:
+            plt.show()
+        else:
+            plt.savefig(path)
+            plt.close()
 
 if __name__ == "__main__":
-    df = load_data()
-    strategy = GridStrategy(
-        grid_size=0.05,        # 10% price step
-        max_levels=20,          # Unused here but supports config
-        max_drawdown=1.0      # Stop loss
-    )
-    backtester = Backtester(df, strategy)
-    backtester.run()
-    backtester.report()
+    import cli
+    cli.show({
+        "data": "btc_usdt_5y.csv",
+        "strategy": "GridStrategy",
+        "params": {
+            "grid_size": 0.05,        # 10% price step
+            "max_levels": 20,          # Unused here but supports config
+            "max_drawdown": 1.0      # Stop loss
+        },
+        "budget_usd": 10000,
+    }, backtester=Backtester)
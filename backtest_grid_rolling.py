@@ -1,76 +1,70 @@
-import pandas as pd
-from strategies import GridStrategy
-import matplotlib.pyplot as plt
+import engine
+import parallel
+import cache
+import ledger
 
 class RollingGridBacktester:
-    def __init__(self, df, strategy_config, window_days=30, step_days=15, budget_usd=1000):
+    def __init__(self, df, strategy_config, window_days=30, step_days=15, budget_usd=1000, workers=1, incremental=False,
+                 use_cache=True, ledger_dir=None, costs=None):
         self.df = df
         self.strategy_config = strategy_config
         self.window_days = window_days
         self.step_days = step_days
         self.initial_budget = budget_usd
+        self.workers = workers  # None or 0 uses every core
+        self.incremental = incremental  # reuse trades shared by overlapping windows
+        self.costs = costs  # costs.CostModel charged on every fill; None trades for free
+        self.cache = cache.ResultCache() if use_cache else None
+        self.ledger = ledger.Ledger(ledger_dir)  # every window's trades, tagged with its run number
         self.results = []
 
     def run(self):
-        start = 0
-        while start + self.window_days <= len(self.df):
-            sub_df = self.df.iloc[start:start + self.window_days].copy()
-            strategy = GridStrategy(**self.strategy_config)
-            budget = self.initial_budget
-            coin = 0
-            trades = []
+        ohlc = engine.ohlcv_arrays(self.df)
+        close = ohlc["close"]
+        volume = ohlc.get("volume")
+        dates = self.df["date"].array
+        starts = list(range(0, len(self.df) - self.window_days + 1, self.step_days))
+        compute = lambda: parallel.rolling(close, starts, self.window_days, self.strategy_config,
+                                           self.initial_budget, self.workers, self.incremental, self.costs,
+                                           volume)
+        if self.cache is None:
+            runs = compute()
+        else:
+            # Workers and incremental mode do not change the results.
+            key = cache.make_key("rolling", data=cache.fingerprint(close), starts=starts,
+                                 window_days=self.window_days, strategy=self.strategy_config,
+                                 budget=self.initial_budget, **cache.cost_parts(self.costs, close, volume))
+            runs = self.cache.cached(key, compute)
+        stats = engine.window_stats(close, starts, self.window_days)
 
-            for _, row in sub_df.iterrows():
-                price = row["close"]
-
-                if strategy.should_buy(price):
-                    amount = budget * 0.2
-                    if amount > 10:
-                        quantity = amount / price
-                        coin += quantity
-                        budget -= amount
-                        strategy.on_buy(price, quantity)
-                        trades.append((row["date"], "BUY", price))
-
-                elif coin > 0 and strategy.should_sell(price):
-                    value = coin * price
-                    budget += value
-                    strategy.on_sell()
-                    trades.append((row["date"], "SELL", price))
-                    coin = 0
-
-                elif coin > 0 and strategy.should_exit(price):
-                    value = coin * price
-                    budget += value
-                    strategy.on_sell()
-                    trades.append((row["date"], "FORCED EXIT", price))
-                    coin = 0
-
-            final_price = sub_df["close"].iloc[-1]
-            final_value = budget + coin * final_price
+        self.ledger.clear()
+        for k, (start, result) in enumerate(zip(starts, runs)):
+            final_value = result["final_value"]
             net_profit = final_value - self.initial_budget
+            self.ledger.record_trades(result, offset=start, run=k)
             self.results.append({
-                "start": sub_df["date"].iloc[0],
-                "end": sub_df["date"].iloc[-1],
+                "start": dates[start],
+                "end": dates[start + self.window_days - 1],
                 "profit": net_profit,
                 "final_value": final_value,
-                "trades": trades
+                "trades": len(result["trade_index"]),
+                "buy_hold_return": stats["buy_hold_return"][k],
+                "volatility": stats["volatility"][k]
             })
 
-            start += self.step_days
-
     def report(self):
         print(f"📊 Rolling Window Backtest Report ({len(self.results)} runs)")
         print("--------------------------------------------------")
         total_profit = 0
         for i, result in enumerate(self.results):
-            print(f"Run {i+1}: {result['start'].date()} → {result['end'].date()} | Profit: ${result['profit']:.2f} | Trades: {len(result['trades'])}")
+            print(f"Run {i+1}: {result['start'].date()} → {result['end'].date()} | Profit: ${result['profit']:.2f} | Trades: {result['trades']} | Buy & hold: {result['buy_hold_return'] * 100:.1f}%")
             total_profit += result["profit"]
         print("--------------------------------------------------")
         print(f"Total Profit: ${total_profit:.2f}")
         self.plot()
 
-    def plot(self):
+    def plot(self, path=None):
+        import matplotlib.pyplot as plt
         periods = [f"{r['start'].strftime('%Y-%m')}" for r in self.results]
         profits = [r['profit'] for r in self.results]
         plt.figure(figsize=(14, 5))
@@ -80,20 +74,22 @@ class RollingGridBacktester:
         plt.ylabel("Net Profit ($)")
         plt.grid(True)
         plt.tight_layout()
-        plt.show()
-
-def load_data(filepath="btc_usdt_5y.csv"):
-    df = pd.read_csv(filepath, parse_dates=["date"])
-    df.sort_values("date", inplace=True)
-    return df
+        if path is None:
+            plt.show()
+        else:
+            plt.savefig(path)
+            plt.close()
 
 if __name__ == "__main__":
-    df = load_data()
-    strategy_config = {
-        "grid_size": 0.05,
-        "max_levels": 20,
-        "max_drawdown": 0.30
-    }
-    backtester = RollingGridBacktester(df, strategy_config, window_days=30, step_days=15)
-    backtester.run()
-    backtester.report()
+    import cli
+    cli.show({
+        "data": "btc_usdt_5y.csv",
+        "mode": "rolling",
+        "params": {
+            "grid_size": 0.05,
+            "max_levels": 20,
+            "max_drawdown": 0.30
+        },
+        "window_days": 30,
+        "step_days": 15,
+    })
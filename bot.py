@@ -1,54 +1,247 @@
 from binance.client import Client
 import time
-from strategies import AdaptiveDCARecoveryStrategy
+from strategies import AdaptiveDCARecoveryStrategy, BUY, SELL, EXIT
+from telemetry import METRICS
+from costs import NO_COSTS
+from state import BUDGET_KEY
+
+class Account:
+    def __init__(self, cash):
+        self.cash = cash
+
+    def available(self):
+        return self.cash
+
+    def spend(self, amount):
+        self.cash -= amount
+
+    def receive(self, amount, share=1.0):
+        self.cash += amount
+
+    def refund(self, amount):
+        self.cash += amount
+
+    def scale(self, factor):
+        pass  # cash is not tied to the position
+
+    def state(self):
+        return {"cash": self.cash}
+
+    def restore(self, state):
+        self.cash = state["cash"]
 
 class TradingBot:
-    def __init__(self, api_key, api_secret, strategy, symbol="BTCUSDT", budget_usd=1000):
-        self.client = Client(api_key, api_secret)
+    def __init__(self, api_key, api_secret, strategy, symbol="BTCUSDT", budget_usd=1000, client=None, account=None,
+                 executor=None, costs=None, clock=time.monotonic, sleep=time.sleep, interval=60, store=None, key=None,
+                 on_tick=None):
+        self.client = client or Client(api_key, api_secret)
         self.strategy = strategy
         self.symbol = symbol
-        self.budget = budget_usd
+        self.account = account or Account(budget_usd)
+        self.executor = executor
+        # Paper fills are priced by this cost model; live fills carry the
+        # exchange's own fees.
+        self.costs = costs or NO_COSTS
+        # run() polls every interval seconds on this clock; replay.py swaps in
+        # a virtual one.
+        self.clock = clock
+        self.sleep = sleep
+        self.interval = interval
+        self.pending = None
+        self.pending_info = None  # what a restart needs to settle the pending order
         self.coin = 0
         self.running = True
+        # With a state.StateStore every change is journaled under key, and a
+        # restart picks up the position, cash and open order where they were.
+        self.store = store
+        self.key = key or symbol
+        self.on_tick = on_tick  # called with (bot, price) after every step, e.g. events.EventQueue.tick
+        self.restored = False
+        if store is not None and store.get(self.key) is not None:
+            self.restore(store.get(self.key))
+            self.restored = True
+
+    @property
+    def budget(self):
+        return self.account.available()
 
     def get_price(self):
         ticker = self.client.get_symbol_ticker(symbol=self.symbol)
         return float(ticker["price"])
 
-    def run(self, log):
+    def step(self, price, log):
+        self._step(price, log)
+        if self.on_tick is not None:
+            self.on_tick(self, price)
+
+    def _step(self, price, log):
+        if self.pending is not None:
+            return  # wait for the open order to settle before deciding again
+
+        if self.executor is not None:
+            self._step_live(price, log)
+            return
+
+        action = self.strategy.decide(price)
+        if action == BUY:
+            amount_to_invest = self.budget * 0.5
+            if amount_to_invest > 10:
+                fill = self.costs.buy_price(price, amount_to_invest)
+                quantity = amount_to_invest / fill
+                self.coin += quantity
+                self.account.spend(amount_to_invest)
+                self.strategy.on_buy(fill, quantity)
+                self.save()
+                log(f"BUY {self.symbol}: {quantity:.6f} @ ${fill:.2f}")
+
+        elif self.coin > 0 and action == SELL:
+            quantity = self.strategy.sell_quantity(self.coin)
+            fill = self.costs.sell_price(price, quantity * price)
+            value = quantity * fill
+            self.account.receive(value, quantity / self.coin)
+            self.strategy.on_sell()
+            log(f"SELL {self.symbol}: {quantity:.6f} @ ${fill:.2f} = ${value:.2f}")
+            self.coin -= quantity
+            self.save()
+
+        elif self.coin > 0 and action == EXIT:
+            quantity = self.strategy.sell_quantity(self.coin)
+            fill = self.costs.sell_price(price, quantity * price)
+            value = quantity * fill
+            self.account.receive(value, quantity / self.coin)
+            self.strategy.on_sell()
+            log(f"⚠️ FORCED EXIT {self.symbol}: {quantity:.6f} @ ${fill:.2f} = ${value:.2f}")
+            self.coin -= quantity
+            self.save()
+
+    def _step_live(self, price, log):
+        # Orders go to the executor and return immediately; position and
+        # strategy state are only updated from the exchange's fills.
+        action = self.strategy.decide(price)
+        if action == BUY:
+            amount_to_invest = self.budget * 0.5
+            if amount_to_invest > 10:
+                self.account.spend(amount_to_invest)
+                order = self.executor.submit(self.symbol, "BUY", amount_to_invest / price, price,
+                                             on_done=lambda o: self._on_buy_filled(o, amount_to_invest, log))
+                if order is None:
+                    self.account.refund(amount_to_invest)
+                else:
+                    self.pending = order
+                    self.pending_info = self._order_info(order, reserved=amount_to_invest)
+                    self.save()
+                    log(f"BUY {self.symbol}: {order.quantity} submitted @ ~${price:.2f} ({order.client_order_id})")
+
+        elif self.coin > 0 and action in (SELL, EXIT):
+            label = "SELL" if action == SELL else "⚠️ FORCED EXIT"
+            order = self.executor.submit(self.symbol, "SELL", self.strategy.sell_quantity(self.coin), price,
+                                         on_done=lambda o: self._on_sell_filled(o, label, log))
+            if order is not None:
+                self.pending = order
+                self.pending_info = self._order_info(order, label=label)
+                self.save()
+                log(f"{label} {self.symbol}: {order.quantity} submitted @ ~${price:.2f} ({order.client_order_id})")
+
+    def _order_info(self, order, reserved=0.0, label=None):
+        return {"client_order_id": order.client_order_id, "side": order.side, "quantity": str(order.quantity),
+                "reserved": reserved, "label": label}
+
+    def _on_buy_filled(self, order, reserved, log):
+        self.pending = None
+        self.pending_info = None
+        self.account.refund(reserved - order.quote_qty)
+        # A commission taken in the coin itself never reaches the balance.
+        received = order.executed_qty - order.base_commission
+        if received > 0:
+            self.coin += received
+            self.strategy.on_buy(order.quote_qty / received, received)
+        self.save()
+        if received > 0:
+            log(f"BUY {self.symbol}: {received:.6f} filled @ ${order.quote_qty / received:.2f} ({order.status})")
+        else:
+            log(f"BUY {self.symbol}: {order.status}, nothing filled")
+
+    def _on_sell_filled(self, order, label, log):
+        self.pending = None
+        self.pending_info = None
+        # A commission taken in the quote asset is paid out of the proceeds.
+        received = order.quote_qty - order.quote_commission
+        if order.executed_qty > 0:
+            before = self.coin
+            self.account.receive(received, min(1.0, order.executed_qty / before) if before else 1.0)
+            self.coin = max(0.0, before - order.executed_qty)
+            if order.status == "FILLED" or self.coin <= 0:
+                self.strategy.on_sell()
+            else:
+                # Only part of the sell filled: the rest of the position stays
+                # open, shrunk by what was sold.
+                self.strategy.scale(self.coin / before)
+        self.save()
+        if order.executed_qty > 0:
+            log(f"{label} {self.symbol}: {order.executed_qty:.6f} filled @ ${order.avg_price:.2f} "
+                f"= ${received:.2f} ({order.status})")
+        else:
+            log(f"{label} {self.symbol}: {order.status}, nothing filled")
+
+    def state(self):
+        state = {"coin": self.coin, "account": self.account.state(), "strategy": self.strategy.state()}
+        if self.pending is not None:
+            state["pending"] = self.pending_info
+        return state
+
+    def restore(self, state):
+        self.coin = state["coin"]
+        self.account.restore(state["account"])
+        self.strategy.restore(state["strategy"])
+        # An order from before the restart stays pending, which blocks new
+        # decisions until state.reconcile() has settled it.
+        self.pending = self.pending_info = state.get("pending")
+
+    def save(self):
+        if self.store is None:
+            return
+        states = {self.key: self.state()}
+        pool = getattr(self.account, "pool", None)
+        if pool is not None:
+            states[BUDGET_KEY] = pool.state()
+        self.store.record(states)
+
+    def settle(self, order, log):
+        # Applies the final state of an order restored as pending.
+        pending = self.pending_info
+        if pending["side"] == "BUY":
+            self._on_buy_filled(order, pending["reserved"], log)
+        else:
+            self._on_sell_filled(order, pending["label"], log)
+
+    def scale_position(self, factor):
+        self.coin *= factor
+        self.strategy.scale(factor)
+        self.account.scale(factor)
+        self.save()
+
+    def run(self, log, summary_every=10):
         log("🚀 Bot started")
+        next_cycle = self.clock()
+        cycles = 0
         while self.running:
+            METRICS.loop_jitter.observe(max(0.0, self.clock() - next_cycle))
             try:
-                price = self.get_price()
+                with METRICS.price_fetch.time():
+                    price = self.get_price()
                 log(f"Price: ${price:.2f}")
-
-                if self.strategy.should_buy(price):
-                    amount_to_invest = self.budget * 0.5
-                    if amount_to_invest > 10:
-                        quantity = amount_to_invest / price
-                        self.coin += quantity
-                        self.budget -= amount_to_invest
-                        self.strategy.on_buy(price, quantity)
-                        log(f"BUY: {quantity:.6f} @ ${price:.2f}")
-
-                elif self.strategy.should_sell(price):
-                    value = self.coin * price
-                    self.budget += value
-                    self.strategy.on_sell()
-                    log(f"SELL: {self.coin:.6f} @ ${price:.2f} = ${value:.2f}")
-                    self.coin = 0
-
-                elif self.strategy.should_exit(price):
-                    value = self.coin * price
-                    self.budget += value
-                    self.strategy.on_sell()
-                    log(f"⚠️ FORCED EXIT: {self.coin:.6f} @ ${price:.2f} = ${value:.2f}")
-                    self.coin = 0
+                with METRICS.decision.time():
+                    self.step(price, log)
 
             except Exception as e:
+                METRICS.errors.inc(type(e).__name__)
                 log(f"Error: {str(e)}")
 
-            time.sleep(60)  # wait 1 minute before next action
+            cycles += 1
+            if summary_every and cycles % summary_every == 0:
+                log(METRICS.summary())
+            next_cycle = self.clock() + self.interval
+            self.sleep(self.interval)  # wait one interval (1 minute by default) before next action
 
     def stop(self):
         self.running = False
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+import engine
+from costs import NO_COSTS
+from strategies import SmartStrategy, LevelGridStrategy
+
+MAX_BYTES = 512 * 1024 * 1024
+# Bump when the engine's results change, so stale entries stop matching.
+CACHE_VERSION = 4
+
+
+def cache_dir():
+    # BACKTEST_CACHE_DIR when set, else the user's cache directory; never
+    # the directory the scripts happen to be run from.
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("BACKTEST_CACHE_DIR") or os.path.join(base, "trading-bot")
+
+
+def fingerprint(*arrays):
+    # Content hash of the exact candles a run reads, so an edited CSV or a
+    # different date range never hits an old entry.
+    h = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.data)
+    return h.hexdigest()
+
+
+def strategy_config(strategy):
+    # Strategies keep their parameters in the leaf class's __slots__;
+    # underscored slots are runtime state.
+    return {"class": type(strategy).__name__,
+            "params": {name: getattr(strategy, name) for name in type(strategy).__slots__
+                       if not name.startswith("_")}}
+
+
+def cost_parts(costs, close, volume=None):
+    # Key parts for a cost model; the volume column only counts when it is read.
+    costs = costs or NO_COSTS
+    used = costs.liquidity(close, volume) is not None
+    return {"costs": costs.config(), "volume": fingerprint(volume) if used else None}
+
+
+def make_key(kind, **parts):
+    payload = json.dumps({"kind": kind, "version": CACHE_VERSION, **parts}, sort_keys=True,
+                         default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    # One pickle per key. A hit touches the file's mtime, and when the
+    # directory grows past max_bytes the least recently used files go first.
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        self.directory = directory or cache_dir()
+        self.max_bytes = max_bytes
+        self.total = None  # bytes on disk, counted on the first put and kept up to date after
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        if self.total is None:
+            self.total = sum(size for _, size, _ in self.entries())
+        else:
+            self.total += os.path.getsize(path) - replaced
+        # Only a cache over its limit is walked again.
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def cached(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def entries(self):
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".pkl"):
+                    st = os.stat(os.path.join(root, name))
+                    found.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+        return found
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+        self.total = 0
+
+
+def run_backtest(ohlc, strategy, budget_usd, invest_fraction, intrabar=False, cache=None, costs=None):
+    # engine.run_backtest / run_backtest_ohlc behind the cache; cache=None
+    # always computes.
+    costs = costs or NO_COSTS
+    if isinstance(strategy, SmartStrategy):
+        # Indicator strategies decide on closes; intrabar does not apply.
+        intrabar = False
+        data = [ohlc[col] for col in ("high", "low", "close")]
+        compute = lambda: engine.run_backtest_indicators(ohlc, strategy, budget_usd, invest_fraction, costs)
+    elif isinstance(strategy, LevelGridStrategy):
+        intrabar = False
+        data = [ohlc[col] for col in ("high", "low", "close") if col in ohlc]
+        compute = lambda: engine.run_backtest_grid(ohlc, strategy, budget_usd, invest_fraction, costs)
+    elif intrabar:
+        data = [ohlc[col] for col in ("open", "high", "low", "close")]
+        compute = lambda: engine.run_backtest_ohlc(ohlc, strategy, budget_usd, invest_fraction, costs)
+    else:
+        data = [ohlc["close"]]
+        compute = lambda: engine.run_backtest(ohlc["close"], strategy, budget_usd, invest_fraction, costs,
+                                              ohlc.get("volume"))
+    if cache is None:
+        return compute()
+    key = make_key("backtest", data=fingerprint(*data), strategy=strategy_config(strategy),
+                   budget=budget_usd, invest_fraction=invest_fraction, intrabar=intrabar,
+                   **cost_parts(costs, ohlc["close"], ohlc.get("volume")))
+    return cache.cached(key, compute)
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import pandas as pd
+
+# File layout: 16-byte header (magic, version, row count) followed by one
+# contiguous block per column - int64 millisecond timestamps, then float64
+# open, high, low, close and volume. Columns are memory-mapped on open, so
+# loading costs nothing until the pages are touched.
+MAGIC = b"CNDL"
+VERSION = 1
+HEADER_SIZE = 16
+COLUMNS = ["open", "high", "low", "close", "volume"]
+EXTENSION = ".candles"
+
+
+def write_store(path, timestamp, columns):
+    timestamp = np.ascontiguousarray(timestamp, dtype=np.int64)
+    n = len(timestamp)
+    header = MAGIC + np.uint32(VERSION).tobytes() + np.uint64(n).tobytes()
+
+    # Written next to the target and swapped in with one rename, so readers
+    # never see a half-written file.
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(timestamp.tobytes())
+        for col in COLUMNS:
+            values = np.ascontiguousarray(columns[col], dtype=np.float64)
+            if len(values) != n:
+                raise ValueError(f"Column '{col}' has {len(values)} rows, expected {n}")
+            f.write(values.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CandleStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+            raise ValueError(f"{path} is not a candle store")
+        version = int(np.frombuffer(header[4:8], dtype=np.uint32)[0])
+        if version != VERSION:
+            raise ValueError(f"{path} has unsupported candle store version {version}")
+        self.size = int(np.frombuffer(header[8:16], dtype=np.uint64)[0])
+
+        self.timestamp = self._map(0, np.int64)
+        for k, col in enumerate(COLUMNS, start=1):
+            setattr(self, col, self._map(k, np.float64))
+
+    def _map(self, k, dtype):
+        if self.size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=HEADER_SIZE + k * self.size * 8, shape=(self.size,))
+
+    def __len__(self):
+        return self.size
+
+    def index_range(self, start=None, end=None):
+        # Half-open [start, end) date range, found by binary search on the
+        # mapped timestamps, so only a few pages are read.
+        lo = 0 if start is None else int(np.searchsorted(self.timestamp, to_millis(start), side="left"))
+        hi = self.size if end is None else int(np.searchsorted(self.timestamp, to_millis(end), side="left"))
+        return lo, max(lo, hi)
+
+    def arrays(self, start=None, end=None):
+        lo, hi = self.index_range(start, end)
+        data = {col: getattr(self, col)[lo:hi] for col in COLUMNS}
+        data["timestamp"] = self.timestamp[lo:hi]
+        return data
+
+    def to_frame(self, start=None, end=None):
+        data = self.arrays(start, end)
+        df = pd.DataFrame({col: np.array(data[col]) for col in COLUMNS})
+        df.insert(0, "date", pd.to_datetime(np.array(data["timestamp"]), unit="ms"))
+        return df
+
+
+def to_millis(value):
+    return pd.Timestamp(value).value // 1_000_000
+
+
+def frame_to_store(df, path):
+    df = df.sort_values("date")
+    timestamp = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    write_store(path, timestamp, {col: df[col].to_numpy() for col in COLUMNS})
+
+
+def store_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + EXTENSION
+
+
+def csv_to_store(csv_path, store_path=None):
+    store_path = store_path or store_path_for(csv_path)
+    frame_to_store(pd.read_csv(csv_path, parse_dates=["date"]), store_path)
+    return store_path
+
+
+def open_store(filepath):
+    # Accepts a store or a CSV export; the CSV is converted once and the store
+    # next to it is reused until the CSV changes.
+    if filepath.endswith(EXTENSION):
+        return CandleStore(filepath)
+    store_path = store_path_for(filepath)
+    if not os.path.exists(store_path) or os.path.getmtime(store_path) < os.path.getmtime(filepath):
+        csv_to_store(filepath, store_path)
+    return CandleStore(store_path)
+
+
+def load_data(filepath, start=None, end=None):
+    return open_store(filepath).to_frame(start, end)
@@ -0,0 +1,327 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Headless batch runner for every backtest mode. Only the modules a job needs
+# are imported, and matplotlib only when a plot is asked for, so a server
+# run starts without loading any GUI toolkit.
+#
+#   python cli.py jobs.json --out results --plot
+#
+# jobs.json holds one job, a list of jobs, or {"defaults": {...}, "jobs": [...]}:
+#   {"name": "grid", "mode": "single", "symbols": ["BTCUSDT", "ETHUSDT"], "interval": "1d",
+#    "start": "2022-01-01", "end": "2024-01-01", "strategy": "LevelGridStrategy",
+#    "params": {"grid_size": 0.05, "max_levels": 20}, "costs": {"spread": 0.0002}}
+# A job reads "data" (a CSV export or .candles file) or each of "symbols" from
+# the data/ stores export_data.py keeps. Sweeps take "param_grid", whose
+# values are lists or {"start": .., "stop": .., "step": ..} ranges.
+
+MODES = ["single", "rolling", "montecarlo", "sweep"]
+RESULTS_DIR = "results"
+DATA_DIR = "data"
+
+DEFAULTS = {
+    "mode": "single",
+    "strategy": "GridStrategy",
+    "params": {},
+    "budget_usd": 1000,
+    "costs": None,  # costs.CostModel keyword arguments; None trades for free
+    "interval": "1d",
+    "start": None,
+    "end": None,
+    "window_days": 30,
+    "step_days": 15,
+    "simulations": 1000,
+    "seed": None,
+    "method": "history",
+    "plot": False,
+}
+
+
+def load_spec(path):
+    if path == "-":
+        spec = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            spec = json.load(f)
+    if isinstance(spec, dict) and "jobs" in spec:
+        defaults, jobs = spec.get("defaults", {}), spec["jobs"]
+    else:
+        defaults, jobs = {}, spec if isinstance(spec, list) else [spec]
+    return [{**DEFAULTS, **defaults, **job} for job in jobs]
+
+
+REQUIRED = {"sweep": ["param_grid"]}  # keys a mode needs beyond DEFAULTS
+GRID_ONLY = ["rolling", "montecarlo"]  # modes whose window runs are always GridStrategy
+
+
+def expand_job(job, i=0):
+    # The runs of one job, one per symbol, each with a unique name. A job
+    # missing what it needs raises ValueError naming it.
+    name = job.get("name", f"job{i + 1}")
+    if job["mode"] not in MODES:
+        raise ValueError(f"Job '{name}': unknown mode '{job['mode']}', expected one of {MODES}")
+    missing = [key for key in REQUIRED.get(job["mode"], []) if key not in job]
+    if missing:
+        raise ValueError(f"Job '{name}': {job['mode']} needs {', '.join(missing)}")
+    if job["mode"] in GRID_ONLY and job["strategy"] != "GridStrategy":
+        raise ValueError(f"Job '{name}': {job['mode']} only runs GridStrategy, not '{job['strategy']}'")
+    if "data" in job:
+        return [{**job, "name": name}]
+    symbols = job.get("symbols")
+    if not symbols or isinstance(symbols, str):
+        raise ValueError(f"Job '{name}': needs \"data\" (a file) or \"symbols\" (a list of pairs)")
+    from export_data import store_path
+    return [{**job, "name": f"{name}_{symbol}", "symbol": symbol,
+             "data": store_path(job.get("data_dir", DATA_DIR), symbol, job["interval"])} for symbol in symbols]
+
+
+def expand(jobs):
+    return [run for i, job in enumerate(jobs) for run in expand_job(job, i)]
+
+
+def values(spec):
+    if isinstance(spec, dict):
+        return np.round(np.arange(spec["start"], spec["stop"], spec["step"]), 10).tolist()
+    return list(spec)
+
+
+def run_single(job, df, costs, workers, backtester=None):
+    import strategies
+    import backtest_grid
+    cls = backtester or backtest_grid.Backtester
+    options = {"invest_fraction": job["invest_fraction"]} if "invest_fraction" in job else {}
+    runner = cls(df, getattr(strategies, job["strategy"])(**job["params"]), budget_usd=job["budget_usd"],
+                 intrabar=job.get("intrabar", False), costs=costs, **options)
+    runner.run()
+    summary = {"final_value": runner.final_value, "profit": runner.final_value - runner.initial_budget,
+               "trades": len(runner.ledger), "max_drawdown": runner.ledger.max_drawdown(),
+               **runner.ledger.metrics()}
+    return summary, {"trades": runner.ledger.frame(df["date"].array)}, runner
+
+
+def run_rolling(job, df, costs, workers, backtester=None):
+    from backtest_grid_rolling import RollingGridBacktester
+    runner = RollingGridBacktester(df, job["params"], window_days=job["window_days"], step_days=job["step_days"],
+                                   budget_usd=job["budget_usd"], workers=workers, incremental=True, costs=costs)
+    runner.run()
+    windows = pd.DataFrame(runner.results)
+    summary = {"windows": len(windows)}
+    if len(windows):
+        profits = windows["profit"]
+        summary.update(total_profit=profits.sum(), mean=profits.mean(), win_rate=(profits > 0).mean(),
+                       worst=profits.min(), best=profits.max())
+    return summary, {"windows": windows}, runner
+
+
+def run_montecarlo(job, df, costs, workers, backtester=None):
+    from grid_montecarlo_analysis import MonteCarloGridSimulator
+    from paths import tail_stats
+    runner = MonteCarloGridSimulator(df, job["params"], window_days=job["window_days"],
+                                     simulations=job["simulations"], budget_usd=job["budget_usd"], workers=workers,
+                                     seed=job["seed"], method=job["method"], costs=costs)
+    runner.run()
+    profits = np.array(runner.results)
+    summary = {"simulations": len(profits), "mean": profits.mean(), "median": np.median(profits),
+               "win_rate": (profits > 0).mean(), "worst": profits.min(), "best": profits.max(),
+               "tails": tail_stats(profits)}
+    # Synthetic paths also carry per-path risk metrics.
+    summary.update({f"median_{key}": np.median(column) for key, column in runner.metrics.items() if key != "profit"})
+    table = pd.DataFrame(runner.metrics) if runner.metrics else pd.DataFrame({"profit": profits})
+    return summary, {"profits": table}, runner
+
+
+def run_sweep(job, df, costs, workers, backtester=None):
+    # The vectorized sweep (or the batched level-grid kernel) when the
+    # strategy fits it, else one compiled backtest per config.
+    import engine
+    import strategies
+    import sweep
+    cls = getattr(strategies, job["strategy"])
+    grid = {key: values(spec) for key, spec in job["param_grid"].items()}
+    invest_fraction = job.get("invest_fraction", 0.2)
+    ohlc = engine.ohlcv_arrays(df)
+    configs = sweep.expand_grid(grid)
+    try:
+        if not issubclass(cls, strategies.LevelGridStrategy):
+            engine.strategy_params(cls(**configs[0]))
+        method = "batch"
+    except TypeError:
+        method = "per config"
+    if method == "batch":
+        table = sweep.run_sweep(ohlc["close"], grid, cls, job["budget_usd"], invest_fraction, metrics=True,
+                                costs=costs, volume=ohlc.get("volume"), high=ohlc.get("high"),
+                                low=ohlc.get("low"))
+    else:
+        import cache
+        rows = []
+        for config in configs:
+            result = cache.run_backtest(ohlc, cls(**config), job["budget_usd"], invest_fraction, costs=costs)
+            equity = engine.equity_curve(ohlc["close"], result, job["budget_usd"])["equity"]
+            drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) else np.zeros(1)
+            rows.append({**config, "final_value": result["final_value"],
+                         "profit": result["final_value"] - job["budget_usd"],
+                         "trades": len(result["trade_index"]), "max_drawdown_pct": drawdown.max() * 100})
+        table = pd.DataFrame(rows)
+    table = table.sort_values("profit", ascending=False, kind="stable")
+    best = table.head(1).to_dict("records")
+    summary = {"configs": len(table), "sweep": method, "best": best[0] if best else None}
+    return summary, {"sweep": table}, None
+
+
+RUNNERS = {"single": run_single, "rolling": run_rolling, "montecarlo": run_montecarlo, "sweep": run_sweep}
+
+
+def run_job(job, workers=None, backtester=None):
+    # One expanded job: returns its summary, result tables and the runner
+    # object (for its report and plot methods).
+    import engine
+    from candles import load_data
+    started = time.perf_counter()
+    df = load_data(job["data"], job["start"], job["end"])
+    if not len(df):
+        raise ValueError(f"No candles in {job['data']} from {job['start']} to {job['end']}")
+    if job["costs"] is not None:
+        from costs import CostModel
+        costs = CostModel(**job["costs"])
+    else:
+        costs = None
+    summary, tables, runner = RUNNERS[job["mode"]](job, df, costs, workers, backtester)
+    head = {"name": job["name"], "mode": job["mode"], "data": job["data"], "candles": len(df),
+            "start": df["date"].iloc[0], "end": df["date"].iloc[-1],
+            "engine": "numba" if engine.HAVE_NUMBA else "python"}
+    if job["mode"] in ("single", "sweep"):
+        head["strategy"] = job["strategy"]
+    if job["mode"] != "sweep":
+        head["params"] = job["params"]
+    summary = {**head, **summary, "elapsed": time.perf_counter() - started}
+    return summary, tables, runner
+
+
+def plain(value):
+    # JSON-ready copy: numpy scalars and arrays as Python values, dates as
+    # ISO strings, NaN and infinities as null.
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return value
+
+
+def plot(job, tables, runner, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    if job["mode"] == "single":
+        runner.plot_trades(path)
+    elif job["mode"] == "sweep":
+        import matplotlib.pyplot as plt
+        table = tables["sweep"]
+        key = next(iter(job["param_grid"]))
+        plt.figure(figsize=(10, 5))
+        plt.scatter(table[key], table["profit"], s=12)
+        plt.title(f"Parameter Sweep ({len(table)} configs)")
+        plt.xlabel(key)
+        plt.ylabel("Net Profit ($)")
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(path)
+        plt.close()
+    else:
+        runner.plot(path)
+
+
+def write(summary, tables, out_dir):
+    name = summary["name"]
+    files = {}
+    for key, table in tables.items():
+        files[key] = os.path.join(out_dir, f"{name}_{key}.csv")
+        table.to_csv(files[key], index=False)
+    summary["files"] = files
+    with open(os.path.join(out_dir, f"{name}.json"), "w") as f:
+        json.dump(plain(summary), f, indent=2, allow_nan=False)
+
+
+def headline(summary):
+    mode = summary["mode"]
+    if mode == "single":
+        return f"profit ${summary['profit']:.2f}, {summary['trades']} trades"
+    if mode == "rolling":
+        return f"{summary['windows']} windows, total profit ${summary.get('total_profit', 0):.2f}"
+    if mode == "montecarlo":
+        return f"{summary['simulations']} simulations, mean profit ${summary['mean']:.2f}"
+    best = summary["best"]
+    return f"{summary['configs']} configs, best profit ${best['profit']:.2f}" if best else "no configs"
+
+
+def show(job, backtester=None, workers=None):
+    # Interactive run for the backtest scripts: prints the runner's report
+    # and opens its plot window.
+    job = expand([{**DEFAULTS, **job}])[0]
+    summary, tables, runner = run_job(job, workers, backtester)
+    if runner is not None:
+        runner.report()
+        return summary
+    table = tables["sweep"]
+    print(f"📊 {job['strategy']} Parameter Sweep ({len(table)} configs)")
+    print("---------------------------------")
+    columns = list(job["param_grid"]) + ["final_value", "profit", "trades", "max_drawdown_pct"]
+    print(table[columns].head(20).to_string(index=False))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run backtest jobs from a JSON spec without a display.")
+    parser.add_argument("spec", help="JSON job spec file, or - for stdin")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for the result files")
+    parser.add_argument("--plot", action="store_true", help="save a PNG chart of every run")
+    parser.add_argument("--workers", type=int, default=None, help="processes for rolling and Monte Carlo runs "
+                                                                  "(default: every core)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    index = []
+    failed = 0
+    runs = []
+    for i, job in enumerate(load_spec(args.spec)):
+        try:
+            runs.extend(expand_job(job, i))
+        except Exception as e:
+            # A broken job is reported and skipped; the rest still run.
+            failed += 1
+            name = job.get("name", f"job{i + 1}")
+            index.append({"name": name, "mode": job["mode"], "error": repr(e)})
+            print(f"❌ {e}")
+    total = len(runs) + failed
+    for job in runs:
+        try:
+            summary, tables, runner = run_job(job, args.workers)
+            if args.plot or job["plot"]:
+                summary["plot"] = os.path.join(args.out, f"{job['name']}.png")
+                plot(job, tables, runner, summary["plot"])
+            write(summary, tables, args.out)
+            index.append(plain(summary))
+            print(f"✅ {job['name']}: {job['mode']} | {headline(summary)} ({summary['elapsed']:.1f}s)")
+        except Exception as e:
+            failed += 1
+            index.append({"name": job["name"], "mode": job["mode"], "error": repr(e)})
+            print(f"❌ {job['name']}: {e!r}")
+    with open(os.path.join(args.out, "results.json"), "w") as f:
+        json.dump(index, f, indent=2, allow_nan=False)
+    print(f"📁 {total - failed}/{total} runs written to {args.out}/")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
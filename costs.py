@@ -0,0 +1,80 @@
+import numpy as np
+
+# Binance spot (30-day volume in USD, maker fee, taker fee) for VIP 0-3.
+# Check the current schedule before relying on the upper tiers.
+SPOT_TIERS = [
+    (0, 0.0010, 0.0010),
+    (1_000_000, 0.0009, 0.0010),
+    (5_000_000, 0.0008, 0.0010),
+    (20_000_000, 0.00042, 0.0006),
+]
+BNB_DISCOUNT = 0.25  # fees paid in BNB
+
+
+class CostModel:
+    # Fees and slippage charged on every fill, folded into an all-in price:
+    # a buy pays price * (1 + slippage) / (1 - fee) per coin it ends up with
+    # and a sell receives price * (1 - slippage) * (1 - fee), so price times
+    # quantity of a recorded trade is the cash that actually moved. The fee
+    # tier is picked once from monthly_volume_usd, which keeps every rate a
+    # scalar the kernels and the vectorized sweep can apply per fill.
+    def __init__(self, tiers=SPOT_TIERS, monthly_volume_usd=0, maker=False, bnb_discount=False, spread=0.0,
+                 slippage=0.0, impact=0.0):
+        self.tiers = [tuple(tier) for tier in tiers]
+        self.monthly_volume_usd = monthly_volume_usd
+        self.maker = maker  # resting limit orders pay the maker fee
+        self.bnb_discount = bnb_discount
+        self.spread = spread  # bid-ask spread as a fraction of price; each fill crosses half
+        self.slippage = slippage  # fixed extra fraction per fill
+        # Square-root impact: slippage grows by impact * sqrt(order notional /
+        # the bar's quote volume), with the volume taken from the candles.
+        self.impact = impact
+
+    @property
+    def fee_rate(self):
+        maker_fee, taker_fee = self.tiers[0][1:]
+        for threshold, m, t in self.tiers:
+            if self.monthly_volume_usd >= threshold:
+                maker_fee, taker_fee = m, t
+        fee = maker_fee if self.maker else taker_fee
+        return fee * (1.0 - BNB_DISCOUNT) if self.bnb_discount else fee
+
+    @property
+    def base_slippage(self):
+        return self.spread / 2.0 + self.slippage
+
+    def slippage_rate(self, notional, liquidity=None):
+        # Works on scalars and arrays alike; bars without volume get no impact.
+        if liquidity is None or not self.impact:
+            return self.base_slippage
+        liquidity = np.asarray(liquidity, dtype=np.float64)
+        share = np.divide(notional, liquidity, out=np.zeros(np.broadcast(notional, liquidity).shape),
+                          where=liquidity > 0)
+        return self.base_slippage + self.impact * np.sqrt(share)
+
+    def buy_price(self, price, notional, liquidity=None):
+        return price * (1.0 + self.slippage_rate(notional, liquidity)) / (1.0 - self.fee_rate)
+
+    def sell_price(self, price, notional, liquidity=None):
+        return price * (1.0 - self.slippage_rate(notional, liquidity)) * (1.0 - self.fee_rate)
+
+    def liquidity(self, close, volume=None):
+        # Per-bar quote volume for the impact term, or None when unused.
+        if not self.impact or volume is None:
+            return None
+        return np.asarray(volume, dtype=np.float64) * np.asarray(close, dtype=np.float64)
+
+    def kernel_args(self, close, volume=None):
+        # Scalars plus per-bar quote volume as the engine kernels take them.
+        liquidity = self.liquidity(close, volume)
+        if liquidity is None:
+            return float(self.fee_rate), float(self.base_slippage), 0.0, np.zeros(0)
+        return float(self.fee_rate), float(self.base_slippage), float(self.impact), np.ascontiguousarray(liquidity)
+
+    def config(self):
+        return {"tiers": self.tiers, "monthly_volume_usd": self.monthly_volume_usd, "maker": self.maker,
+                "bnb_discount": self.bnb_discount, "spread": self.spread, "slippage": self.slippage,
+                "impact": self.impact}
+
+
+NO_COSTS = CostModel(tiers=[(0, 0.0, 0.0)])
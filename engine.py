@@ -0,0 +1,841 @@
+import numpy as np
+from strategies import (PositionState, SmartStrategy, LevelGridStrategy, SPACINGS, HOLD, BUY, SELL, EXIT,
+                        grid_step, grid_levels, grid_signal, grid_add_lot, grid_remove_lots)
+from costs import NO_COSTS
+import indicators
+
+# numba is optional: with it the kernel is compiled, without it the same
+# kernel runs as plain Python over lists, which is still far cheaper than
+# building a pandas Series per candle with iterrows().
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+MIN_ORDER_USD = 10
+
+ACTION_NAMES = {BUY: "BUY", SELL: "SELL", EXIT: "FORCED EXIT"}
+
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+@njit(cache=True)
+def _slippage(slippage, impact, notional, liquidity, i):
+    if impact > 0.0 and liquidity[i] > 0.0:
+        return slippage + impact * (notional / liquidity[i]) ** 0.5
+    return slippage
+
+
+@njit(cache=True)
+def _buy_price(price, notional, fee, slippage, impact, liquidity, i):
+    # All-in prices as costs.CostModel defines them; with no costs they are
+    # the price itself.
+    return price * (1.0 + _slippage(slippage, impact, notional, liquidity, i)) / (1.0 - fee)
+
+
+@njit(cache=True)
+def _sell_price(price, notional, fee, slippage, impact, liquidity, i):
+    return price * (1.0 - _slippage(slippage, impact, notional, liquidity, i)) * (1.0 - fee)
+
+
+@njit(cache=True)
+def _kernel(close, buy_step, sell_step, max_drawdown, invest_fraction, budget, fee, slippage, impact, liquidity,
+            out_index, out_action, out_price, out_quantity, out_budget):
+    # Same state machine as the strategy classes: a position is open once
+    # the first buy went through and is closed again by a sell or exit.
+    coin = 0.0
+    invested = 0.0
+    quantity = 0.0
+    last_buy = 0.0
+    holding = False
+    n_trades = 0
+
+    for i in range(len(close)):
+        price = close[i]
+        fill = price
+        action = HOLD
+
+        if not holding or (last_buy - price) / last_buy >= buy_step:
+            amount = budget * invest_fraction
+            if amount > MIN_ORDER_USD:
+                fill = _buy_price(price, amount, fee, slippage, impact, liquidity, i)
+                qty = amount / fill
+                coin += qty
+                budget -= amount
+                last_buy = fill
+                quantity += qty
+                invested += fill * qty
+                holding = True
+                action = BUY
+
+        else:
+            avg_price = invested / quantity
+            if (price - avg_price) / avg_price >= sell_step:
+                action = SELL
+            elif (avg_price - price) / avg_price >= max_drawdown:
+                action = EXIT
+
+        if action == HOLD:
+            continue
+
+        if action != BUY:
+            qty = coin
+            fill = _sell_price(price, coin * price, fee, slippage, impact, liquidity, i)
+            budget += coin * fill
+            coin = 0.0
+            invested = 0.0
+            quantity = 0.0
+            holding = False
+
+        out_index[n_trades] = i
+        out_action[n_trades] = action
+        out_price[n_trades] = fill
+        out_quantity[n_trades] = qty
+        out_budget[n_trades] = budget
+        n_trades += 1
+
+    return n_trades, budget, coin
+
+
+def ohlcv_arrays(df):
+    return {
+        col: np.ascontiguousarray(df[col].to_numpy(dtype=np.float64))
+        for col in OHLCV_COLUMNS if col in df
+    }
+
+
+def strategy_params(strategy):
+    # The kernels replay PositionState.decide, so a strategy with its own
+    # decide (SmartStrategy) needs its own kernel.
+    if isinstance(strategy, PositionState) and type(strategy).decide is PositionState.decide:
+        return strategy.buy_step, strategy.sell_step, strategy.max_drawdown
+    raise TypeError(f"Unsupported strategy for the fast engine: {type(strategy).__name__}")
+
+
+def run_backtest(close, strategy, budget_usd, invest_fraction, costs=None, volume=None):
+    # costs is a costs.CostModel; volume is only read for its impact term.
+    buy_step, sell_step, max_drawdown = strategy_params(strategy)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    n = len(close)
+    fee, slippage, impact, liquidity = (costs or NO_COSTS).kernel_args(close, volume)
+
+    out_index = np.empty(n, dtype=np.int64)
+    out_action = np.empty(n, dtype=np.int8)
+    out_price = np.empty(n, dtype=np.float64)
+    out_quantity = np.empty(n, dtype=np.float64)
+    out_budget = np.empty(n, dtype=np.float64)
+
+    prices = close if HAVE_NUMBA else close.tolist()
+    n_trades, budget, coin = _kernel(
+        prices, float(buy_step), float(sell_step), float(max_drawdown),
+        float(invest_fraction), float(budget_usd), fee, slippage, impact,
+        liquidity if HAVE_NUMBA else liquidity.tolist(),
+        out_index, out_action, out_price, out_quantity, out_budget,
+    )
+
+    final_price = close[-1] if n else 0.0
+    return {
+        "budget": budget,
+        "coin": coin,
+        "final_value": budget + coin * final_price,
+        "trade_index": out_index[:n_trades],
+        "trade_action": out_action[:n_trades],
+        "trade_price": out_price[:n_trades],
+        "trade_quantity": out_quantity[:n_trades],
+        "trade_budget": out_budget[:n_trades],
+    }
+
+
+@njit(cache=True)
+def _ohlc_kernel(open_, high, low, close, buy_step, sell_step, max_drawdown, invest_fraction, budget,
+                 fee, slippage, impact, liquidity, out_index, out_action, out_price, out_quantity, out_budget):
+    # Each candle is walked as open -> low -> high -> close when it closed up
+    # and open -> high -> low -> close otherwise. Falling legs fill every buy
+    # level they cross, one after another, and the drawdown stop; rising legs
+    # fill the take-profit level. Orders fill at their level, or at the open
+    # when the candle gapped through it. A closed position is re-entered
+    # straight away, on the same bar at the price it was sold at, and the
+    # rest of the bar's path can fill again; only a position closed on the
+    # open waits for the next bar's open. The close-only loop instead buys
+    # again on the next close, so intrabar runs hold more and trade more
+    # often. Costs only change the recorded all-in price, never where on the
+    # bar a fill happened. Returns -1 when the output arrays are too small.
+    coin = 0.0
+    invested = 0.0
+    quantity = 0.0
+    last_buy = 0.0
+    holding = False
+    n_trades = 0
+    capacity = len(out_index)
+    path = np.empty(4)
+
+    for i in range(len(close)):
+        path[0] = open_[i]
+        if close[i] >= open_[i]:
+            path[1] = low[i]
+            path[2] = high[i]
+        else:
+            path[1] = high[i]
+            path[2] = low[i]
+        path[3] = close[i]
+        cur = open_[i]
+        can_buy = True
+        closed_at_open = False
+
+        for leg in range(4):
+            b = path[leg]
+            # On the open any level already passed fills. Later a stop or
+            # target must lie strictly ahead of the current price, so a zero
+            # step cannot close and reopen at the same price forever.
+            gap = leg == 0
+            while True:
+                action = HOLD
+                fill = cur
+                if not holding:
+                    if can_buy and not closed_at_open:
+                        action = BUY
+                else:
+                    avg_price = invested / quantity
+                    if b <= cur:
+                        buy_level = last_buy * (1.0 - buy_step) if can_buy else -np.inf
+                        exit_level = avg_price * (1.0 - max_drawdown)
+                        if buy_level >= b and buy_level >= exit_level:
+                            action = BUY
+                            fill = min(buy_level, cur)
+                        elif exit_level >= b and (gap or exit_level < cur):
+                            action = EXIT
+                            fill = min(exit_level, cur)
+                    if action == HOLD and b >= cur:
+                        level = avg_price * (1.0 + sell_step)
+                        if level <= b and (gap or level > cur):
+                            action = SELL
+                            fill = max(level, cur)
+
+                if action == HOLD:
+                    break
+
+                if action == BUY:
+                    amount = budget * invest_fraction
+                    if amount <= MIN_ORDER_USD:
+                        can_buy = False
+                        continue
+                    paid = _buy_price(fill, amount, fee, slippage, impact, liquidity, i)
+                    qty = amount / paid
+                    coin += qty
+                    budget -= amount
+                    last_buy = paid
+                    quantity += qty
+                    invested += paid * qty
+                    holding = True
+                else:
+                    qty = coin
+                    paid = _sell_price(fill, coin * fill, fee, slippage, impact, liquidity, i)
+                    budget += coin * paid
+                    coin = 0.0
+                    invested = 0.0
+                    quantity = 0.0
+                    holding = False
+                    can_buy = True
+                    # Closed on the open: stay out for the rest of the bar.
+                    closed_at_open = gap
+                cur = fill
+
+                if n_trades == capacity:
+                    return -1, budget, coin
+                out_index[n_trades] = i
+                out_action[n_trades] = action
+                out_price[n_trades] = paid
+                out_quantity[n_trades] = qty
+                out_budget[n_trades] = budget
+                n_trades += 1
+            cur = b
+
+    return n_trades, budget, coin
+
+
+def run_backtest_ohlc(ohlc, strategy, budget_usd, invest_fraction, costs=None):
+    # Intrabar fills from open/high/low/close arrays (see ohlcv_arrays); the
+    # result has the same layout as run_backtest, with possibly several
+    # trades on one candle.
+    buy_step, sell_step, max_drawdown = strategy_params(strategy)
+    columns = [np.ascontiguousarray(ohlc[col], dtype=np.float64) for col in ("open", "high", "low", "close")]
+    close = columns[3]
+    n = len(close)
+    prices = columns if HAVE_NUMBA else [col.tolist() for col in columns]
+    fee, slippage, impact, liquidity = (costs or NO_COSTS).kernel_args(close, ohlc.get("volume"))
+    if not HAVE_NUMBA:
+        liquidity = liquidity.tolist()
+
+    capacity = 4 * n + 64
+    while True:
+        out_index = np.empty(capacity, dtype=np.int64)
+        out_action = np.empty(capacity, dtype=np.int8)
+        out_price = np.empty(capacity, dtype=np.float64)
+        out_quantity = np.empty(capacity, dtype=np.float64)
+        out_budget = np.empty(capacity, dtype=np.float64)
+        n_trades, budget, coin = _ohlc_kernel(
+            *prices, float(buy_step), float(sell_step), float(max_drawdown),
+            float(invest_fraction), float(budget_usd), fee, slippage, impact, liquidity,
+            out_index, out_action, out_price, out_quantity, out_budget,
+        )
+        if n_trades >= 0:
+            break
+        capacity *= 2
+
+    final_price = close[-1] if n else 0.0
+    return {
+        "budget": budget,
+        "coin": coin,
+        "final_value": budget + coin * final_price,
+        "trade_index": out_index[:n_trades],
+        "trade_action": out_action[:n_trades],
+        "trade_price": out_price[:n_trades],
+        "trade_quantity": out_quantity[:n_trades],
+        "trade_budget": out_budget[:n_trades],
+    }
+
+
+@njit(cache=True)
+def _indicator_kernel(close, ready, rsi, atr, bb_upper, bb_lower, rsi_buy, rsi_sell, atr_step, min_profit,
+                      max_drawdown, invest_fraction, budget, fee, slippage, impact, liquidity,
+                      out_index, out_action, out_price, out_quantity, out_budget):
+    # Same rules as SmartStrategy.signal, decided on each candle's close with
+    # the indicators of that candle.
+    coin = 0.0
+    invested = 0.0
+    quantity = 0.0
+    last_buy = 0.0
+    holding = False
+    n_trades = 0
+
+    for i in range(len(close)):
+        if not ready[i]:
+            continue
+        price = close[i]
+        fill = price
+        action = HOLD
+
+        if (not holding and (rsi[i] <= rsi_buy or price <= bb_lower[i])) or (
+                holding and price <= last_buy - atr_step * atr[i]):
+            amount = budget * invest_fraction
+            if amount > MIN_ORDER_USD:
+                fill = _buy_price(price, amount, fee, slippage, impact, liquidity, i)
+                qty = amount / fill
+                coin += qty
+                budget -= amount
+                last_buy = fill
+                quantity += qty
+                invested += fill * qty
+                holding = True
+                action = BUY
+
+        elif holding:
+            avg_price = invested / quantity
+            if (price - avg_price) / avg_price >= min_profit and (rsi[i] >= rsi_sell or price >= bb_upper[i]):
+                action = SELL
+            elif (avg_price - price) / avg_price >= max_drawdown:
+                action = EXIT
+
+        if action == HOLD:
+            continue
+
+        if action != BUY:
+            qty = coin
+            fill = _sell_price(price, coin * price, fee, slippage, impact, liquidity, i)
+            budget += coin * fill
+            coin = 0.0
+            invested = 0.0
+            quantity = 0.0
+            holding = False
+
+        out_index[n_trades] = i
+        out_action[n_trades] = action
+        out_price[n_trades] = fill
+        out_quantity[n_trades] = qty
+        out_budget[n_trades] = budget
+        n_trades += 1
+
+    return n_trades, budget, coin
+
+
+def run_backtest_indicators(ohlc, strategy, budget_usd, invest_fraction, costs=None):
+    # SmartStrategy over high/low/close arrays: indicators in one batch pass,
+    # then the rules in one compiled loop. Same result layout as run_backtest.
+    close = np.ascontiguousarray(ohlc["close"], dtype=np.float64)
+    n = len(close)
+    values = indicators.compute(ohlc, **strategy.periods)
+    ready = ~np.isnan(np.column_stack([values[name] for name in indicators.NAMES])).any(axis=1) if n \
+        else np.zeros(0, dtype=np.bool_)
+    fee, slippage, impact, liquidity = (costs or NO_COSTS).kernel_args(close, ohlc.get("volume"))
+
+    out_index = np.empty(n, dtype=np.int64)
+    out_action = np.empty(n, dtype=np.int8)
+    out_price = np.empty(n, dtype=np.float64)
+    out_quantity = np.empty(n, dtype=np.float64)
+    out_budget = np.empty(n, dtype=np.float64)
+
+    n_trades, budget, coin = _indicator_kernel(
+        close, ready, values["rsi"], values["atr"], values["bb_upper"], values["bb_lower"],
+        float(strategy.rsi_buy), float(strategy.rsi_sell), float(strategy.atr_step), float(strategy.min_profit),
+        float(strategy.max_drawdown), float(invest_fraction), float(budget_usd), fee, slippage, impact, liquidity,
+        out_index, out_action, out_price, out_quantity, out_budget,
+    )
+
+    final_price = close[-1] if n else 0.0
+    return {
+        "budget": budget,
+        "coin": coin,
+        "final_value": budget + coin * final_price,
+        "trade_index": out_index[:n_trades],
+        "trade_action": out_action[:n_trades],
+        "trade_price": out_price[:n_trades],
+        "trade_quantity": out_quantity[:n_trades],
+        "trade_budget": out_budget[:n_trades],
+    }
+
+
+@njit(cache=True)
+def _grid_kernel(close, atr, volatility, grid_size, max_levels, max_drawdown, spacing, width, invest_fraction,
+                 budget, fee, slippage, impact, liquidity, record, out_index, out_action, out_price, out_quantity,
+                 out_budget, out_level, equity, in_market, stats, levels, held, lot_qty, lot_cost):
+    # LevelGridStrategy.signal on each close through the same level
+    # functions. record=False only counts trades (run_grid_batch); out_level
+    # holds the level a BUY filled and the highest level a SELL or EXIT
+    # closed, so the lots can be matched up again later. stats
+    # collects traded notional, per-lot profit/loss, wins, closed lots and
+    # the worst drawdown, and equity/in_market (when not empty) the value
+    # and whether any lot is open after every bar. Returns the trade count, cash, coin and open lot count, with the
+    # open lots left in held/lot_qty/lot_cost.
+    coin = 0.0
+    n_held = 0
+    quantity = 0.0
+    invested = 0.0
+    n_trades = 0
+    peak = budget
+
+    for i in range(len(close)):
+        price = close[i]
+        if n_held == 0:
+            step, arithmetic = grid_step(spacing, grid_size, width, atr[i], volatility[i])
+            grid_levels(levels, price, step, arithmetic)
+        action, arg = grid_signal(levels, held, n_held, price, quantity, invested, max_drawdown)
+
+        fill = price
+        qty = 0.0
+        level = arg
+        if action == BUY:
+            amount = budget * invest_fraction
+            if amount > MIN_ORDER_USD:
+                fill = _buy_price(price, amount, fee, slippage, impact, liquidity, i)
+                qty = amount / fill
+                coin += qty
+                budget -= amount
+                n_held = grid_add_lot(held, lot_qty, lot_cost, n_held, arg, qty, fill * qty)
+                stats[0] += amount
+            else:
+                action = HOLD
+        elif action != HOLD:
+            level = held[arg - 1]
+            qty = coin
+            if arg < n_held:
+                qty = 0.0
+                for t in range(arg):
+                    qty += lot_qty[t]
+                qty = min(qty, coin)
+            fill = _sell_price(price, qty * price, fee, slippage, impact, liquidity, i)
+            for t in range(arg):
+                pnl = lot_qty[t] * fill - lot_cost[t]
+                if pnl > 0.0:
+                    stats[1] += pnl
+                    stats[3] += 1.0
+                else:
+                    stats[2] -= pnl
+                stats[4] += 1.0
+            budget += qty * fill
+            coin = 0.0 if arg >= n_held else coin - qty
+            n_held = grid_remove_lots(held, lot_qty, lot_cost, n_held, arg)
+            stats[0] += qty * fill
+
+        if action != HOLD:
+            quantity = 0.0
+            invested = 0.0
+            for t in range(n_held):
+                quantity += lot_qty[t]
+                invested += lot_cost[t]
+            if record:
+                out_index[n_trades] = i
+                out_action[n_trades] = action
+                out_price[n_trades] = fill
+                out_quantity[n_trades] = qty
+                out_budget[n_trades] = budget
+                out_level[n_trades] = level
+            n_trades += 1
+
+        value = budget + coin * price
+        peak = max(peak, value)
+        stats[5] = max(stats[5], (peak - value) / peak)
+        if len(equity):
+            equity[i] = value
+            in_market[i] = n_held > 0
+
+    return n_trades, budget, coin, n_held
+
+
+def _grid_inputs(ohlc, strategy):
+    # Close plus the ATR and volatility columns the spacing reads (NaN when
+    # it does not read them). Without high/low the ATR uses closes only.
+    close = np.ascontiguousarray(ohlc["close"], dtype=np.float64)
+    if strategy.spacing == "fixed":
+        nan = np.full(len(close), np.nan)
+        return close, nan, nan
+    values = indicators.compute({"high": ohlc.get("high", close), "low": ohlc.get("low", close), "close": close},
+                                **strategy.periods)
+    return close, values["atr"], values["volatility"]
+
+
+def _grid_args(strategy):
+    return (float(strategy.grid_size), int(strategy.max_levels), float(strategy.max_drawdown),
+            SPACINGS[strategy.spacing], float(strategy.width))
+
+
+def _grid_buffers(max_levels):
+    return (np.zeros(max_levels + 1), np.zeros(max_levels, dtype=np.int64), np.zeros(max_levels),
+            np.zeros(max_levels))
+
+
+def run_backtest_grid(ohlc, strategy, budget_usd, invest_fraction, costs=None):
+    # LevelGridStrategy over candle arrays, deciding on closes. Same result
+    # layout as run_backtest, except that a SELL sells only the lots that
+    # reached their level, "trade_level" holds each trade's level (see
+    # performance.trade_metrics) and "strategy_state" the grid as it ended.
+    close, atr, volatility = _grid_inputs(ohlc, strategy)
+    n = len(close)
+    fee, slippage, impact, liquidity = (costs or NO_COSTS).kernel_args(close, ohlc.get("volume"))
+    out_index = np.empty(n, dtype=np.int64)
+    out_action = np.empty(n, dtype=np.int8)
+    out_price = np.empty(n, dtype=np.float64)
+    out_quantity = np.empty(n, dtype=np.float64)
+    out_budget = np.empty(n, dtype=np.float64)
+    out_level = np.empty(n, dtype=np.int64)
+    levels, held, lot_qty, lot_cost = _grid_buffers(strategy.max_levels)
+
+    n_trades, budget, coin, n_held = _grid_kernel(
+        close, atr, volatility, *_grid_args(strategy), float(invest_fraction), float(budget_usd),
+        fee, slippage, impact, liquidity, True, out_index, out_action, out_price, out_quantity, out_budget,
+        out_level, np.zeros(0), np.zeros(0, dtype=np.bool_), np.zeros(6), levels, held, lot_qty, lot_cost,
+    )
+
+    quantity = float(lot_qty[:n_held].sum())
+    buys = out_action[:n_trades] == BUY
+    final_price = close[-1] if n else 0.0
+    return {
+        "budget": budget,
+        "coin": coin,
+        "final_value": budget + coin * final_price,
+        "trade_index": out_index[:n_trades],
+        "trade_action": out_action[:n_trades],
+        "trade_price": out_price[:n_trades],
+        "trade_quantity": out_quantity[:n_trades],
+        "trade_budget": out_budget[:n_trades],
+        "trade_level": out_level[:n_trades],
+        "strategy_state": {
+            "last_buy_price": float(out_price[:n_trades][buys][-1]) if n_held else None,
+            "total_invested": float(lot_cost[:n_held].sum()),
+            "total_quantity": quantity,
+            "buy_count": n_held,
+            "levels": levels.tolist(),
+            "lots": list(zip(held[:n_held].tolist(), lot_qty[:n_held].tolist(), lot_cost[:n_held].tolist())),
+        },
+    }
+
+
+def run_grid_batch(ohlc, strategies, budget_usd, invest_fraction, costs=None, record_equity=False):
+    # Many LevelGridStrategy configs over one series, each a compiled run
+    # that keeps only its totals. The result has the keys of
+    # sweep.simulate_vectors, so sweeps and performance.py take it as is.
+    n = len(strategies)
+    close = np.ascontiguousarray(ohlc["close"], dtype=np.float64)
+    fee, slippage, impact, liquidity = (costs or NO_COSTS).kernel_args(close, ohlc.get("volume"))
+    no_trades = [np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)] + [np.empty(0)] * 3 + \
+        [np.empty(0, dtype=np.int64)]
+    final_value = np.zeros(n)
+    trades = np.zeros(n, dtype=np.int64)
+    stats = np.zeros((n, 6))
+    equity = np.zeros((n, len(close) if record_equity else 0))
+    in_market = np.zeros(equity.shape, dtype=np.bool_)
+    inputs = {}
+    for k, strategy in enumerate(strategies):
+        # Configs that read the same indicators share one batch pass.
+        key = (strategy.spacing != "fixed", tuple(sorted(strategy.periods.items())))
+        if key not in inputs:
+            inputs[key] = _grid_inputs(ohlc, strategy)
+        n_trades, budget, coin, _ = _grid_kernel(
+            *inputs[key], *_grid_args(strategy), float(invest_fraction), float(budget_usd),
+            fee, slippage, impact, liquidity, False, *no_trades, equity[k], in_market[k], stats[k],
+            *_grid_buffers(strategy.max_levels),
+        )
+        final_value[k] = budget + coin * (close[-1] if len(close) else 0.0)
+        trades[k] = n_trades
+
+    run = {
+        "final_value": final_value,
+        "trades": trades,
+        "max_drawdown": stats[:, 5],
+        "traded_notional": stats[:, 0],
+        "gross_profit": stats[:, 1],
+        "gross_loss": stats[:, 2],
+        "round_trips": stats[:, 4].astype(np.int64),
+        "wins": stats[:, 3].astype(np.int64),
+    }
+    if record_equity:
+        run["equity"] = equity
+        run["in_market"] = in_market
+    return run
+
+
+def trade_list(result, dates, offset=0):
+    return [
+        (dates[offset + i], ACTION_NAMES[a], p)
+        for i, a, p in zip(result["trade_index"].tolist(),
+                           result["trade_action"].tolist(),
+                           result["trade_price"].tolist())
+    ]
+
+
+def sync_strategy(strategy, result):
+    # Leave the strategy object in the state the row-by-row loop would have:
+    # replay the buys of the position that is still open at the end.
+    if "strategy_state" in result:
+        strategy.restore(result["strategy_state"])
+        return
+    strategy.reset()
+    actions = result["trade_action"]
+    closes = np.flatnonzero(actions != BUY)
+    start = closes[-1] + 1 if len(closes) else 0
+    for price, qty in zip(result["trade_price"][start:].tolist(),
+                          result["trade_quantity"][start:].tolist()):
+        strategy.on_buy(price, qty)
+
+
+@njit(cache=True)
+def _rolling_kernel(close, starts, window_days, buy_step, sell_step, max_drawdown, invest_fraction,
+                    budget0, fee, slippage, action, trade_qty, flat, st_budget, st_coin, st_invested, st_quantity,
+                    st_last_buy, attempt, ok_min, fail_max, out_offset, out_budget, out_coin,
+                    out_index, out_action, out_price, out_quantity, out_trade_budget):
+    # Per-bar arrays are indexed by global bar and hold the state after that
+    # bar for the window that last covered it. Once a window and the previous
+    # one are both flat after the same bar, the rest of the previous window is
+    # this window's future scaled by the budget ratio, as long as every
+    # minimum-order check on that stretch comes out the same. Only the bars
+    # before that point and past the previous window's end are simulated.
+    # Fees and fixed slippage keep that scaling exact; size-dependent impact
+    # would not, so run_rolling does not use this kernel with it.
+    no_volume = np.zeros(0)
+    n_trades = 0
+    prev_end = -1
+    for k in range(len(starts)):
+        start = starts[k]
+        end = start + window_days
+        if start >= prev_end:
+            prev_end = -1
+
+        budget = budget0
+        coin = 0.0
+        invested = 0.0
+        quantity = 0.0
+        last_buy = 0.0
+        holding = False
+        synced = False
+
+        t = start
+        while t < end:
+            price = close[t]
+            prev_flat = t < prev_end and flat[t]
+            prev_budget = st_budget[t]
+
+            act = HOLD
+            qty = 0.0
+            attempt[t] = -1.0
+            if not holding or (last_buy - price) / last_buy >= buy_step:
+                amount = budget * invest_fraction
+                attempt[t] = amount
+                if amount > MIN_ORDER_USD:
+                    fill = _buy_price(price, amount, fee, slippage, 0.0, no_volume, t)
+                    qty = amount / fill
+                    coin += qty
+                    budget -= amount
+                    last_buy = fill
+                    quantity += qty
+                    invested += fill * qty
+                    holding = True
+                    act = BUY
+            else:
+                avg_price = invested / quantity
+                if (price - avg_price) / avg_price >= sell_step:
+                    act = SELL
+                elif (avg_price - price) / avg_price >= max_drawdown:
+                    act = EXIT
+                if act != HOLD:
+                    qty = coin
+                    budget += coin * _sell_price(price, 0.0, fee, slippage, 0.0, no_volume, t)
+                    coin = 0.0
+                    invested = 0.0
+                    quantity = 0.0
+                    holding = False
+
+            action[t] = act
+            trade_qty[t] = qty
+            flat[t] = not holding
+            st_budget[t] = budget
+            st_coin[t] = coin
+            st_invested[t] = invested
+            st_quantity[t] = quantity
+            st_last_buy[t] = last_buy
+            t += 1
+
+            if not synced and prev_flat and not holding and t < prev_end:
+                scale = budget / prev_budget
+                if scale * ok_min[t] > MIN_ORDER_USD and scale * fail_max[t] <= MIN_ORDER_USD:
+                    synced = True
+                    for u in range(t, prev_end):
+                        st_budget[u] *= scale
+                        st_coin[u] *= scale
+                        st_invested[u] *= scale
+                        st_quantity[u] *= scale
+                        trade_qty[u] *= scale
+                        attempt[u] *= scale
+                    u = prev_end - 1
+                    budget = st_budget[u]
+                    coin = st_coin[u]
+                    invested = st_invested[u]
+                    quantity = st_quantity[u]
+                    last_buy = st_last_buy[u]
+                    holding = not flat[u]
+                    t = prev_end
+
+        # Minimum-order outcomes the next window has to reproduce to sync.
+        if k + 1 < len(starts):
+            low = np.inf
+            high = -np.inf
+            for u in range(end - 1, max(start, starts[k + 1]) - 1, -1):
+                if action[u] == BUY:
+                    low = min(low, attempt[u])
+                elif attempt[u] > 0.0:
+                    high = max(high, attempt[u])
+                ok_min[u] = low
+                fail_max[u] = high
+
+        out_offset[k] = n_trades
+        out_budget[k] = budget
+        out_coin[k] = coin
+        for u in range(start, end):
+            if action[u] != HOLD:
+                out_index[n_trades] = u - start
+                out_action[n_trades] = action[u]
+                if action[u] == BUY:
+                    out_price[n_trades] = _buy_price(close[u], 0.0, fee, slippage, 0.0, no_volume, u)
+                else:
+                    out_price[n_trades] = _sell_price(close[u], 0.0, fee, slippage, 0.0, no_volume, u)
+                out_quantity[n_trades] = trade_qty[u]
+                out_trade_budget[n_trades] = st_budget[u]
+                n_trades += 1
+        prev_end = end
+
+    out_offset[len(starts)] = n_trades
+    return n_trades
+
+
+def run_rolling(close, starts, window_days, strategy, budget_usd, invest_fraction, costs=None, volume=None):
+    # Same windows as calling run_backtest on each slice, but overlapping
+    # windows reuse the previous window's trades, so most bars are simulated
+    # once instead of once per window covering them. Values agree with the
+    # per-window runs up to floating-point rounding.
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    costs = costs or NO_COSTS
+
+    if not HAVE_NUMBA or costs.liquidity(close, volume) is not None:
+        # Interpreted, the bookkeeping costs more than re-simulating saves.
+        return [run_backtest(close[s:s + window_days], strategy, budget_usd, invest_fraction, costs,
+                             None if volume is None else volume[s:s + window_days]) for s in starts]
+
+    buy_step, sell_step, max_drawdown = strategy_params(strategy)
+    n = len(close)
+    n_windows = len(starts)
+    capacity = n_windows * window_days
+
+    bars = [np.zeros(n) for _ in range(9)]
+    action = np.zeros(n, dtype=np.int8)
+    flat = np.zeros(n, dtype=np.bool_)
+    out = [np.zeros(n_windows + 1, dtype=np.int64), np.zeros(n_windows), np.zeros(n_windows),
+           np.zeros(capacity, dtype=np.int64), np.zeros(capacity, dtype=np.int8),
+           np.zeros(capacity), np.zeros(capacity), np.zeros(capacity)]
+    trade_qty, st_budget, st_coin, st_invested, st_quantity, st_last_buy, attempt, ok_min, fail_max = bars
+    n_trades = _rolling_kernel(
+        close, np.asarray(starts, dtype=np.int64), window_days, float(buy_step), float(sell_step),
+        float(max_drawdown), float(invest_fraction), float(budget_usd), float(costs.fee_rate),
+        float(costs.base_slippage), action, trade_qty, flat, st_budget, st_coin,
+        st_invested, st_quantity, st_last_buy, attempt, ok_min, fail_max, *out,
+    )
+    offset, budget, coin = out[:3]
+    index, actions, price, quantity, trade_budget = (o[:n_trades] for o in out[3:])
+
+    results = []
+    for k, start in enumerate(starts):
+        a, b = offset[k], offset[k + 1]
+        results.append({
+            "budget": budget[k],
+            "coin": coin[k],
+            "final_value": budget[k] + coin[k] * close[start + window_days - 1],
+            "trade_index": index[a:b],
+            "trade_action": actions[a:b],
+            "trade_price": price[a:b],
+            "trade_quantity": quantity[a:b],
+            "trade_budget": trade_budget[a:b],
+        })
+    return results
+
+
+def window_stats(close, starts, window_days):
+    # Prefix sums over log returns give every window's statistics in O(1).
+    close = np.asarray(close, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = starts + window_days - 1
+    log_ret = np.diff(np.log(close))
+    csum = np.concatenate(([0.0], np.cumsum(log_ret)))
+    csum_sq = np.concatenate(([0.0], np.cumsum(log_ret * log_ret)))
+    count = np.maximum(ends - starts, 1)
+    total = csum[ends] - csum[starts]
+    mean = total / count
+    var = np.maximum((csum_sq[ends] - csum_sq[starts]) / count - mean * mean, 0.0)
+    return {
+        "buy_hold_return": np.expm1(total),
+        "volatility": np.sqrt(var),
+    }
+
+
+def equity_curve(close, result, budget_usd):
+    # Cash, coin and marked-to-market equity after every bar, rebuilt from
+    # the trade arrays. When one bar has several trades the last one counts.
+    # A sell that leaves coin (a grid selling some of its lots) records the
+    # quantity it sold.
+    close = np.asarray(close, dtype=np.float64)
+    index = result["trade_index"]
+    coin_after = np.empty(len(index))
+    coin = 0.0
+    for k, (action, qty) in enumerate(zip(result["trade_action"].tolist(), result["trade_quantity"].tolist())):
+        coin = coin + qty if action == BUY else max(coin - qty, 0.0)
+        coin_after[k] = coin
+    if not len(index):
+        cash = np.full(len(close), float(budget_usd))
+        return {"cash": cash, "coin": np.zeros(len(close)), "equity": cash}
+    last = np.searchsorted(index, np.arange(len(close)), side="right") - 1
+    has_trade = last >= 0
+    cash = np.where(has_trade, result["trade_budget"][last], budget_usd)
+    coin = np.where(has_trade, coin_after[last], 0.0)
+    return {"cash": cash, "coin": coin, "equity": cash + coin * close}
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+QUEUE_SIZE = 10000
+CHART_POINTS = 2000
+
+
+class EventQueue:
+    # Hands events from bot threads to the GUI thread. put() never blocks:
+    # when the GUI falls behind the oldest events are dropped (and counted)
+    # rather than stalling trading or growing without limit. The GUI drains
+    # it on a timer, a batch at a time.
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.events = deque(maxlen=maxsize)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, event):
+        with self.lock:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+
+    def drain(self, limit=None):
+        with self.lock:
+            n = len(self.events) if limit is None else min(limit, len(self.events))
+            return [self.events.popleft() for _ in range(n)]
+
+    def __len__(self):
+        return len(self.events)
+
+    def log(self, message):
+        # A bot log callback; stamped when logged, not when shown.
+        self.put(("log", time.time(), message))
+
+    def tick(self, bot, price):
+        # A TradingBot on_tick callback.
+        self.put(("tick", time.time(), bot.key, bot.symbol, price, bot.coin))
+
+
+def coalesce(events):
+    # Splits a drained batch into log lines and the latest tick of each bot.
+    lines = []
+    ticks = {}
+    for event in events:
+        if event[0] == "log":
+            lines.append((event[1], event[2]))
+        else:
+            ticks[event[2]] = event
+    return lines, list(ticks.values())
+
+
+class Series:
+    # Chart points held in a fixed amount of memory. When the buffer is full
+    # every pair of points is merged into one, halving the resolution, and
+    # later points are merged stride at a time to match, so a chart of many
+    # days still draws max_points points. A merged point is the last time
+    # and value of its group; low and high keep the group's range so short
+    # spikes stay visible.
+    def __init__(self, max_points=CHART_POINTS):
+        self.max_points = max_points - max_points % 2
+        self.t = np.empty(self.max_points)
+        self.value = np.empty(self.max_points)
+        self.low = np.empty(self.max_points)
+        self.high = np.empty(self.max_points)
+        self.size = 0
+        self.stride = 1
+        self.pending = 0  # points merged into the open group so far
+
+    def append(self, t, value):
+        if self.pending:
+            i = self.size - 1
+            self.t[i] = t
+            self.value[i] = value
+            self.low[i] = min(self.low[i], value)
+            self.high[i] = max(self.high[i], value)
+        else:
+            if self.size == self.max_points:
+                self._halve()
+            i = self.size
+            self.t[i] = t
+            self.value[i] = self.low[i] = self.high[i] = value
+            self.size += 1
+        self.pending = (self.pending + 1) % self.stride
+
+    def _halve(self):
+        half = self.size // 2
+        self.t[:half] = self.t[1:self.size:2]
+        self.value[:half] = self.value[1:self.size:2]
+        self.low[:half] = np.minimum(self.low[0:self.size:2], self.low[1:self.size:2])
+        self.high[:half] = np.maximum(self.high[0:self.size:2], self.high[1:self.size:2])
+        self.size = half
+        self.stride *= 2
+
+    def __len__(self):
+        return self.size
+
+    def arrays(self):
+        n = self.size
+        return self.t[:n], self.value[:n], self.low[:n], self.high[:n]
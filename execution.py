@@ -0,0 +1,305 @@
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from decimal import Decimal, ROUND_DOWN
+import websockets
+from telemetry import METRICS
+
+USER_STREAM_URL = "wss://stream.binance.com:9443/ws"
+FINAL_STATUSES = {"FILLED", "CANCELED", "REJECTED", "EXPIRED", "EXPIRED_IN_MATCH"}
+ORDER_NOT_FOUND = -2013  # Binance error code for an unknown order id
+STATUS_UNKNOWN = -1007  # Binance timed out on its side; the order may or may not exist
+LOOKUP_DELAYS = [1, 2, 5, 10, 30, 60]  # seconds between lookups of an unconfirmed order; the last repeats
+LOOKUPS_NOT_FOUND = 3  # an order still unknown after this many lookups was never placed
+
+
+def rejected(error):
+    # Only a 4xx answer from Binance itself says the order was not placed.
+    # Timeouts, dropped connections and 5xx answers leave it unknown.
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and status < 500 and getattr(error, "code", None) != STATUS_UNKNOWN
+
+
+class SymbolFilters:
+    def __init__(self, step_size="0.00000001", min_qty="0", tick_size="0.00000001", min_notional="0",
+                 base_asset=None, quote_asset=None):
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.step_size = Decimal(step_size)
+        self.min_qty = Decimal(min_qty)
+        self.tick_size = Decimal(tick_size)
+        self.min_notional = Decimal(min_notional)
+
+    @classmethod
+    def from_info(cls, info):
+        kwargs = {"base_asset": info.get("baseAsset"), "quote_asset": info.get("quoteAsset")}
+        for f in info.get("filters", []):
+            if f["filterType"] == "LOT_SIZE":
+                kwargs["step_size"] = f["stepSize"]
+                kwargs["min_qty"] = f["minQty"]
+            elif f["filterType"] == "PRICE_FILTER":
+                kwargs["tick_size"] = f["tickSize"]
+            elif f["filterType"] in ("MIN_NOTIONAL", "NOTIONAL"):
+                kwargs["min_notional"] = f["minNotional"]
+        return cls(**kwargs)
+
+    def quantity(self, quantity):
+        # Always rounds down, so an order never exceeds the cash reserved for it.
+        q = Decimal(str(quantity))
+        return (q / self.step_size).to_integral_value(rounding=ROUND_DOWN) * self.step_size
+
+    def price(self, price):
+        p = Decimal(str(price))
+        return (p / self.tick_size).to_integral_value(rounding=ROUND_DOWN) * self.tick_size
+
+    def accepts(self, quantity, price):
+        return quantity > 0 and quantity >= self.min_qty and quantity * Decimal(str(price)) >= self.min_notional
+
+
+class ExchangeInfo:
+    # One exchangeInfo request covers every symbol. The executor refreshes it
+    # in the background; lookups only hit the network for unknown symbols.
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self.symbols = {}
+
+    def refresh(self):
+        info = self.client.get_exchange_info()
+        self.symbols = {s["symbol"]: SymbolFilters.from_info(s) for s in info["symbols"]}
+
+    def filters(self, symbol):
+        if symbol not in self.symbols:
+            self.refresh()
+        return self.symbols[symbol]
+
+
+class Order:
+    def __init__(self, client_order_id, symbol, side, quantity, price=None, on_done=None, base_asset=None,
+                 quote_asset=None):
+        self.client_order_id = client_order_id
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.on_done = on_done
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.status = "NEW"
+        self.executed_qty = 0.0
+        self.quote_qty = 0.0
+        self.commissions = {}  # trade id -> (asset, commission) charged in the base or quote asset
+        self.error = None
+        self.done = False
+
+    @property
+    def avg_price(self):
+        return self.quote_qty / self.executed_qty if self.executed_qty else None
+
+    @property
+    def base_commission(self):
+        return self._commission(self.base_asset)
+
+    @property
+    def quote_commission(self):
+        return self._commission(self.quote_asset)
+
+    def _commission(self, asset):
+        return sum(amount for a, amount in self.commissions.values() if a == asset)
+
+    def add_commission(self, trade_id, amount, asset):
+        # Fills arrive in both the REST response and the user stream; keyed
+        # by trade id, each is counted once.
+        if asset is not None and asset in (self.base_asset, self.quote_asset):
+            self.commissions[trade_id] = (asset, float(amount))
+
+
+class OrderExecutor:
+    # Orders are queued by the synchronous strategy code and sent from a
+    # background task, so a decision never waits on the exchange. Fills are
+    # taken from the user-data stream; the REST acknowledgement is applied
+    # too, and both only ever move cumulative fill totals forward.
+    def __init__(self, client, user_stream_url=USER_STREAM_URL, max_in_flight=10, keepalive=1800,
+                 exchange_info=None):
+        self.client = client
+        self.user_stream_url = user_stream_url
+        self.max_in_flight = max_in_flight
+        self.keepalive = keepalive
+        self.exchange_info = exchange_info or ExchangeInfo(client)
+        self.orders = {}
+        self.prefix = uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        self.queue = None
+        self.tasks = []
+        self.in_flight = set()
+
+    async def start(self, log=print):
+        await asyncio.to_thread(self.exchange_info.refresh)
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._sender(log)),
+                      asyncio.create_task(self._user_stream(log)),
+                      asyncio.create_task(self._refresh_exchange_info())]
+
+    async def stop(self):
+        tasks = self.tasks + list(self.in_flight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, symbol, side, quantity, reference_price, limit_price=None, on_done=None):
+        # Must be called on the executor's event loop. Without limit_price a
+        # market order is sent; reference_price is only used for the notional
+        # check. Returns None when the rounded order would be rejected by the
+        # exchange filters.
+        filters = self.exchange_info.filters(symbol)
+        qty = filters.quantity(quantity)
+        if limit_price is not None:
+            limit_price = filters.price(limit_price)
+        if not filters.accepts(qty, limit_price if limit_price is not None else reference_price):
+            return None
+
+        order = Order(f"bot-{self.prefix}-{next(self.counter)}", symbol, side, qty, limit_price, on_done,
+                      filters.base_asset, filters.quote_asset)
+        self.orders[order.client_order_id] = order
+        self.queue.put_nowait(order)
+        return order
+
+    async def _sender(self, log):
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        async def send(order):
+            async with slots:
+                await self._send(order, log)
+
+        while True:
+            # Everything queued since the last wake-up goes out together.
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            for order in batch:
+                self._track(send(order))
+
+    def _track(self, coro):
+        # Tasks stop() has to cancel.
+        task = asyncio.create_task(coro)
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def _refresh_exchange_info(self):
+        while True:
+            await asyncio.sleep(self.exchange_info.ttl)
+            try:
+                await asyncio.to_thread(self.exchange_info.refresh)
+            except Exception as e:
+                METRICS.errors.inc(type(e).__name__)
+
+    async def _send(self, order, log):
+        params = {
+            "symbol": order.symbol,
+            "side": order.side,
+            "quantity": format(order.quantity, "f"),
+            "newClientOrderId": order.client_order_id,
+            "newOrderRespType": "FULL",
+        }
+        if order.price is None:
+            params["type"] = "MARKET"
+        else:
+            params.update(type="LIMIT", timeInForce="GTC", price=format(order.price, "f"))
+
+        start = time.perf_counter()
+        try:
+            response = await asyncio.to_thread(self.client.create_order, **params)
+        except Exception as e:
+            METRICS.errors.inc(type(e).__name__)
+            order.error = str(e) or type(e).__name__
+            if rejected(e):
+                log(f"Order {order.client_order_id} failed: {order.error}")
+                self._apply(order, "REJECTED", 0.0, 0.0)
+            else:
+                log(f"Order {order.client_order_id} unconfirmed ({order.error}), looking it up")
+                self._track(self._look_up(order, log))
+            return
+        METRICS.order_roundtrip.observe(time.perf_counter() - start)
+        for fill in response.get("fills", []):
+            order.add_commission(fill.get("tradeId"), fill["commission"], fill["commissionAsset"])
+        self._apply(order, response.get("status", "NEW"), float(response.get("executedQty", 0)),
+                    float(response.get("cummulativeQuoteQty", 0)))
+
+    async def _look_up(self, order, log):
+        # The order stays pending until Binance says how it stands, by our
+        # client order id; fills arriving on the user stream meanwhile settle
+        # it as usual.
+        not_found = 0
+        for attempt in itertools.count():
+            await asyncio.sleep(LOOKUP_DELAYS[min(attempt, len(LOOKUP_DELAYS) - 1)])
+            if order.done:
+                return
+            try:
+                info = await asyncio.to_thread(self.client.get_order, symbol=order.symbol,
+                                               origClientOrderId=order.client_order_id)
+            except Exception as e:
+                if getattr(e, "code", None) == ORDER_NOT_FOUND:
+                    not_found += 1
+                    if not_found >= LOOKUPS_NOT_FOUND:
+                        log(f"Order {order.client_order_id} was never placed")
+                        self._apply(order, "REJECTED", 0.0, 0.0)
+                        return
+                else:
+                    METRICS.errors.inc(type(e).__name__)
+                continue
+            self._apply(order, info["status"], float(info["executedQty"]), float(info["cummulativeQuoteQty"]))
+            return
+
+    async def _user_stream(self, log):
+        backoff = 1
+        while True:
+            try:
+                listen_key = await asyncio.to_thread(self.client.stream_get_listen_key)
+                if isinstance(listen_key, dict):
+                    listen_key = listen_key["listenKey"]
+                async with websockets.connect(f"{self.user_stream_url}/{listen_key}") as ws:
+                    backoff = 1
+                    keepalive = asyncio.create_task(self._keepalive(listen_key))
+                    try:
+                        async for message in ws:
+                            self._on_event(json.loads(message))
+                    finally:
+                        keepalive.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                METRICS.errors.inc(type(e).__name__)
+                log(f"User data stream error: {str(e) or type(e).__name__}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _keepalive(self, listen_key):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            await asyncio.to_thread(self.client.stream_keepalive, listen_key)
+
+    def _on_event(self, event):
+        if event.get("e") != "executionReport":
+            return
+        # Cancels report the cancel request's id in "c" and ours in "C".
+        order = self.orders.get(event.get("C") or event["c"])
+        if order is not None:
+            if event.get("x") == "TRADE":
+                order.add_commission(event["t"], event["n"], event["N"])
+            self._apply(order, event["X"], float(event["z"]), float(event["Z"]))
+
+    def _apply(self, order, status, executed_qty, quote_qty):
+        if order.done:
+            return
+        if executed_qty >= order.executed_qty:
+            order.executed_qty = executed_qty
+            order.quote_qty = quote_qty
+        order.status = status
+        if status in FINAL_STATUSES:
+            order.done = True
+            self.orders.pop(order.client_order_id, None)
+            if order.on_done:
+                order.on_done(order)
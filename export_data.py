@@ -1,41 +1,242 @@
-from binance.client import Client
-import pandas as pd
-from datetime import datetime, timedelta
-
-# Optional: insert your public API key & secret
-client = Client()
-
-symbol = "BTCUSDT"
-interval = Client.KLINE_INTERVAL_1DAY
-end_time = datetime.now()
-start_time = end_time - timedelta(days=365*5)
-
-# Download candles
-klines = client.get_historical_klines(
-    symbol,
-    interval,
-    start_str=start_time.strftime("%d %b %Y %H:%M:%S"),
-    end_str=end_time.strftime("%d %b %Y %H:%M:%S")
-)
-
-# Format data
-df = pd.DataFrame(klines, columns=[
-    "timestamp", "open", "high", "low", "close", "volume",
-    "close_time", "quote_asset_volume", "number_of_trades",
-    "taker_buy_base", "taker_buy_quote", "ignore"
-])
-
-df["date"] = pd.to_datetime(df["timestamp"], unit='ms')
-df["open"] = df["open"].astype(float)
-df["high"] = df["high"].astype(float)
-df["low"] = df["low"].astype(float)
-df["close"] = df["close"].astype(float)
-df["volume"] = df["volume"].astype(float)
-
-# Only keep needed columns
-df = df[["date", "open", "high", "low", "close", "volume"]]
-
-# Save to CSV
-df.to_csv("btc_usdt_5y.csv", index=False)
-
-print("✅ Export complete: btc_usdt_1y.csv")
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import requests
+import candles
+
+BASE_URL = "https://api.binance.com"
+KLINES_PATH = "/api/v3/klines"
+PAGE_LIMIT = 1000
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000,
+    "1w": 604_800_000,
+}
+
+
+def kline_weight(limit):
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class RateLimiter:
+    # Token bucket over request weight, refilled continuously up to the
+    # per-minute budget and corrected by the weight the server reports.
+    def __init__(self, weight_per_minute=1200, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60.0
+        self.tokens = float(weight_per_minute)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.resume_at = self.updated
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.updated < self.resume_at:
+                    wait = self.resume_at - self.updated
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def observe(self, used_weight):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def pause(self, seconds):
+        # Retry-After from a 429/418: nobody sends until it has passed.
+        with self.lock:
+            self.resume_at = max(self.resume_at, self.clock() + seconds)
+
+
+class KlineClient:
+    # Rate-limit answers wait out Retry-After; server errors, timeouts and
+    # dropped connections are retried after backoff, 2x longer each time.
+    def __init__(self, base_url=BASE_URL, limiter=None, session=None, max_retries=5, timeout=10, backoff=1.0,
+                 sleep=time.sleep):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or RateLimiter()
+        self.session = session or requests.Session()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def fetch(self, symbol, interval, start_ms, end_ms, limit=PAGE_LIMIT):
+        params = {"symbol": symbol, "interval": interval, "startTime": start_ms, "endTime": end_ms, "limit": limit}
+        problem = None
+        for attempt in range(self.max_retries):
+            self.limiter.acquire(kline_weight(limit))
+            try:
+                response = self.session.get(self.base_url + KLINES_PATH, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                problem = str(e) or type(e).__name__
+                self._back_off(attempt)
+                continue
+            used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+            if used is not None:
+                self.limiter.observe(int(used))
+            if response.status_code in (418, 429):
+                problem = "rate limited"
+                self.limiter.pause(float(response.headers.get("Retry-After", 60)))
+                continue
+            if response.status_code >= 500:
+                problem = f"HTTP {response.status_code}"
+                self._back_off(attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+        raise RuntimeError(f"Gave up fetching {symbol} {interval} from {start_ms} after {self.max_retries} "
+                           f"attempts ({problem})")
+
+    def _back_off(self, attempt):
+        if attempt + 1 < self.max_retries:
+            self.sleep(self.backoff * 2 ** attempt)
+
+
+def plan_pages(start_ms, end_ms, interval_ms, limit=PAGE_LIMIT):
+    span = interval_ms * limit
+    return [(page, min(page + span - 1, end_ms)) for page in range(start_ms, end_ms + 1, span)]
+
+
+def store_path(data_dir, symbol, interval):
+    return os.path.join(data_dir, f"{symbol}_{interval}{candles.EXTENSION}")
+
+
+# Pages are appended to "<store>.part" as rows of this record as they
+# arrive, since the store's column blocks can only be rewritten whole; the
+# part file is folded into the store once the run ends, or by the next run
+# if this one died.
+PART_ROW = np.dtype([("timestamp", np.int64)] + [(col, np.float64) for col in candles.COLUMNS])
+
+
+def part_path(path):
+    return path + ".part"
+
+
+def append_part(path, timestamp, columns):
+    rows = np.empty(len(timestamp), dtype=PART_ROW)
+    rows["timestamp"] = timestamp
+    for col in candles.COLUMNS:
+        rows[col] = columns[col]
+    with open(part_path(path), "ab") as f:
+        f.write(rows.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def merge_part(path):
+    # Folds the part file into the store; a row cut off by a crash is dropped.
+    part = part_path(path)
+    if not os.path.exists(part):
+        return
+    count = os.path.getsize(part) // PART_ROW.itemsize
+    rows = np.fromfile(part, dtype=PART_ROW, count=count)
+    if len(rows):
+        old_ts, old_cols = to_columns([])
+        if os.path.exists(path):
+            old = candles.CandleStore(path).arrays()
+            old_ts = np.array(old["timestamp"])
+            old_cols = {col: np.array(old[col]) for col in candles.COLUMNS}
+            del old
+        timestamp, keep = np.unique(np.concatenate([old_ts, rows["timestamp"]]), return_index=True)
+        columns = {col: np.concatenate([old_cols[col], rows[col]])[keep] for col in candles.COLUMNS}
+        candles.write_store(path, timestamp, columns)
+    os.remove(part)
+
+
+def to_columns(rows):
+    if not rows:
+        return np.empty(0, dtype=np.int64), {col: np.empty(0) for col in candles.COLUMNS}
+    timestamp = np.array([r[0] for r in rows], dtype=np.int64)
+    values = np.array([r[1:6] for r in rows], dtype=np.float64)
+    return timestamp, {col: values[:, k] for k, col in enumerate(candles.COLUMNS)}
+
+
+def update_stores(symbols, intervals, since, data_dir="data", client=None, workers=4, now=None):
+    # Only candles after the last stored one are requested. Every missing
+    # range is cut into pages and all pages of all pairs share one thread
+    # pool and one rate limiter. Pages are saved in order as they come in,
+    # so a run that fails part way keeps what it got and the next one
+    # resumes from there. Only fully closed candles are kept.
+    client = client or KlineClient()
+    now_ms = candles.to_millis(now or datetime.now(timezone.utc))
+    since_ms = candles.to_millis(since)
+    os.makedirs(data_dir, exist_ok=True)
+
+    pages = []
+    paths = {}
+    for symbol in symbols:
+        for interval in intervals:
+            step = INTERVAL_MS[interval]
+            path = store_path(data_dir, symbol, interval)
+            paths[(symbol, interval)] = path
+            merge_part(path)
+            start = since_ms
+            if os.path.exists(path):
+                store = candles.CandleStore(path)
+                if len(store):
+                    start = int(store.timestamp[-1]) + step
+                del store
+            last_open = (now_ms // step) * step - step
+            for page_start, page_end in plan_pages(start, last_open, step):
+                pages.append((symbol, interval, page_start, page_end))
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # map yields in page order while later pages are still loading.
+        for (symbol, interval, _, _), page in zip(pages, pool.map(lambda p: client.fetch(*p), pages)):
+            timestamp, columns = to_columns(page)
+            closed = timestamp + INTERVAL_MS[interval] <= now_ms
+            if closed.any():
+                append_part(paths[(symbol, interval)], timestamp[closed],
+                            {col: values[closed] for col, values in columns.items()})
+    finally:
+        # After a failed page the pages still queued are not fetched.
+        pool.shutdown(cancel_futures=True)
+        for path in paths.values():
+            merge_part(path)
+
+    for path in paths.values():
+        if not os.path.exists(path):
+            candles.write_store(path, *to_columns([]))
+    return paths
+
+
+def export_csv(path, csv_path, start=None, end=None):
+    candles.CandleStore(path).to_frame(start, end).to_csv(csv_path, index=False)
+
+
+if __name__ == "__main__":
+    symbols = ["BTCUSDT"]
+    intervals = ["1d"]
+    since = datetime.now(timezone.utc) - timedelta(days=365 * 5)
+
+    paths = update_stores(symbols, intervals, since)
+    for (symbol, interval), path in paths.items():
+        print(f"✅ {symbol} {interval}: {len(candles.CandleStore(path))} candles in {path}")
+
+    export_csv(paths[("BTCUSDT", "1d")], "btc_usdt_5y.csv", start=since)
+    print("✅ Export complete: btc_usdt_5y.csv")
@@ -1,50 +1,68 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from strategies import GridStrategy
+import engine
+import parallel
+import paths
+import cache
 import random
 
 class MonteCarloGridSimulator:
-    def __init__(self, df, strategy_config, window_days=30, simulations=1000, budget_usd=1000):
+    def __init__(self, df, strategy_config, window_days=30, simulations=1000, budget_usd=1000, workers=1, seed=None,
+                 use_cache=True, method="history", costs=None):
         self.df = df
         self.strategy_config = strategy_config
         self.window_days = window_days
         self.simulations = simulations
         self.initial_budget = budget_usd
+        self.workers = workers  # None or 0 uses every core
+        self.seed = seed
+        # "history" draws windows of the real series; "bootstrap", "gbm" and
+        # "garch" simulate new paths from its returns (see paths.py).
+        self.method = method
+        self.costs = costs  # costs.CostModel charged on every fill; None trades for free
+        self.cache = cache.ResultCache() if use_cache else None
         self.results = []
+        self.metrics = {}  # per-path risk metrics, filled for synthetic paths
+        ohlc = engine.ohlcv_arrays(df)
+        self.close = ohlc["close"]
+        self.volume = ohlc.get("volume")
 
     def simulate_once(self, start_idx):
-        sub_df = self.df.iloc[start_idx:start_idx + self.window_days].copy()
-        strategy = GridStrategy(**self.strategy_config)
-        budget = self.initial_budget
-        coin = 0
+        result = parallel.run_window(self.close, start_idx, self.window_days, self.strategy_config, self.initial_budget,
+                                     self.costs, self.volume)
+        return result["final_value"] - self.initial_budget
 
-        for _, row in sub_df.iterrows():
-            price = row["close"]
-
-            if strategy.should_buy(price):
-                amount = budget * 0.2
-                if amount > 10:
-                    quantity = amount / price
-                    coin += quantity
-                    budget -= amount
-                    strategy.on_buy(price, quantity)
-
-            elif coin > 0 and strategy.should_sell(price):
-                budget += coin * price
-                strategy.on_sell()
-                coin = 0
-
-            elif coin > 0 and strategy.should_exit(price):
-                budget += coin * price
-                strategy.on_sell()
-                coin = 0
+    def run(self):
+        if self.method != "history":
+            compute = lambda: paths.monte_carlo(self.close, self.simulations, self.window_days, self.strategy_config,
+                                                self.initial_budget, self.method, self.workers, self.seed,
+                                                costs=self.costs)
+            if self.cache is None or self.seed is None:
+                self.metrics = compute()
+            else:
+                key = cache.make_key("monte_carlo_paths", data=cache.fingerprint(self.close),
+                                     simulations=self.simulations, window_days=self.window_days,
+                                     strategy=self.strategy_config, budget=self.initial_budget, seed=self.seed,
+                                     method=self.method, **cache.cost_parts(self.costs, self.close))
+                self.metrics = self.cache.cached(key, compute)
+            self.results.extend(self.metrics["profit"].tolist())
+            return
 
-        final_price = sub_df["close"].iloc[-1]
-        final_value = budget + coin * final_price
-        return final_value - self.initial_budget
+        if self.workers != 1 or self.seed is not None:
+            compute = lambda: parallel.monte_carlo(self.close, self.simulations, self.window_days,
+                                                   self.strategy_config, self.initial_budget, self.workers, self.seed,
+                                                   self.costs, self.volume)
+            if self.cache is None or self.seed is None:
+                profits = compute()
+            else:
+                # Seeded draws are the same for any worker count.
+                key = cache.make_key("monte_carlo", data=cache.fingerprint(self.close), simulations=self.simulations,
+                                     window_days=self.window_days, strategy=self.strategy_config,
+                                     budget=self.initial_budget, seed=self.seed,
+                                     **cache.cost_parts(self.costs, self.close, self.volume))
+                profits = self.cache.cached(key, compute)
+            self.results.extend(profits.tolist())
+            return
 
-    def run(self):
         max_start = len(self.df) - self.window_days
         for i in range(self.simulations):
             start_idx = random.randint(0, max_start)
@@ -57,7 +75,7 @@ class MonteCarloGridSimulator:
         median = np.median(profits)
         win_rate = (profits > 0).mean() * 100
 
-        print("\n📊 Monte Carlo Grid Strategy ROI Analysis")
+        print(f"\n📊 Monte Carlo Grid Strategy ROI Analysis ({self.method})")
         print("----------------------------------------")
         print(f"Simulations:     {self.simulations}")
         print(f"Avg ROI:         ${mean:.2f}")
@@ -65,7 +83,23 @@ class MonteCarloGridSimulator:
         print(f"Win Rate:        {win_rate:.2f}%")
         print(f"Worst Loss:      ${profits.min():.2f}")
         print(f"Best Gain:       ${profits.max():.2f}")
+        for level, tail in paths.tail_stats(profits).items():
+            print(f"VaR {level:.0%}:          ${tail['var']:.2f} (expected shortfall ${tail['cvar']:.2f})")
+        if self.metrics:
+            drawdown = self.metrics["max_drawdown"] * 100
+            print(f"Max drawdown:    median {np.median(drawdown):.1f}%, 95th pct {np.percentile(drawdown, 95):.1f}%")
+            print(f"Sharpe:          median {np.median(self.metrics['sharpe']):.2f}")
+            print(f"Sortino:         median {np.median(self.metrics['sortino']):.2f}")
+            print(f"Exposure:        median {np.median(self.metrics['exposure']) * 100:.1f}%")
+
+        self.plot()
 
+    def plot(self, path=None):
+        import matplotlib.pyplot as plt
+        profits = np.array(self.results)
+        mean = profits.mean()
+        median = np.median(profits)
+        plt.figure()
         plt.hist(profits, bins=40, edgecolor='k', color='skyblue')
         plt.axvline(mean, color='green', linestyle='--', label=f"Mean (${mean:.2f})")
         plt.axvline(median, color='orange', linestyle='--', label=f"Median (${median:.2f})")
@@ -75,25 +109,27 @@ class MonteCarloGridSimulator:
         plt.legend()
         plt.grid(True)
         plt.tight_layout()
-        plt.show()
+        if path is None:
+            plt.show()
+        else:
+            plt.savefig(path)
+            plt.close()
 
 if __name__ == "__main__":
-    df = pd.read_csv("btc_usdt_5y.csv", parse_dates=["date"])
-    df.sort_values("date", inplace=True)
-
-    strategy_config = {
-        "grid_size": 0.10,
-        "max_levels": 5,
-        "max_drawdown": 0.30
+    import cli
+    job = {
+        "data": "btc_usdt_5y.csv",
+        "mode": "montecarlo",
+        "params": {
+            "grid_size": 0.10,
+            "max_levels": 5,
+            "max_drawdown": 0.30
+        },
+        "window_days": 30,
+        "simulations": 500,
+        "budget_usd": 10000,
+        "seed": 42,
     }
-
-    simulator = MonteCarloGridSimulator(
-        df=df,
-        strategy_config=strategy_config,
-        window_days=30,
-        simulations=500,
-        budget_usd=10000
-    )
-
-    simulator.run()
-    simulator.report()
+    cli.show(job)
+    # For the tails, examples/montecarlo_tails.json runs a million
+    # block-bootstrapped windows: python cli.py examples/montecarlo_tails.json
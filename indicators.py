@@ -0,0 +1,185 @@
+import math
+import numpy as np
+
+# Same optional-numba pattern as engine.py (which imports strategies, so this
+# module cannot import it).
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+DEFAULTS = {
+    "ema_fast": 12,
+    "ema_slow": 26,
+    "rsi_period": 14,
+    "atr_period": 14,
+    "bb_period": 20,
+    "bb_width": 2.0,
+    "vol_period": 20,
+}
+
+NAMES = ["ema_fast", "ema_slow", "rsi", "atr", "bb_mid", "bb_upper", "bb_lower", "volatility"]
+
+# Slots of the running state vector.
+COUNT, PREV_CLOSE, EMA_FAST, EMA_SLOW, AVG_GAIN, AVG_LOSS, ATR, BB_MEAN, BB_M2, VOL_MEAN, VOL_M2 = range(11)
+STATE_SIZE = 11
+
+
+@njit(cache=True)
+def _window_add(state, mean_slot, m2_slot, ring, k, x):
+    # Welford mean/M2 over the last len(ring) values: grows while the window
+    # fills, then swaps the oldest value out. Returns the values held.
+    size = len(ring)
+    pos = k % size
+    mean = state[mean_slot]
+    if k < size:
+        n = k + 1
+        delta = x - mean
+        mean += delta / n
+        state[m2_slot] += delta * (x - mean)
+    else:
+        n = size
+        old = ring[pos]
+        new_mean = mean + (x - old) / n
+        state[m2_slot] += (x - old) * (x - new_mean + old - mean)
+        mean = new_mean
+    state[mean_slot] = mean
+    ring[pos] = x
+    return n
+
+
+@njit(cache=True)
+def _update(state, params, closes, returns, high, low, close, out):
+    # One candle, O(1): every indicator is a recursion over a few running
+    # values plus two ring buffers. Both modes call this same function, so
+    # batch and streaming values are identical, not just close.
+    # Definitions follow the ta package: EMA and RSI are adjust=False ewm
+    # seeded with the first value, ATR is Wilder's smoothing seeded with a
+    # plain mean, Bollinger uses the population std of closes and
+    # volatility the sample std of log returns. Values are NaN until a full
+    # period has been seen.
+    fast = params[0]
+    slow = params[1]
+    rsi_n = params[2]
+    atr_n = params[3]
+    width = params[5]
+    k = int(state[COUNT])
+    prev = state[PREV_CLOSE]
+
+    if k == 0:
+        state[EMA_FAST] = close
+        state[EMA_SLOW] = close
+        tr = high - low
+    else:
+        a = 2.0 / (fast + 1.0)
+        state[EMA_FAST] = (1.0 - a) * state[EMA_FAST] + a * close
+        a = 2.0 / (slow + 1.0)
+        state[EMA_SLOW] = (1.0 - a) * state[EMA_SLOW] + a * close
+        tr = max(high - low, abs(high - prev), abs(low - prev))
+
+        gain = max(close - prev, 0.0)
+        loss = max(prev - close, 0.0)
+        if k == 1:
+            state[AVG_GAIN] = gain
+            state[AVG_LOSS] = loss
+        else:
+            a = 1.0 / rsi_n
+            state[AVG_GAIN] = (1.0 - a) * state[AVG_GAIN] + a * gain
+            state[AVG_LOSS] = (1.0 - a) * state[AVG_LOSS] + a * loss
+
+    out[0] = state[EMA_FAST] if k + 1 >= fast else np.nan
+    out[1] = state[EMA_SLOW] if k + 1 >= slow else np.nan
+    if k >= rsi_n:
+        if state[AVG_LOSS] == 0.0:
+            out[2] = 100.0
+        else:
+            out[2] = 100.0 - 100.0 / (1.0 + state[AVG_GAIN] / state[AVG_LOSS])
+    else:
+        out[2] = np.nan
+
+    # Until atr_n true ranges are in, the ATR slot holds their sum.
+    if k + 1 < atr_n:
+        state[ATR] += tr
+        out[3] = np.nan
+    elif k + 1 == atr_n:
+        state[ATR] = (state[ATR] + tr) / atr_n
+        out[3] = state[ATR]
+    else:
+        state[ATR] = (state[ATR] * (atr_n - 1.0) + tr) / atr_n
+        out[3] = state[ATR]
+
+    n = _window_add(state, BB_MEAN, BB_M2, closes, k, close)
+    if n == len(closes):
+        std = math.sqrt(max(state[BB_M2], 0.0) / n)
+        out[4] = state[BB_MEAN]
+        out[5] = state[BB_MEAN] + width * std
+        out[6] = state[BB_MEAN] - width * std
+    else:
+        out[4] = np.nan
+        out[5] = np.nan
+        out[6] = np.nan
+
+    out[7] = np.nan
+    if k > 0:
+        n = _window_add(state, VOL_MEAN, VOL_M2, returns, k - 1, math.log(close / prev))
+        if n == len(returns) and n > 1:
+            out[7] = math.sqrt(max(state[VOL_M2], 0.0) / (n - 1))
+
+    state[COUNT] = k + 1
+    state[PREV_CLOSE] = close
+
+
+@njit(cache=True)
+def _batch(state, params, closes, returns, high, low, close, out):
+    for i in range(len(close)):
+        _update(state, params, closes, returns, high[i], low[i], close[i], out[i])
+
+
+class IndicatorStream:
+    # Running indicator state, advanced one closed candle at a time. warm_up
+    # pushes history through the same recursion, so a stream warmed up on N
+    # candles and then fed candle N+1 holds exactly what the batch pass over
+    # N+1 candles ends with.
+    def __init__(self, **periods):
+        self.periods = {**DEFAULTS, **periods}
+        self.params = np.array([float(self.periods[name]) for name in DEFAULTS])
+        self.state = np.zeros(STATE_SIZE)
+        self.closes = np.zeros(int(self.periods["bb_period"]))
+        self.returns = np.zeros(int(self.periods["vol_period"]))
+        self.row = np.full(len(NAMES), np.nan)
+
+    def __len__(self):
+        return int(self.state[COUNT])
+
+    def update(self, high, low, close):
+        _update(self.state, self.params, self.closes, self.returns, float(high), float(low), float(close), self.row)
+        return self.row
+
+    def warm_up(self, ohlc):
+        # ohlc holds high/low/close arrays (engine.ohlcv_arrays or
+        # CandleStore.arrays); returns every candle's values as columns.
+        columns = [np.ascontiguousarray(ohlc[col], dtype=np.float64) for col in ("high", "low", "close")]
+        out = np.full((len(columns[2]), len(NAMES)), np.nan)
+        _batch(self.state, self.params, self.closes, self.returns, *columns, out)
+        if len(out):
+            self.row[:] = out[-1]
+        return {name: out[:, j] for j, name in enumerate(NAMES)}
+
+    @property
+    def ready(self):
+        return not np.isnan(self.row).any()
+
+    @property
+    def values(self):
+        return dict(zip(NAMES, self.row.tolist()))
+
+
+def compute(ohlc, **periods):
+    # Batch mode: every indicator for every candle in one compiled pass.
+    return IndicatorStream(**periods).warm_up(ohlc)
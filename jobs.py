@@ -0,0 +1,282 @@
+import functools
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+import parallel
+
+CHUNKS_PER_WORKER = 4  # more chunks than workers: finer progress and a faster cancel
+KINDS = ["backtest", "rolling", "montecarlo", "sweep"]
+
+_frames = {}
+
+
+def _load(spec):
+    # Each worker loads a candle file once and keeps it for later chunks.
+    from candles import load_data
+    key = (spec["data"], spec.get("start"), spec.get("end"))
+    if key not in _frames:
+        _frames[key] = load_data(*key)
+    return _frames[key]
+
+
+def _backtest_chunk(spec):
+    # spec["backtester"] is the Backtester class to run (backtest_grid's by
+    # default), with its own invest_fraction unless the spec sets one, as
+    # in cli.run_single.
+    import strategies
+    import backtest_grid
+    df = _load(spec)
+    strategy = getattr(strategies, spec["strategy"])(**spec["params"])
+    cls = spec.get("backtester") or backtest_grid.Backtester
+    options = {"invest_fraction": spec["invest_fraction"]} if "invest_fraction" in spec else {}
+    backtester = cls(df, strategy, budget_usd=spec["budget_usd"], intrabar=spec.get("intrabar", False),
+                     costs=spec.get("costs"), **options)
+    backtester.run()
+    stats = backtester.ledger.metrics()
+    return {
+        "final_value": backtester.final_value,
+        "trades": len(backtester.ledger),
+        "max_drawdown": backtester.ledger.max_drawdown(),
+        "sharpe": float(stats["sharpe"]),
+        "win_rate": float(stats["win_rate"]),
+        "dates": df["date"].to_numpy(),
+        "equity": np.array(backtester.ledger.equity.column("equity")),
+    }
+
+
+def _rolling_chunk(task):
+    spec, first, last = task
+    from backtest_grid_rolling import RollingGridBacktester
+    df = _load(spec)
+    # The windows starting at rows first..last, step_days apart.
+    rows = df.iloc[first:last + spec["window_days"]].reset_index(drop=True)
+    backtester = RollingGridBacktester(rows, spec["params"], window_days=spec["window_days"],
+                                       step_days=spec["step_days"], budget_usd=spec["budget_usd"],
+                                       incremental=True, costs=spec.get("costs"))
+    backtester.run()
+    return backtester.results
+
+
+def _montecarlo_chunk(task):
+    # One chunk of MonteCarloGridSimulator's own work, with its seed and
+    # size, so a seeded job draws exactly what the simulator would.
+    spec, seed, count = task
+    import engine
+    import paths
+    ohlc = engine.ohlcv_arrays(_load(spec))
+    args = (ohlc["close"], seed, count, spec["window_days"], spec["params"], spec["budget_usd"])
+    method = spec.get("method", "history")
+    if method == "history":
+        return parallel.monte_carlo_chunk(*args, costs=spec.get("costs"), volume=ohlc.get("volume"))
+    return paths.monte_carlo_chunk(*args, method=method, costs=spec.get("costs"))
+
+
+def _sweep_chunk(task):
+    spec, param_grid = task
+    import engine
+    import strategies
+    from sweep import run_sweep
+    ohlc = engine.ohlcv_arrays(_load(spec))
+    return run_sweep(ohlc["close"], param_grid, getattr(strategies, spec["strategy"]), spec["budget_usd"],
+                     spec.get("invest_fraction", 0.2), metrics=True, costs=spec.get("costs"),
+                     volume=ohlc.get("volume"), high=ohlc.get("high"), low=ohlc.get("low"))
+
+
+def split(spec, workers):
+    # A job spec as (function, task) chunks for the pool.
+    kind = spec["kind"]
+    chunks = max(1, workers * CHUNKS_PER_WORKER)
+    if kind == "backtest":
+        return [(_backtest_chunk, spec)]
+    if kind == "rolling":
+        rows = len(_load(spec))
+        starts = list(range(0, rows - spec["window_days"] + 1, spec["step_days"]))
+        # The simulator's own chunks, so the job matches a run on any worker count.
+        size = parallel.WINDOWS_PER_CHUNK
+        return [(_rolling_chunk, (spec, part[0], part[-1])) for part in
+                (starts[i:i + size] for i in range(0, len(starts), size))]
+    if kind == "montecarlo":
+        import paths
+        size = parallel.CHUNK_SIZE if spec.get("method", "history") == "history" else paths.BATCH_SIZE
+        return [(_montecarlo_chunk, (spec, seed, count))
+                for seed, count in parallel.plan_chunks(spec["simulations"], spec.get("seed"), size)]
+    if kind == "sweep":
+        # Split on the parameter with the most values; every chunk is still
+        # a full grid over the others.
+        grid = spec["param_grid"]
+        key = max(grid, key=lambda k: len(grid[k]))
+        values = list(grid[key])
+        size = max(1, -(-len(values) // chunks))
+        return [(_sweep_chunk, (spec, {**grid, key: values[i:i + size]})) for i in range(0, len(values), size)]
+    raise ValueError(f"Unknown job kind '{kind}', expected one of {KINDS}")
+
+
+class Job:
+    # One submitted spec: its chunks' futures and the results in so far.
+    # Pool callbacks add results from the executor's thread; readers take a
+    # consistent copy through partial().
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.futures = []
+        self.total = None  # chunks, once the spec has been split
+        self.lock = threading.Lock()
+        self.results = {}  # chunk index -> result
+        self.done = 0
+        self.error = None
+        self.cancelled = False
+        self.version = 0  # bumped on every change, so viewers redraw only then
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def status(self):
+        if self.error is not None:
+            return "failed"
+        if self.cancelled:
+            return "cancelled"
+        if self.total is None:
+            return "starting"
+        return "done" if self.done == self.total else "running"
+
+    def start(self, pool, chunks):
+        with self.lock:
+            if self.cancelled:
+                return
+            self.futures = [pool.submit(func, task) for func, task in chunks]
+            self.total = len(self.futures)
+            self.version += 1
+        for i, future in enumerate(self.futures):
+            future.add_done_callback(functools.partial(self._chunk_done, i))
+
+    def fail(self, error):
+        with self.lock:
+            self.error = self.error or error
+            self.finished = time.time()
+            self.version += 1
+        for future in self.futures:
+            future.cancel()
+
+    def _chunk_done(self, i, future):
+        try:
+            result = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            self.fail(e)
+            return
+        with self.lock:
+            if self.cancelled or self.error is not None:
+                return
+            self.results[i] = result
+            self.done += 1
+            if self.done == self.total:
+                self.finished = time.time()
+            self.version += 1
+
+    def cancel(self):
+        # Chunks not started yet are dropped; running ones finish in the
+        # background and are ignored.
+        with self.lock:
+            if self.status not in ("starting", "running"):
+                return
+            self.cancelled = True
+            self.finished = time.time()
+            self.version += 1
+        for future in self.futures:
+            future.cancel()
+
+    def partial(self):
+        # Results in chunk order, whatever order they finished in.
+        with self.lock:
+            return [self.results[i] for i in sorted(self.results)], self.done, self.version
+
+    def summary(self):
+        # The results so far, merged: final numbers once every chunk is in.
+        results, done, _ = self.partial()
+        kind = self.spec["kind"]
+        summary = {"kind": kind, "status": self.status, "chunks": done, "total": self.total,
+                   "elapsed": (self.finished or time.time()) - self.started}
+        if self.error is not None:
+            summary["error"] = repr(self.error)
+        if not results:
+            return summary
+        budget = self.spec["budget_usd"]
+        if kind == "backtest":
+            summary.update(results[0])
+            summary["profit"] = summary["final_value"] - budget
+        elif kind == "rolling":
+            windows = pd.DataFrame([row for rows in results for row in rows]).sort_values("start")
+            summary.update(windows=windows, total_profit=float(windows["profit"].sum()),
+                           win_rate=float((windows["profit"] > 0).mean()))
+        elif kind == "montecarlo":
+            from paths import tail_stats
+            if isinstance(results[0], dict):
+                # Synthetic paths also carry per-path risk metrics.
+                summary["metrics"] = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+                results = [r["profit"] for r in results]
+            profits = np.concatenate(results)
+            summary.update(profits=profits, simulations=len(profits), mean=float(profits.mean()),
+                           median=float(np.median(profits)), win_rate=float((profits > 0).mean()),
+                           tails=tail_stats(profits))
+        else:
+            table = pd.concat(results, ignore_index=True).sort_values("profit", ascending=False)
+            summary.update(table=table, configs=len(table), best=table.iloc[0].to_dict())
+        return summary
+
+
+class JobRunner:
+    # Runs job specs on a pool of worker processes, a chunk per task. The
+    # pool starts on first use with the "spawn" method, since forking a
+    # process that runs GUI and bot threads is not safe. submit() returns
+    # at once: splitting a spec can read its data file, so it happens on a
+    # short-lived thread.
+    def __init__(self, workers=None):
+        self.workers = parallel.resolve_workers(workers)
+        self.pool = None
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    def submit(self, spec):
+        job = Job(next(self.ids), spec)
+        self.jobs[job.id] = job
+        threading.Thread(target=self._start, args=(job,), daemon=True).start()
+        return job
+
+    def _start(self, job):
+        try:
+            chunks = split(job.spec, self.workers)
+            try:
+                job.start(self._pool(), chunks)
+            except BrokenProcessPool:
+                # A worker died (killed, out of memory) and took the pool
+                # with it; later jobs get a fresh one.
+                job.start(self._pool(replace=True), chunks)
+        except Exception as e:
+            job.fail(e)
+
+    def _pool(self, replace=False):
+        with self.lock:
+            if replace and self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def cancel(self, job_id):
+        self.jobs[job_id].cancel()
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.cancel()
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
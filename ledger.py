@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+import pandas as pd
+import engine
+import performance
+
+TRADE_COLUMNS = {"run": np.int32, "index": np.int64, "action": np.int8, "price": np.float64,
+                 "quantity": np.float64, "budget": np.float64, "level": np.int64}
+# Level of a sell that closes every open lot, for results without levels.
+CLOSE_ALL = np.iinfo(np.int64).max
+EQUITY_COLUMNS = {"equity": np.float64, "drawdown": np.float64, "in_market": np.int8}
+SPILL_ROWS = 1_000_000  # rows a ColumnLog keeps in memory before it moves to a temporary directory
+
+# Indexed by action code, for turning the action column into labels in one go.
+ACTION_LABELS = np.array(["HOLD"] + [engine.ACTION_NAMES[a] for a in (engine.BUY, engine.SELL, engine.EXIT)])
+
+
+class ColumnLog:
+    # Append-only table of fixed-type columns. With a directory every column
+    # is a raw file that chunks are appended to and reads memory-map, so a
+    # run's memory does not grow with its row count. Without one the chunks
+    # are kept in memory until they pass spill_rows, then written to a
+    # temporary directory (removed with the log) and appended there.
+    def __init__(self, columns, directory=None, spill_rows=SPILL_ROWS):
+        self.columns = columns
+        self.directory = directory
+        self.spill_rows = spill_rows
+        self.chunks = {name: [] for name in columns}
+        self.rows = 0  # rows held in memory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def append(self, **arrays):
+        if self.directory is None and self.spill_rows is not None:
+            self.rows += len(arrays[next(iter(self.columns))])
+            if self.rows > self.spill_rows:
+                self.spill()
+        for name, dtype in self.columns.items():
+            values = np.ascontiguousarray(arrays[name], dtype=dtype)
+            if self.directory is None:
+                self.chunks[name].append(values)
+            else:
+                with open(self.path(name), "ab") as f:
+                    f.write(values.tobytes())
+
+    def spill(self):
+        directory = tempfile.mkdtemp(prefix="ledger-")
+        weakref.finalize(self, shutil.rmtree, directory, True)
+        for name in self.columns:
+            with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+                for chunk in self.chunks[name]:
+                    f.write(chunk.tobytes())
+        self.directory = directory
+        self.chunks = {name: [] for name in self.columns}
+        self.rows = 0
+
+    def column(self, name):
+        dtype = np.dtype(self.columns[name])
+        if self.directory is None:
+            chunks = self.chunks[name]
+            if len(chunks) > 1:
+                self.chunks[name] = chunks = [np.concatenate(chunks)]
+            return chunks[0] if chunks else np.empty(0, dtype=dtype)
+        size = len(self)
+        if size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.path(name), dtype=dtype, mode="r", shape=(size,))
+
+    def __len__(self):
+        if self.directory is None:
+            name = next(iter(self.columns))
+            return sum(len(c) for c in self.chunks[name])
+        # A run killed mid-append leaves some columns longer; only complete
+        # rows count.
+        sizes = []
+        for name, dtype in self.columns.items():
+            path = self.path(name)
+            sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def clear(self):
+        self.chunks = {name: [] for name in self.columns}
+        self.rows = 0
+        if self.directory is not None:
+            for name in self.columns:
+                open(self.path(name), "wb").close()
+
+
+class Ledger:
+    # Trades and the per-bar equity/drawdown curve of one or more backtest
+    # runs, written straight from the engine's result arrays.
+    def __init__(self, directory=None):
+        self.trades = ColumnLog(TRADE_COLUMNS, directory and os.path.join(directory, "trades"))
+        self.equity = ColumnLog(EQUITY_COLUMNS, directory and os.path.join(directory, "equity"))
+        self.peak = 0.0
+
+    def clear(self):
+        self.trades.clear()
+        self.equity.clear()
+        self.peak = 0.0
+
+    def record_trades(self, result, offset=0, run=0):
+        n = len(result["trade_index"])
+        level = result.get("trade_level")
+        if level is None:
+            level = np.where(result["trade_action"] == engine.BUY, 0, CLOSE_ALL)
+        self.trades.append(run=np.full(n, run), index=result["trade_index"] + offset,
+                           action=result["trade_action"], price=result["trade_price"],
+                           quantity=result["trade_quantity"], budget=result["trade_budget"], level=level)
+
+    def record(self, result, close, budget_usd, offset=0, run=0):
+        self.record_trades(result, offset, run)
+        curve = engine.equity_curve(close, result, budget_usd)
+        equity = curve["equity"]
+        peak = np.maximum.accumulate(np.maximum(equity, self.peak)) if len(equity) else equity
+        if len(peak):
+            self.peak = peak[-1]
+        self.equity.append(equity=equity, drawdown=(peak - equity) / peak, in_market=curve["coin"] > 0)
+
+    def __len__(self):
+        return len(self.trades)
+
+    def max_drawdown(self):
+        drawdown = self.equity.column("drawdown")
+        return float(drawdown.max()) if len(drawdown) else 0.0
+
+    def metrics(self, periods_per_year=performance.PERIODS_PER_YEAR):
+        # Risk and trade statistics of a single recorded run.
+        equity = self.equity.column("equity")
+        stats = performance.equity_metrics(equity, periods_per_year, self.equity.column("in_market"))
+        stats.update(performance.trade_metrics(self.trades.column("action"), self.trades.column("price"),
+                                               self.trades.column("quantity"), level=self.trades.column("level")))
+        stats["turnover"] = performance.ratio(stats["traded_notional"], equity.mean()).item() if len(equity) else 0.0
+        return stats
+
+    def points(self, dates, action):
+        # Dates and fill prices of one kind of trade, joined by bar index.
+        mask = self.trades.column("action") == action
+        return pd.Index(dates).take(self.trades.column("index")[mask]), self.trades.column("price")[mask]
+
+    def frame(self, dates):
+        return pd.DataFrame({
+            "run": self.trades.column("run"),
+            "date": pd.Index(dates).take(self.trades.column("index")),
+            "action": ACTION_LABELS[self.trades.column("action")],
+            "price": self.trades.column("price"),
+            "quantity": self.trades.column("quantity"),
+            "budget": self.trades.column("budget"),
+        })
+
+    def trade_list(self, dates):
+        frame = self.frame(dates)
+        return list(zip(frame["date"], frame["action"].tolist(), frame["price"].tolist()))
+
+    def counts(self, runs):
+        return np.bincount(self.trades.column("run"), minlength=runs)
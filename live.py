@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+import websockets
+import telemetry
+from telemetry import METRICS
+
+STREAM_BASE_URL = "wss://stream.binance.com:9443"
+
+
+def stream_url(symbols, base_url=STREAM_BASE_URL):
+    # One combined-stream connection multiplexes the trades of every symbol.
+    streams = "/".join(f"{symbol.lower()}@trade" for symbol in symbols)
+    return f"{base_url}/stream?streams={streams}"
+
+
+def parse_trade(message):
+    # Returns (symbol, price, event time in ms) for raw or combined trade and
+    # kline events.
+    event = json.loads(message)
+    if "data" in event:
+        event = event["data"]
+    if event.get("e") == "trade":
+        return event["s"], float(event["p"]), event.get("E")
+    if event.get("e") == "kline":
+        return event["s"], float(event["k"]["c"]), event.get("E")
+    return None, None, None
+
+
+class StreamRunner:
+    # Drives one or many TradingBots from a WebSocket price stream, evaluating
+    # each strategy on every update for its symbol. While the stream is down
+    # it keeps trading off REST polling and reconnects with exponential
+    # backoff.
+    def __init__(self, bots, url=None, poll_interval=60, max_backoff=60, stale_timeout=30, summary_interval=60):
+        self.bots = {}
+        self.fixed_url = url
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.stale_timeout = stale_timeout
+        self.summary_interval = summary_interval
+        self.resubscribe = False
+        for bot in bots if isinstance(bots, (list, tuple)) else [bots]:
+            self.add(bot)
+
+    def add(self, bot):
+        symbol = bot.symbol.upper()
+        if symbol not in self.bots:
+            self.resubscribe = True
+        self.bots.setdefault(symbol, []).append(bot)
+
+    @property
+    def url(self):
+        return self.fixed_url or stream_url(self.bots)
+
+    @property
+    def running(self):
+        return any(bot.running for bots in self.bots.values() for bot in bots)
+
+    def dispatch(self, symbol, price, log):
+        for bot in self.bots.get(symbol, ()):
+            if bot.running:
+                with METRICS.decision.time():
+                    bot.step(price, log)
+
+    async def run(self, log):
+        log("🚀 Bot started (streaming)")
+        monitors = [asyncio.create_task(telemetry.watch_loop()),
+                    asyncio.create_task(telemetry.report(log, self.summary_interval))]
+        try:
+            await self._run(log)
+        finally:
+            for task in monitors:
+                task.cancel()
+            log(METRICS.summary())
+
+    async def _run(self, log):
+        backoff = 1
+        while self.running:
+            try:
+                self.resubscribe = False
+                async with websockets.connect(self.url) as ws:
+                    log(f"📡 Price stream connected ({len(self.bots)} symbols)")
+                    backoff = 1
+                    await self._consume(ws, log)
+            except Exception as e:
+                METRICS.errors.inc(type(e).__name__)
+                log(f"Stream error: {str(e) or type(e).__name__}")
+
+            if not self.running:
+                break
+            if self.resubscribe:
+                continue
+            log(f"Stream down, polling REST for {backoff}s before reconnecting")
+            await self._poll(backoff, log)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _consume(self, ws, log):
+        while self.running and not self.resubscribe:
+            # No message within stale_timeout means the connection is dead
+            # even if the socket has not noticed yet.
+            message = await asyncio.wait_for(ws.recv(), timeout=self.stale_timeout)
+            symbol, price, event_time = parse_trade(message)
+            if price is None:
+                continue
+            if event_time:
+                # Exchange event time to arrival; includes any clock skew.
+                METRICS.price_fetch.observe(max(0.0, time.time() - event_time / 1000))
+            self.dispatch(symbol, price, log)
+
+    def _fetch_prices(self):
+        if len(self.bots) == 1:
+            symbol, bots = next(iter(self.bots.items()))
+            return [(symbol, bots[0].get_price())]
+        # A single all-tickers request instead of one request per symbol.
+        client = next(iter(self.bots.values()))[0].client
+        return [(t["symbol"], float(t["price"])) for t in client.get_symbol_ticker() if t["symbol"] in self.bots]
+
+    async def _poll(self, duration, log):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        while self.running and not self.resubscribe:
+            try:
+                with METRICS.price_fetch.time():
+                    prices = await asyncio.to_thread(self._fetch_prices)
+                for symbol, price in prices:
+                    log(f"{symbol} price (REST): ${price:.2f}")
+                    self.dispatch(symbol, price, log)
+            except Exception as e:
+                METRICS.errors.inc(type(e).__name__)
+                log(f"Error: {str(e)}")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    def run_forever(self, log):
+        asyncio.run(self.run(log))
@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from strategies import GridStrategy
+import engine
+
+# Work is cut into fixed-size chunks with one RNG stream each, so a given seed
+# draws the same samples no matter how many workers pick the chunks up.
+CHUNK_SIZE = 256
+# Rolling windows per chunk. Incremental mode carries state from window to
+# window inside a chunk, so the split must not depend on the worker count
+# either, or results differ in the last bits.
+WINDOWS_PER_CHUNK = 16
+
+_arrays = {}
+_handles = []
+
+
+def resolve_workers(workers):
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _attach(specs):
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _handles.append(shm)
+        _arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def map_shared(func, tasks, arrays, workers=1):
+    # Runs func over tasks with the given arrays visible through get_array().
+    # Worker processes map the arrays from shared memory instead of receiving
+    # pickled copies with every task.
+    workers = resolve_workers(workers)
+    if workers <= 1 or len(tasks) <= 1:
+        _arrays.update(arrays)
+        try:
+            return [func(task) for task in tasks]
+        finally:
+            _arrays.clear()
+
+    blocks = []
+    specs = {}
+    try:
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            blocks.append(shm)
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            view[:] = arr
+            del view
+            specs[key] = (shm.name, arr.shape, arr.dtype.str)
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 initializer=_attach, initargs=(specs,)) as pool:
+            return list(pool.map(func, tasks))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def get_array(key):
+    return _arrays[key]
+
+
+def get_volume():
+    # Volume is optional in the shared arrays (see series_arrays).
+    return _arrays.get("volume")
+
+
+def run_window(close, start, window_days, strategy_config, budget_usd, costs=None, volume=None):
+    strategy = GridStrategy(**strategy_config)
+    end = start + window_days
+    return engine.run_backtest(close[start:end], strategy, budget_usd, invest_fraction=0.2, costs=costs,
+                               volume=None if volume is None else volume[start:end])
+
+
+def series_arrays(close, volume, costs):
+    # The volume column is only shared when the cost model reads it.
+    arrays = {"close": close}
+    if costs is not None and costs.liquidity(close, volume) is not None:
+        arrays["volume"] = volume
+    return arrays
+
+
+def _monte_carlo_chunk(task):
+    seed, count, max_start, window_days, strategy_config, budget_usd, costs = task
+    close = get_array("close")
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, max_start + 1, size=count)
+    profits = np.empty(count)
+    for k, start in enumerate(starts.tolist()):
+        result = run_window(close, start, window_days, strategy_config, budget_usd, costs, get_volume())
+        profits[k] = result["final_value"] - budget_usd
+    return profits
+
+
+def plan_chunks(simulations, seed=None, size=CHUNK_SIZE):
+    # (seed, count) of every chunk of a seeded run, in order.
+    counts = [min(size, simulations - i) for i in range(0, simulations, size)]
+    return list(zip(np.random.SeedSequence(seed).spawn(len(counts)), counts))
+
+
+def monte_carlo(close, simulations, window_days, strategy_config, budget_usd, workers=1, seed=None, costs=None,
+                volume=None):
+    max_start = len(close) - window_days
+    tasks = [(s, c, max_start, window_days, strategy_config, budget_usd, costs)
+             for s, c in plan_chunks(simulations, seed)]
+    chunks = map_shared(_monte_carlo_chunk, tasks, series_arrays(close, volume, costs), workers)
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+def monte_carlo_chunk(close, chunk_seed, count, window_days, strategy_config, budget_usd, costs=None, volume=None):
+    # One chunk from plan_chunks, run in this process: the same profits
+    # monte_carlo returns for it, for callers that schedule chunks
+    # themselves (jobs.JobRunner).
+    task = (chunk_seed, count, len(close) - window_days, window_days, strategy_config, budget_usd, costs)
+    return map_shared(_monte_carlo_chunk, [task], series_arrays(close, volume, costs))[0]
+
+
+def _rolling_chunk(task):
+    starts, window_days, strategy_config, budget_usd, incremental, costs = task
+    close = get_array("close")
+    if incremental:
+        return engine.run_rolling(close, starts, window_days, GridStrategy(**strategy_config),
+                                  budget_usd, invest_fraction=0.2, costs=costs, volume=get_volume())
+    return [run_window(close, start, window_days, strategy_config, budget_usd, costs, get_volume())
+            for start in starts]
+
+
+def rolling(close, starts, window_days, strategy_config, budget_usd, workers=1, incremental=False, costs=None,
+            volume=None):
+    # Each chunk is a contiguous run of windows, which keeps the overlap that
+    # incremental mode reuses inside one worker.
+    size = WINDOWS_PER_CHUNK
+    tasks = [(starts[i:i + size], window_days, strategy_config, budget_usd, incremental, costs)
+             for i in range(0, len(starts), size)]
+    chunks = map_shared(_rolling_chunk, tasks, series_arrays(close, volume, costs), workers)
+    return [result for chunk in chunks for result in chunk]
@@ -0,0 +1,139 @@
+import numpy as np
+from strategies import GridStrategy
+import engine
+import parallel
+import performance
+from sweep import simulate_vectors
+
+# Paths are generated and simulated this many at a time, so memory stays at
+# one batch however many simulations are asked for.
+BATCH_SIZE = 10_000
+
+METHODS = ("bootstrap", "gbm", "garch")
+
+
+def log_returns(close):
+    close = np.asarray(close, dtype=np.float64)
+    return np.diff(np.log(close))
+
+
+def bootstrap_returns(returns, count, steps, rng, mean_block=5):
+    # Stationary block bootstrap (Politis-Romano): every step either continues
+    # the current block or, with probability 1/mean_block, jumps to a random
+    # day, so block lengths are geometric and volatility clusters survive.
+    n = len(returns)
+    out = np.empty((count, steps))
+    idx = rng.integers(0, n, size=count)
+    for t in range(steps):
+        if t:
+            jump = rng.random(count) < 1.0 / mean_block
+            idx = np.where(jump, rng.integers(0, n, size=count), (idx + 1) % n)
+        out[:, t] = returns[idx]
+    return out
+
+
+def gbm_returns(mu, sigma, count, steps, rng):
+    return mu - 0.5 * sigma * sigma + sigma * rng.standard_normal((count, steps))
+
+
+def garch_params(returns, alpha=0.08, beta=0.9):
+    # Variance targeting: omega is set so the long-run variance matches the
+    # history; alpha and beta are typical daily-crypto values, not a fit.
+    mu = returns.mean()
+    return {"mu": mu, "omega": returns.var() * (1.0 - alpha - beta), "alpha": alpha, "beta": beta}
+
+
+def garch_returns(mu, omega, alpha, beta, count, steps, rng, nu=5):
+    # GARCH(1,1) with Student-t shocks scaled to unit variance for fat tails.
+    scale = np.sqrt((nu - 2.0) / nu)
+    var = np.full(count, omega / (1.0 - alpha - beta))
+    out = np.empty((count, steps))
+    for t in range(steps):
+        shock = np.sqrt(var) * rng.standard_t(nu, size=count) * scale
+        out[:, t] = mu + shock
+        var = omega + alpha * shock * shock + beta * var
+    return out
+
+
+def generate_paths(method, returns, start_price, count, length, rng, **options):
+    # count x length price matrix; every path starts at start_price.
+    steps = length - 1
+    if method == "bootstrap":
+        r = bootstrap_returns(returns, count, steps, rng, **options)
+    elif method == "gbm":
+        r = gbm_returns(returns.mean() + 0.5 * returns.var(), returns.std(), count, steps, rng)
+    elif method == "garch":
+        r = garch_returns(**garch_params(returns, **options), count=count, steps=steps, rng=rng)
+    else:
+        raise ValueError(f"Unknown path method: {method}")
+    paths = np.empty((count, length))
+    paths[:, 0] = 0.0
+    np.cumsum(r, axis=1, out=paths[:, 1:])
+    return start_price * np.exp(paths)
+
+
+def simulate_paths(paths, strategy_config, budget_usd, invest_fraction=0.2, record_equity=False, costs=None):
+    # Same rules as parallel.run_window, with every path a column of the
+    # state vectors and one vectorized update per bar. Synthetic paths have
+    # no volume, so a cost model's impact term does not apply.
+    buy_step, sell_step, max_drawdown = engine.strategy_params(GridStrategy(**strategy_config))
+    return simulate_vectors(paths.T, buy_step, sell_step, max_drawdown, len(paths), budget_usd, invest_fraction,
+                            record_equity, costs)
+
+
+def _paths_chunk(task):
+    seed, count, method, options, window_days, strategy_config, budget_usd, costs = task
+    rng = np.random.default_rng(seed)
+    batch = generate_paths(method, parallel.get_array("returns"), parallel.get_array("start_price")[0],
+                           count, window_days, rng, **options)
+    run = simulate_paths(batch, strategy_config, budget_usd, record_equity=True, costs=costs)
+    stats = performance.equity_metrics(run["equity"], in_market=run["in_market"])
+    return {
+        "profit": run["final_value"] - budget_usd,
+        "max_drawdown": stats["max_drawdown"],
+        "max_drawdown_duration": stats["max_drawdown_duration"],
+        "sharpe": stats["sharpe"],
+        "sortino": stats["sortino"],
+        "exposure": stats["exposure"],
+        "profit_factor": performance.profit_factor(run["gross_profit"], run["gross_loss"]),
+    }
+
+
+def _shared(close):
+    return {"returns": log_returns(close), "start_price": np.asarray(close, dtype=np.float64)[-1:]}
+
+
+def monte_carlo(close, simulations, window_days, strategy_config, budget_usd, method="bootstrap", workers=1,
+                seed=None, costs=None, **options):
+    # Per-path profit and risk metrics of the grid strategy over synthetic
+    # windows generated from close's returns, as a dict of arrays. Chunks of
+    # BATCH_SIZE paths each get their own RNG stream, so results do not
+    # depend on the worker count.
+    if method not in METHODS:
+        raise ValueError(f"Unknown path method: {method}")
+    tasks = [(s, c, method, options, window_days, strategy_config, budget_usd, costs)
+             for s, c in parallel.plan_chunks(simulations, seed, BATCH_SIZE)]
+    chunks = parallel.map_shared(_paths_chunk, tasks, _shared(close), workers)
+    if not chunks:
+        return {}
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def monte_carlo_chunk(close, chunk_seed, count, window_days, strategy_config, budget_usd, method="bootstrap",
+                      costs=None, **options):
+    # One chunk from parallel.plan_chunks(..., BATCH_SIZE), run in this
+    # process, as monte_carlo would run it.
+    if method not in METHODS:
+        raise ValueError(f"Unknown path method: {method}")
+    task = (chunk_seed, count, method, options, window_days, strategy_config, budget_usd, costs)
+    return parallel.map_shared(_paths_chunk, [task], _shared(close))[0]
+
+
+def tail_stats(profits, levels=(0.05, 0.01)):
+    # Value at risk and expected shortfall, as losses in dollars.
+    profits = np.sort(np.asarray(profits))
+    stats = {}
+    for level in levels:
+        k = max(1, int(np.ceil(level * len(profits))))
+        stats[level] = {"var": float(-profits[k - 1]), "cvar": float(-profits[:k].mean())}
+    return stats
@@ -0,0 +1,170 @@
+import numpy as np
+import engine
+
+# Daily candles; pass periods_per_year=365 * 24 for hourly data and so on.
+PERIODS_PER_YEAR = 365
+
+
+def ratio(num, den):
+    # Elementwise num / den with 0 where den is 0.
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64))
+    out = np.zeros(num.shape)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def profit_factor(gross_profit, gross_loss):
+    gross_profit = np.asarray(gross_profit, dtype=np.float64)
+    return np.where(gross_loss > 0, ratio(gross_profit, gross_loss), np.where(gross_profit > 0, np.inf, 0.0))
+
+
+def _finish(metrics, single):
+    return {k: (v[0].item() if single else v) for k, v in metrics.items()}
+
+
+def drawdowns(equity):
+    # Drawdown from the running peak and bars since that peak, for every bar
+    # of every row, in two cumulative passes.
+    equity = np.asarray(equity, dtype=np.float64)
+    peak = np.maximum.accumulate(equity, axis=-1)
+    bars = np.arange(equity.shape[-1])
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, bars, 0), axis=-1)
+    return 1.0 - ratio(equity, peak), bars - last_peak
+
+
+def equity_metrics(equity, periods_per_year=PERIODS_PER_YEAR, in_market=None):
+    # Metrics for one equity curve, or for a runs x bars matrix of them at
+    # once (each value is then an array with one entry per run).
+    equity = np.asarray(equity, dtype=np.float64)
+    single = equity.ndim == 1
+    equity = np.atleast_2d(equity)
+    bars = equity.shape[1]
+
+    returns = ratio(equity[:, 1:], equity[:, :-1]) - 1.0 if bars > 1 else np.zeros((len(equity), 1))
+    mean = returns.mean(axis=1)
+    std = returns.std(axis=1, ddof=1) if returns.shape[1] > 1 else np.zeros(len(equity))
+    downside = np.sqrt((np.minimum(returns, 0.0) ** 2).mean(axis=1))
+    depth, duration = drawdowns(equity)
+    max_drawdown = depth.max(axis=1)
+
+    total_return = ratio(equity[:, -1], equity[:, 0]) - 1.0
+    years = max(bars - 1, 1) / periods_per_year
+    cagr = np.maximum(1.0 + total_return, 0.0) ** (1.0 / years) - 1.0
+
+    metrics = {
+        "total_return": total_return,
+        "cagr": cagr,
+        "sharpe": ratio(mean, std) * np.sqrt(periods_per_year),
+        "sortino": ratio(mean, downside) * np.sqrt(periods_per_year),
+        "max_drawdown": max_drawdown,
+        "max_drawdown_duration": duration.max(axis=1),
+        "calmar": ratio(cagr, max_drawdown),
+    }
+    if in_market is not None:
+        metrics["exposure"] = np.atleast_2d(in_market).mean(axis=1)
+    return _finish(metrics, single)
+
+
+@engine.njit(cache=True)
+def _lot_pnl(is_close, price, quantity, level, run, pnl, owner):
+    # Replays the trades lot by lot: a BUY adds to the lot on its level, a
+    # SELL or EXIT closes every open lot at or below its level, each at its
+    # own quantity times the fill. Lots stay sorted by level, as the grid
+    # keeps them. Fills pnl/owner per closed lot and returns how many.
+    n = len(price)
+    lot_level = np.empty(n, dtype=np.int64)
+    lot_qty = np.empty(n)
+    lot_cost = np.empty(n)
+    n_open = 0
+    n_closed = 0
+    for i in range(n):
+        if i > 0 and run[i] != run[i - 1]:
+            n_open = 0
+        if not is_close[i]:
+            s = np.searchsorted(lot_level[:n_open], level[i])
+            if s < n_open and lot_level[s] == level[i]:
+                lot_qty[s] += quantity[i]
+                lot_cost[s] += price[i] * quantity[i]
+                continue
+            for t in range(n_open, s, -1):
+                lot_level[t] = lot_level[t - 1]
+                lot_qty[t] = lot_qty[t - 1]
+                lot_cost[t] = lot_cost[t - 1]
+            lot_level[s] = level[i]
+            lot_qty[s] = quantity[i]
+            lot_cost[s] = price[i] * quantity[i]
+            n_open += 1
+        else:
+            k = np.searchsorted(lot_level[:n_open], level[i], side="right")
+            for t in range(k):
+                pnl[n_closed] = lot_qty[t] * price[i] - lot_cost[t]
+                owner[n_closed] = run[i]
+                n_closed += 1
+            for t in range(k, n_open):
+                lot_level[t - k] = lot_level[t]
+                lot_qty[t - k] = lot_qty[t]
+                lot_cost[t - k] = lot_cost[t]
+            n_open -= k
+    return n_closed
+
+
+def trade_metrics(action, price, quantity, run=None, runs=None, level=None):
+    # Round-trip statistics from engine trade arrays (or ledger columns). A
+    # round trip is every buy up to and including the sell or exit that
+    # closes it; positions still open at the end are left out. With levels
+    # (engine.run_backtest_grid's "trade_level") a sell closes only the lots
+    # at or below its level, and every lot is a round trip of its own, so
+    # partial sells count as the grid kernel counts them. With run ids (as
+    # stored by the ledger) the result has one entry per run.
+    action = np.asarray(action)
+    notional = np.asarray(price, dtype=np.float64) * np.asarray(quantity, dtype=np.float64)
+    single = run is None
+    run = np.zeros(len(action), dtype=np.int64) if run is None else np.asarray(run, dtype=np.int64)
+    runs = (int(run.max()) + 1 if len(run) else 1) if runs is None else runs
+
+    is_close = action != engine.BUY
+    if level is not None:
+        pnl = np.empty(len(action))
+        owner = np.empty(len(action), dtype=np.int64)
+        n_closed = _lot_pnl(is_close, np.ascontiguousarray(price, dtype=np.float64),
+                            np.ascontiguousarray(quantity, dtype=np.float64),
+                            np.ascontiguousarray(level, dtype=np.int64), run, pnl, owner)
+        pnl, owner = pnl[:n_closed], owner[:n_closed]
+    else:
+        starts = np.ones(len(action), dtype=bool)
+        starts[1:] = is_close[:-1] | (run[1:] != run[:-1])
+        position = np.cumsum(starts) - 1
+        n_positions = int(position[-1]) + 1 if len(position) else 0
+
+        cost = np.bincount(position, weights=np.where(is_close, 0.0, notional), minlength=n_positions)
+        proceeds = np.bincount(position, weights=np.where(is_close, notional, 0.0), minlength=n_positions)
+        closed = np.bincount(position, weights=is_close, minlength=n_positions) > 0
+        pnl = (proceeds - cost)[closed]
+        owner = run[starts][closed]
+    wins = pnl > 0
+    gross_profit = np.bincount(owner, weights=np.where(wins, pnl, 0.0), minlength=runs)
+    gross_loss = -np.bincount(owner, weights=np.where(wins, 0.0, pnl), minlength=runs)
+    round_trips = np.bincount(owner, minlength=runs)
+    n_wins = np.bincount(owner, weights=wins, minlength=runs)
+
+    metrics = {
+        "trades": np.bincount(run, minlength=runs),
+        "round_trips": round_trips,
+        "win_rate": ratio(n_wins, round_trips),
+        "profit_factor": profit_factor(gross_profit, gross_loss),
+        "avg_trade": ratio(gross_profit - gross_loss, round_trips),
+        "avg_win": ratio(gross_profit, n_wins),
+        "avg_loss": ratio(gross_loss, round_trips - n_wins),
+        "traded_notional": np.bincount(run, weights=notional, minlength=runs),
+    }
+    return _finish(metrics, single)
+
+
+def backtest_metrics(close, result, budget_usd, periods_per_year=PERIODS_PER_YEAR):
+    # Everything above for one engine result.
+    curve = engine.equity_curve(close, result, budget_usd)
+    metrics = equity_metrics(curve["equity"], periods_per_year, curve["coin"] > 0)
+    metrics.update(trade_metrics(result["trade_action"], result["trade_price"], result["trade_quantity"],
+                                 level=result.get("trade_level")))
+    metrics["turnover"] = metrics["traded_notional"] / curve["equity"].mean() if len(close) else 0.0
+    return metrics
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from binance.client import Client
+from requests.adapters import HTTPAdapter
+from bot import TradingBot
+from execution import OrderExecutor, USER_STREAM_URL
+from live import StreamRunner
+import state
+import telemetry
+
+
+class SharedBudget:
+    # One cash pool for every pair. A symbol may have at most its limit
+    # invested at a time; sale proceeds go back to the shared pool.
+    def __init__(self, cash_usd=0):
+        self.cash = cash_usd
+        self.limits = {}
+        self.invested = {}
+        self.realized = {}
+
+    def deposit(self, amount_usd):
+        self.cash += amount_usd
+
+    def set_limit(self, symbol, limit_usd=None):
+        self.limits[symbol] = float("inf") if limit_usd is None else limit_usd
+        self.invested.setdefault(symbol, 0.0)
+        self.realized.setdefault(symbol, 0.0)
+
+    def account(self, symbol):
+        return SymbolAccount(self, symbol)
+
+    def state(self):
+        return {"cash": self.cash, "limits": self.limits, "invested": self.invested, "realized": self.realized}
+
+    def restore(self, state):
+        self.cash = state["cash"]
+        self.limits = dict(state["limits"])
+        self.invested = dict(state["invested"])
+        self.realized = dict(state["realized"])
+
+    def summary(self):
+        return {
+            "cash": self.cash,
+            "invested": sum(self.invested.values()),
+            "realized": sum(self.realized.values()),
+            "symbols": {
+                symbol: {"limit": limit, "invested": self.invested[symbol], "realized": self.realized[symbol]}
+                for symbol, limit in self.limits.items()
+            },
+        }
+
+
+class SymbolAccount:
+    # One bot's view of the shared pool. Several bots may trade the same
+    # symbol; they share its limit but settle their own positions.
+    def __init__(self, pool, symbol):
+        self.pool = pool
+        self.symbol = symbol
+        self.invested = 0.0
+
+    @property
+    def cash(self):
+        return self.available()
+
+    def available(self):
+        headroom = self.pool.limits[self.symbol] - self.pool.invested[self.symbol]
+        return max(0.0, min(self.pool.cash, headroom))
+
+    def spend(self, amount):
+        self.invested += amount
+        self.pool.cash -= amount
+        self.pool.invested[self.symbol] += amount
+
+    def refund(self, amount):
+        # Cash reserved for an order that filled for less, or not at all.
+        self.invested -= amount
+        self.pool.cash += amount
+        self.pool.invested[self.symbol] -= amount
+
+    def receive(self, amount, share=1.0):
+        # Proceeds of selling share of the position (all of it unless a grid
+        # sells single lots) settle that share of what this bot invested.
+        cost = self.invested if share >= 1.0 else self.invested * share
+        self.pool.cash += amount
+        self.pool.invested[self.symbol] -= cost
+        self.pool.realized[self.symbol] += amount - cost
+        self.invested -= cost
+
+    def scale(self, factor):
+        # Coin the exchange no longer holds: its share of the cost leaves
+        # the position as a realized loss.
+        cost = self.invested * (1.0 - factor)
+        self.pool.invested[self.symbol] -= cost
+        self.pool.realized[self.symbol] -= cost
+        self.invested -= cost
+
+    def state(self):
+        return {"invested": self.invested}
+
+    def restore(self, state):
+        self.invested = state["invested"]
+
+
+class Portfolio:
+    # Hosts many (symbol, strategy) pairs in one process: one Binance client
+    # with a pooled HTTP session, one multiplexed price stream on one event
+    # loop, and one shared budget.
+    def __init__(self, api_key, api_secret, budget_usd=0, client=None, pool_size=50, stream_url=None,
+                 metrics_port=None, live_orders=False, user_stream_url=USER_STREAM_URL, costs=None, store=None,
+                 on_tick=None):
+        self.client = client or Client(api_key, api_secret)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.client.session.mount("https://", adapter)
+        self.budget = SharedBudget(budget_usd)
+        # With a state.StateStore the budget and every bot resume from their
+        # journaled state; budget_usd and deposits only count on first start.
+        self.store = store
+        if store is not None and store.get(state.BUDGET_KEY) is not None:
+            self.budget.restore(store.get(state.BUDGET_KEY))
+        self.runner = StreamRunner([], url=stream_url)
+        # Without live_orders the bots paper-trade against the shared budget.
+        self.executor = OrderExecutor(self.client, user_stream_url) if live_orders else None
+        self.costs = costs  # fees and slippage charged on paper fills
+        self.on_tick = on_tick  # passed to every bot (see TradingBot)
+        self.added = {}  # bots added per symbol
+        self.loop = None
+        self.thread = None
+        self.metrics_server = telemetry.serve(metrics_port) if metrics_port else None
+
+    @property
+    def bots(self):
+        return [bot for bots in self.runner.bots.values() for bot in bots]
+
+    def add(self, symbol, strategy, limit_usd=None, deposit_usd=0):
+        symbol = symbol.upper()
+        self.budget.set_limit(symbol, limit_usd)
+        # Bots are keyed by symbol and order of adding, so the same add()
+        # calls after a restart find their own state again.
+        key = f"{symbol}#{self.added.get(symbol, 0)}"
+        self.added[symbol] = self.added.get(symbol, 0) + 1
+        bot = TradingBot(None, None, strategy, symbol=symbol, client=self.client,
+                         account=self.budget.account(symbol), executor=self.executor, costs=self.costs,
+                         store=self.store, key=key, on_tick=self.on_tick)
+        if not bot.restored:
+            self.budget.deposit(deposit_usd)
+            bot.save()
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.runner.add, bot)
+        else:
+            self.runner.add(bot)
+        return bot
+
+    async def run(self, log):
+        self.loop = asyncio.get_running_loop()
+        if self.executor is None:
+            await self.runner.run(log)
+            return
+        if self.store is not None:
+            # Only live positions exist on the exchange to reconcile against.
+            await asyncio.to_thread(state.reconcile, self.bots, self.client, log)
+        await self.executor.start(log)
+        try:
+            await self.runner.run(log)
+        finally:
+            await self.executor.stop()
+
+    def run_forever(self, log):
+        asyncio.run(self.run(log))
+
+    def start(self, log):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run_forever, args=(log,), daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        for bot in self.bots:
+            bot.stop()
+        if self.store is not None:
+            self.store.snapshot()
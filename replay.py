@@ -0,0 +1,134 @@
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import candles
+from bot import TradingBot
+from strategies import AdaptiveDCARecoveryStrategy
+
+
+class VirtualClock:
+    # Stands in for time.monotonic / time.sleep: sleeping moves the clock
+    # forward instead of waiting. speed=None runs as fast as possible,
+    # otherwise every virtual second takes 1/speed real seconds.
+    def __init__(self, start=0.0, speed=None, real_sleep=time.sleep):
+        self.now = float(start)
+        self.speed = speed
+        self.real_sleep = real_sleep
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if self.speed:
+            self.real_sleep(seconds / self.speed)
+        self.now += seconds
+
+
+def load_ticks(path):
+    # CSV with a price column and either a millisecond timestamp or a date.
+    df = pd.read_csv(path)
+    if "timestamp" in df:
+        times = df["timestamp"].to_numpy(dtype=np.float64) / 1000
+    else:
+        times = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ms]").astype(np.int64) / 1000
+    order = np.argsort(times, kind="stable")
+    return times[order], df["price"].to_numpy(dtype=np.float64)[order]
+
+
+def load_candles(path):
+    # A candle's close is only known once the candle has ended, so each close
+    # is stamped with its candle's end time and the replay never sees a
+    # price before live trading could have.
+    store = candles.open_store(path)
+    times = np.asarray(store.timestamp, dtype=np.float64) / 1000
+    bar = float(np.median(np.diff(times))) if len(times) > 1 else 60.0
+    return times + bar, np.array(store.close)
+
+
+def load_tape(path):
+    # Tick files are CSVs with a price column; anything else is read as
+    # candles (a CSV export or a .candles store).
+    if path.endswith(".csv") and "price" in pd.read_csv(path, nrows=0).columns:
+        return load_ticks(path)
+    return load_candles(path)
+
+
+class FakeClient:
+    # Answers the client calls TradingBot and StreamRunner make with the last
+    # recorded price at or before the virtual clock's time.
+    def __init__(self, tapes, clock):
+        self.tapes = tapes  # symbol -> (times in seconds, prices)
+        self.clock = clock
+        self.requests = 0
+
+    def price(self, symbol):
+        times, prices = self.tapes[symbol]
+        i = int(np.searchsorted(times, self.clock(), side="right")) - 1
+        if i < 0:
+            raise ValueError(f"No recorded {symbol} price before {self.clock()}")
+        return float(prices[i])
+
+    def get_symbol_ticker(self, symbol=None):
+        self.requests += 1
+        if symbol is not None:
+            return {"symbol": symbol, "price": str(self.price(symbol))}
+        now = self.clock()
+        return [{"symbol": s, "price": str(self.price(s))} for s, (times, _) in self.tapes.items()
+                if len(times) and times[0] <= now]
+
+
+class Replay:
+    # Runs the unchanged TradingBot loop (paper mode) over recorded prices:
+    # the bot gets a FakeClient plus the virtual clock's time and sleep, and
+    # is stopped once the clock has passed the last recorded price. The log
+    # is stamped with virtual time and is the same on every run, so it can be
+    # diffed against a saved one; that is why telemetry summaries (wall-clock
+    # latencies, process-wide counts) are left out unless summary_every asks.
+    def __init__(self, path, strategy, symbol="BTCUSDT", budget_usd=1000, speed=None, interval=60, costs=None):
+        times, prices = load_tape(path)
+        if not len(times):
+            raise ValueError(f"{path} has no prices")
+        self.symbol = symbol
+        self.initial_budget = budget_usd
+        self.clock = VirtualClock(times[0], speed)
+        if hasattr(strategy, "clock"):
+            strategy.clock = self.clock  # SmartStrategy's bars follow virtual time
+        self.end = times[-1]
+        self.first_price = float(prices[0])
+        self.client = FakeClient({symbol: (times, prices)}, self.clock)
+        self.bot = TradingBot(None, None, strategy, symbol=symbol, budget_usd=budget_usd, client=self.client,
+                              costs=costs, clock=self.clock, sleep=self.sleep, interval=interval)
+
+    def sleep(self, seconds):
+        self.clock.sleep(seconds)
+        if self.clock() > self.end:
+            self.bot.stop()
+
+    def stamp(self, log):
+        def stamped(message):
+            when = datetime.fromtimestamp(self.clock(), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            log(f"[{when}] {message}")
+        return stamped
+
+    def run(self, log=print, summary_every=0):
+        started = time.perf_counter()
+        self.bot.run(self.stamp(log), summary_every)
+        price = self.client.price(self.symbol)
+        return {
+            "cycles": self.client.requests,
+            "final_value": self.bot.budget + self.bot.coin * price,
+            "cash": self.bot.budget,
+            "coin": self.bot.coin,
+            "buy_hold": self.initial_budget * price / self.first_price,
+            "elapsed": time.perf_counter() - started,
+        }
+
+
+if __name__ == "__main__":
+    strategy = AdaptiveDCARecoveryStrategy(buy_threshold=0.05, sell_threshold=0.10, max_drawdown=0.30)
+    replay = Replay("btc_usdt_1y.csv", strategy, budget_usd=1000)
+    with open("replay.log", "w") as f:
+        summary = replay.run(lambda message: f.write(message + "\n"))
+    print(f"✅ Replayed {summary['cycles']} cycles in {summary['elapsed']:.1f}s (log in replay.log)")
+    print(f"Final value: ${summary['final_value']:.2f} | Buy & hold: ${summary['buy_hold']:.2f}")
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+from execution import Order, FINAL_STATUSES, ORDER_NOT_FOUND
+
+STATE_DIR = "state"
+SNAPSHOT_EVERY = 1000
+BUDGET_KEY = "budget"  # a Portfolio's SharedBudget
+
+
+class StateStore:
+    # Live state as an append-only journal plus a snapshot. Every change
+    # appends one JSON line with the full state of each key it touched (so a
+    # trade that moves a bot and the shared budget is one atomic line) and
+    # is fsynced before record() returns. Every snapshot_every lines the
+    # merged state is written to the snapshot through a temp file and a
+    # rename, and the journal starts over; loading reads the snapshot plus
+    # the lines after it, which takes milliseconds.
+    def __init__(self, directory=STATE_DIR, snapshot_every=SNAPSHOT_EVERY, fsync=True):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.journal_path = os.path.join(directory, "journal.jsonl")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        os.makedirs(directory, exist_ok=True)
+        self.states, self.seq = self._load()
+        self.journal = None
+        # Compacting on open also drops a line torn by a crash mid-write, so
+        # new lines are never appended behind it.
+        self._snapshot()
+
+    def _load(self):
+        states, seq = {}, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            states, seq = snapshot["states"], snapshot["seq"]
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    # Lines already in the snapshot are left over when the
+                    # process stopped between writing it and truncating.
+                    if entry["seq"] > seq:
+                        states.update(entry["states"])
+                        seq = entry["seq"]
+        return states, seq
+
+    def get(self, key):
+        return self.states.get(key)
+
+    def record(self, states):
+        with self.lock:
+            self.seq += 1
+            self.states.update(states)
+            self.journal.write(json.dumps({"seq": self.seq, "states": states}) + "\n")
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+            self.lines += 1
+            if self.lines >= self.snapshot_every:
+                self._snapshot()
+
+    def snapshot(self):
+        with self.lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        tmp = f"{self.snapshot_path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump({"seq": self.seq, "states": self.states}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, "w")
+        self.lines = 0
+
+    def close(self):
+        with self.lock:
+            self._snapshot()
+            self.journal.close()
+
+
+def settle_pending(bot, client, log=print):
+    # An order that was in flight when the process stopped: look up how it
+    # ended, cancelling it first if it is still open, and apply the fill.
+    pending = bot.pending
+    order = Order(pending["client_order_id"], bot.symbol, pending["side"], pending["quantity"])
+    try:
+        info = client.get_order(symbol=bot.symbol, origClientOrderId=order.client_order_id)
+        if info["status"] not in FINAL_STATUSES:
+            client.cancel_order(symbol=bot.symbol, origClientOrderId=order.client_order_id)
+            info = client.get_order(symbol=bot.symbol, origClientOrderId=order.client_order_id)
+        order.status = info["status"]
+        order.executed_qty = float(info["executedQty"])
+        order.quote_qty = float(info["cummulativeQuoteQty"])
+    except Exception as e:
+        if getattr(e, "code", None) != ORDER_NOT_FOUND:
+            raise
+        order.status = "REJECTED"  # queued but never sent
+    log(f"🔁 {bot.symbol}: order {order.client_order_id} from before the restart ended {order.status}")
+    bot.settle(order, log)
+
+
+def reconcile(bots, client, log=print):
+    # Run once on startup before any live trading: settles orders left in
+    # flight, then checks each symbol's recorded coin against the exchange
+    # balance. Positions are scaled down when the exchange holds less (buy
+    # commissions taken in the coin, or coin sold by hand), and the cost of
+    # the missing coin is booked as a loss in each bot's account; coin held
+    # beyond what the bots bought is left alone.
+    for bot in bots:
+        if bot.pending is not None:
+            settle_pending(bot, client, log)
+
+    by_symbol = {}
+    for bot in bots:
+        by_symbol.setdefault(bot.symbol, []).append(bot)
+    for symbol, group in by_symbol.items():
+        recorded = sum(bot.coin for bot in group)
+        if recorded <= 0:
+            continue
+        asset = client.get_symbol_info(symbol)["baseAsset"]
+        balance = client.get_asset_balance(asset=asset)
+        held = float(balance["free"]) + float(balance["locked"])
+        if held < recorded * (1 - 1e-9):
+            log(f"⚠️ {symbol}: exchange holds {held:.8f} {asset}, state has {recorded:.8f}; scaling positions down")
+            for bot in group:
+                bot.scale_position(held / recorded)
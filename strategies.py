@@ -1,90 +1,475 @@
-class AdaptiveDCARecoveryStrategy:
+import time
+import numpy as np
+from indicators import IndicatorStream, NAMES, njit
+
+HOLD = 0
+BUY = 1
+SELL = 2
+EXIT = 3
+
+SPACINGS = {"fixed": 0, "atr": 1, "volatility": 2}
+ATR_COLUMN = NAMES.index("atr")
+VOL_COLUMN = NAMES.index("volatility")
+
+
+class PositionState:
+    # Fixed-size running state of the open position: no per-buy list, so a
+    # strategy costs the same few slots however long it has been holding.
+    __slots__ = ("last_buy_price", "total_invested", "total_quantity", "buy_count")
+
+    def reset(self):
+        self.last_buy_price = None
+        self.total_invested = 0
+        self.total_quantity = 0
+        self.buy_count = 0
+
+    def on_buy(self, price, quantity):
+        self.last_buy_price = price
+        self.total_quantity += quantity
+        self.total_invested += price * quantity
+        self.buy_count += 1
+
+    def on_sell(self):
+        self.reset()
+
+    def sell_quantity(self, coin):
+        # How much of the coin held a SELL or EXIT from decide() sells.
+        return coin
+
+    def state(self):
+        return {name: getattr(self, name) for name in PositionState.__slots__}
+
+    def restore(self, state):
+        for name in PositionState.__slots__:
+            setattr(self, name, state[name])
+
+    def scale(self, factor):
+        # Shrinks the open position without moving its average price.
+        if factor <= 0:
+            self.reset()
+            return
+        self.total_quantity *= factor
+        self.total_invested *= factor
+
+    def should_buy(self, current_price):
+        return self.decide(current_price) == BUY
+
+    def should_sell(self, current_price):
+        return self.buy_count > 0 and self._exit_signal(current_price) == SELL
+
+    def should_exit(self, current_price):
+        return self.buy_count > 0 and self._exit_signal(current_price) == EXIT
+
+    def decide(self, current_price):
+        # One call per price: BUY, SELL, EXIT or HOLD, checked in the same
+        # order the bot and the backtesters always used.
+        if self.buy_count == 0:
+            return BUY  # First entry
+        if (self.last_buy_price - current_price) / self.last_buy_price >= self.buy_step:
+            return BUY
+        return self._exit_signal(current_price)
+
+    def _exit_signal(self, current_price):
+        if not self.total_quantity:
+            return HOLD
+        avg_price = self.total_invested / self.total_quantity
+        if (current_price - avg_price) / avg_price >= self.sell_step:
+            return SELL
+        if (avg_price - current_price) / avg_price >= self.max_drawdown:
+            return EXIT
+        return HOLD
+
+
+class AdaptiveDCARecoveryStrategy(PositionState):
+    __slots__ = ("buy_threshold", "sell_threshold", "max_drawdown")
+
     def __init__(self, buy_threshold=0.10, sell_threshold=0.10, max_drawdown=0.30):
         self.buy_threshold = buy_threshold
         self.sell_threshold = sell_threshold
         self.max_drawdown = max_drawdown
         self.reset()
 
-    def reset(self):
-        self.buy_prices = []
-        self.total_invested = 0
-        self.total_quantity = 0
-        self.last_action_price = None
+    @property
+    def buy_step(self):
+        return self.buy_threshold
+
+    @property
+    def sell_step(self):
+        return self.sell_threshold
 
     def average_price(self):
         return self.total_invested / self.total_quantity if self.total_quantity > 0 else None
 
-    def should_buy(self, current_price):
-        if not self.buy_prices:
-            return True  # First entry
 
-        last_price = self.buy_prices[-1]
-        dip = (last_price - current_price) / last_price
-        return dip >= self.buy_threshold
+class GridStrategy(PositionState):
+    __slots__ = ("grid_size", "max_levels", "max_drawdown")
 
-    def should_sell(self, current_price):
-        avg_price = self.average_price()
-        if not avg_price:
-            return False
+    def __init__(self, grid_size=0.10, max_levels=5, max_drawdown=0.30):
+        self.grid_size = grid_size
+        self.max_levels = max_levels
+        self.max_drawdown = max_drawdown
+        self.reset()
 
-        gain = (current_price - avg_price) / avg_price
-        return gain >= self.sell_threshold
+    @property
+    def buy_step(self):
+        return self.grid_size
 
-    def should_exit(self, current_price):
-        avg_price = self.average_price()
-        if not avg_price:
-            return False
+    @property
+    def sell_step(self):
+        return self.grid_size
 
-        loss = (avg_price - current_price) / avg_price
-        return loss >= self.max_drawdown
+    def average_price(self):
+        return self.total_invested / self.total_quantity if self.total_quantity > 0 else 0
 
-    def on_buy(self, price, quantity):
-        self.buy_prices.append(price)
-        self.total_quantity += quantity
-        self.total_invested += price * quantity
 
-    def on_sell(self):
+class SimpleStrategy(PositionState):
+    # Buy every buy_threshold drop, sell the whole position at sell_threshold
+    # profit, never force an exit.
+    __slots__ = ("buy_threshold", "sell_threshold")
+
+    max_drawdown = 1.0
+
+    def __init__(self, buy_threshold=0.10, sell_threshold=0.10):
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
         self.reset()
 
+    @property
+    def buy_step(self):
+        return self.buy_threshold
 
-class GridStrategy:
-    def __init__(self, grid_size=0.10, max_levels=5, max_drawdown=0.30):
+    @property
+    def sell_step(self):
+        return self.sell_threshold
+
+    def average_price(self):
+        return self.total_invested / self.total_quantity if self.total_quantity > 0 else None
+
+
+class IndicatorBars:
+    # Mixin for strategies that read indicators: they are computed on closed
+    # bars of bar_seconds, warmed up from df; live ticks are gathered into
+    # the current bar and the indicators move on when the clock enters the
+    # next one, so a decision only ever sees bars that have closed (the
+    # engine's kernels decide on each candle's close with that candle's
+    # values). The leaf class holds the slots.
+    __slots__ = ()
+
+    def _init_bars(self, df, bar_seconds, clock, periods):
+        self._stream = IndicatorStream(**periods)
+        self.periods = self._stream.periods
+        self._clock = clock
+        self._bar = None  # [start, high, low, close] of the bar still forming
+        self.bar_seconds = bar_seconds
+        if df is not None:
+            self.warm_up(df)
+        if self.bar_seconds is None:
+            self.bar_seconds = 86400
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @clock.setter
+    def clock(self, clock):
+        self._clock = clock
+
+    @property
+    def indicators(self):
+        return self._stream.values
+
+    def warm_up(self, df):
+        # df has date/high/low/close columns. Candles that have closed by
+        # now feed the indicators; one still open becomes the forming bar.
+        opens = df["date"].to_numpy(dtype="datetime64[ms]").astype(np.int64) / 1000
+        if self.bar_seconds is None:
+            self.bar_seconds = float(np.median(np.diff(opens))) if len(opens) > 1 else 86400
+        now = self._clock()
+        current = now - now % self.bar_seconds
+        n = int(np.searchsorted(opens, current, side="left"))
+        columns = {col: df[col].to_numpy(dtype=np.float64) for col in ("high", "low", "close")}
+        self._stream.warm_up({col: values[:n] for col, values in columns.items()})
+        if n < len(opens) and opens[n] == current:
+            self._bar = [current, columns["high"][n], columns["low"][n], columns["close"][n]]
+
+    def on_candle(self, high, low, close):
+        self._stream.update(high, low, close)
+
+    def on_price(self, price, now):
+        start = now - now % self.bar_seconds
+        bar = self._bar
+        if bar is None or start > bar[0]:
+            if bar is not None:
+                self.on_candle(bar[1], bar[2], bar[3])
+            self._bar = [start, price, price, price]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+
+
+class SmartStrategy(IndicatorBars, PositionState):
+    # Indicator-driven DCA: enter when RSI is oversold or the price is at the
+    # lower Bollinger band, add a level every atr_step ATRs below the last
+    # buy, take profit once the position is min_profit up and RSI is
+    # overbought or the price is at the upper band, and exit at max_drawdown.
+    # engine.run_backtest_indicators makes the same decisions. Private slots
+    # are runtime state, not parameters.
+    __slots__ = ("rsi_buy", "rsi_sell", "atr_step", "min_profit", "max_drawdown", "bar_seconds", "periods",
+                 "_stream", "_clock", "_bar")
+
+    def __init__(self, df=None, rsi_buy=30, rsi_sell=70, atr_step=1.0, min_profit=0.02, max_drawdown=0.30,
+                 bar_seconds=None, clock=time.time, **periods):
+        self.rsi_buy = rsi_buy
+        self.rsi_sell = rsi_sell
+        self.atr_step = atr_step
+        self.min_profit = min_profit
+        self.max_drawdown = max_drawdown
+        self.reset()
+        self._init_bars(df, bar_seconds, clock, periods)
+
+    def decide(self, current_price):
+        self.on_price(current_price, self._clock())
+        return self.signal(current_price)
+
+    def signal(self, current_price):
+        stream = self._stream
+        if not stream.ready:
+            return HOLD
+        values = stream.values
+        rsi, atr, bb_upper, bb_lower = values["rsi"], values["atr"], values["bb_upper"], values["bb_lower"]
+        if self.buy_count == 0:
+            return BUY if rsi <= self.rsi_buy or current_price <= bb_lower else HOLD
+        if current_price <= self.last_buy_price - self.atr_step * atr:
+            return BUY
+        avg_price = self.total_invested / self.total_quantity
+        if (current_price - avg_price) / avg_price >= self.min_profit and (
+                rsi >= self.rsi_sell or current_price >= bb_upper):
+            return SELL
+        if (avg_price - current_price) / avg_price >= self.max_drawdown:
+            return EXIT
+        return HOLD
+
+    def _exit_signal(self, current_price):
+        action = self.signal(current_price) if self.total_quantity else HOLD
+        return action if action in (SELL, EXIT) else HOLD
+
+    def average_price(self):
+        return self.total_invested / self.total_quantity if self.total_quantity > 0 else None
+
+
+@njit(cache=True)
+def grid_step(spacing, grid_size, width, atr, volatility):
+    # Level spacing for a grid laid out now, and whether it is in price
+    # (ATR) rather than a fraction of the base.
+    if spacing == 1 and atr > 0.0:
+        return width * atr, True
+    if spacing == 2 and volatility > 0.0:
+        return width * volatility, False
+    return grid_size, False
+
+
+@njit(cache=True)
+def grid_levels(levels, base, step, arithmetic):
+    # max_levels buy levels ascending up to the base price, then the level
+    # the base lot sells at. Spacing is step * base apart (geometric) or a
+    # fixed step in price (arithmetic, for ATR).
+    top = len(levels) - 2
+    for j in range(len(levels)):
+        if arithmetic:
+            levels[j] = base + (j - top) * step
+        else:
+            levels[j] = base * (1.0 + step) ** float(j - top)
+
+
+@njit(cache=True)
+def grid_signal(levels, held, n_held, price, quantity, invested, max_drawdown):
+    # (action, argument) for one price, by binary search only: SELL the k
+    # lowest lots whose next level up has been reached, EXIT all n_held lots
+    # at max_drawdown, or BUY a lot on the lowest empty level at or above the
+    # price. held is the sorted level index of each open lot.
+    if n_held > 0:
+        reached = np.searchsorted(levels, price, side="right") - 1
+        k = np.searchsorted(held[:n_held], reached - 1, side="right")
+        if k > 0:
+            return SELL, k
+        avg_price = invested / quantity
+        if (avg_price - price) / avg_price >= max_drawdown:
+            return EXIT, n_held
+    level = grid_open_level(levels, held, n_held, price)
+    if level >= 0:
+        return BUY, level
+    return HOLD, 0
+
+
+@njit(cache=True)
+def grid_open_level(levels, held, n_held, price):
+    # Lowest buy level at or above price without a lot, or -1.
+    pos = np.searchsorted(levels, price, side="left")
+    s = np.searchsorted(held[:n_held], pos, side="left")
+    # held[s:] starts with a run of consecutive levels pos, pos + 1, ...;
+    # the first empty level is where that run breaks.
+    lo = 0
+    hi = n_held - s
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if held[s + mid] == pos + mid:
+            lo = mid + 1
+        else:
+            hi = mid
+    return pos + lo if pos + lo <= len(levels) - 2 else -1
+
+
+@njit(cache=True)
+def grid_add_lot(held, lot_qty, lot_cost, n_held, level, qty, cost):
+    s = np.searchsorted(held[:n_held], level)
+    for t in range(n_held, s, -1):
+        held[t] = held[t - 1]
+        lot_qty[t] = lot_qty[t - 1]
+        lot_cost[t] = lot_cost[t - 1]
+    held[s] = level
+    lot_qty[s] = qty
+    lot_cost[s] = cost
+    return n_held + 1
+
+
+@njit(cache=True)
+def grid_remove_lots(held, lot_qty, lot_cost, n_held, k):
+    # Drops the k lowest lots.
+    for t in range(k, n_held):
+        held[t - k] = held[t]
+        lot_qty[t - k] = lot_qty[t]
+        lot_cost[t - k] = lot_cost[t]
+    return n_held - k
+
+
+class LevelGridStrategy(IndicatorBars, PositionState):
+    # Multi-level grid: max_levels buy levels below a base price, each
+    # holding at most one lot that sells on its own once the price reaches
+    # the next level up. Levels are laid out when the grid is flat, around
+    # the current price, grid_size apart, or width ATRs / width times the
+    # bar volatility apart with spacing="atr" / "volatility" (grid_size until
+    # the indicators are warmed up). Lookups are binary searches over the
+    # sorted level array, so the cost per price barely grows with the level
+    # count. engine.run_backtest_grid and run_grid_batch make the same
+    # decisions.
+    __slots__ = ("grid_size", "max_levels", "max_drawdown", "spacing", "width", "bar_seconds", "periods",
+                 "_stream", "_clock", "_bar", "_levels", "_held", "_lot_qty", "_lot_cost", "_n_held", "_signal")
+
+    def __init__(self, grid_size=0.02, max_levels=20, max_drawdown=0.30, spacing="fixed", width=1.0, df=None,
+                 bar_seconds=None, clock=time.time, **periods):
+        if spacing not in SPACINGS:
+            raise ValueError(f"Unknown grid spacing '{spacing}', expected one of {list(SPACINGS)}")
         self.grid_size = grid_size
         self.max_levels = max_levels
         self.max_drawdown = max_drawdown
+        self.spacing = spacing
+        self.width = width
+        self._levels = np.zeros(max_levels + 1)
+        self._held = np.zeros(max_levels, dtype=np.int64)
+        self._lot_qty = np.zeros(max_levels)
+        self._lot_cost = np.zeros(max_levels)
         self.reset()
+        self._init_bars(df, bar_seconds, clock, periods)
 
     def reset(self):
-        self.positions = []
-        self.total_invested = 0
-        self.total_quantity = 0
-        self.base_price = None
+        PositionState.reset(self)
+        self._n_held = 0
+        self._signal = (HOLD, 0)
 
-    def average_price(self):
-        return self.total_invested / self.total_quantity if self.total_quantity > 0 else 0
+    @property
+    def levels(self):
+        return self._levels
 
-    def should_buy(self, current_price):
-        if not self.positions:
-            return True
-        last_price = self.positions[-1][0]
-        return (last_price - current_price) / last_price >= self.grid_size
+    def lots(self):
+        n = self._n_held
+        return list(zip(self._held[:n].tolist(), self._lot_qty[:n].tolist(), self._lot_cost[:n].tolist()))
 
-    def should_sell(self, current_price):
-        if not self.positions:
-            return False
-        avg_price = self.average_price()
-        return (current_price - avg_price) / avg_price >= self.grid_size
+    def recenter(self, price):
+        step, arithmetic = grid_step(SPACINGS[self.spacing], self.grid_size, self.width,
+                                     self._stream.row[ATR_COLUMN], self._stream.row[VOL_COLUMN])
+        grid_levels(self._levels, float(price), step, arithmetic)
 
-    def should_exit(self, current_price):
-        if not self.positions:
-            return False
-        avg_price = self.average_price()
-        return (avg_price - current_price) / avg_price >= self.max_drawdown
+    def decide(self, current_price):
+        self.on_price(current_price, self._clock())
+        return self.signal(current_price)
+
+    def signal(self, current_price):
+        if self._n_held == 0:
+            self.recenter(current_price)
+        action, arg = grid_signal(self._levels, self._held, self._n_held, float(current_price),
+                                  float(self.total_quantity), float(self.total_invested), float(self.max_drawdown))
+        self._signal = (action, arg)
+        return action
+
+    def sell_quantity(self, coin):
+        action, k = self._signal
+        if action not in (SELL, EXIT) or k >= self._n_held:
+            return coin
+        return min(coin, float(self._lot_qty[:k].sum()))
 
     def on_buy(self, price, quantity):
-        self.positions.append((price, quantity))
-        self.total_quantity += quantity
-        self.total_invested += price * quantity
+        action, level = self._signal
+        if self._n_held >= self.max_levels:
+            # Every level already holds a lot; like decide(), take no more.
+            self._signal = (HOLD, 0)
+            return
+        if action != BUY:
+            # A fill the last signal did not ask for (an order settled after
+            # a restart) takes the lowest free level at or above its price,
+            # else the highest free one.
+            level = grid_open_level(self._levels, self._held, self._n_held, float(price))
+            if level < 0:
+                level = max(set(range(self.max_levels)) - set(self._held[:self._n_held].tolist()))
+        self._n_held = grid_add_lot(self._held, self._lot_qty, self._lot_cost, self._n_held, level,
+                                    float(quantity), float(price) * float(quantity))
+        self._signal = (HOLD, 0)
+        self.last_buy_price = price
+        self._totals()
 
     def on_sell(self):
-        self.reset()
\ No newline at end of file
+        action, k = self._signal
+        if action not in (SELL, EXIT) or k >= self._n_held:
+            self.reset()
+            return
+        self._n_held = grid_remove_lots(self._held, self._lot_qty, self._lot_cost, self._n_held, k)
+        self._signal = (HOLD, 0)
+        self._totals()
+
+    def _totals(self):
+        n = self._n_held
+        self.total_quantity = float(self._lot_qty[:n].sum())
+        self.total_invested = float(self._lot_cost[:n].sum())
+        self.buy_count = n
+
+    def _exit_signal(self, current_price):
+        if not self._n_held:
+            return HOLD
+        action, _ = grid_signal(self._levels, self._held, self._n_held, float(current_price),
+                                float(self.total_quantity), float(self.total_invested), float(self.max_drawdown))
+        return action if action in (SELL, EXIT) else HOLD
+
+    def state(self):
+        state = PositionState.state(self)
+        state["levels"] = self._levels.tolist()
+        state["lots"] = self.lots()
+        return state
+
+    def restore(self, state):
+        PositionState.restore(self, state)
+        self._levels[:] = state["levels"]
+        self._n_held = 0
+        for level, qty, cost in state["lots"]:
+            self._n_held = grid_add_lot(self._held, self._lot_qty, self._lot_cost, self._n_held, level, qty, cost)
+        self._signal = (HOLD, 0)
+
+    def scale(self, factor):
+        if factor <= 0:
+            self.reset()
+            return
+        self._lot_qty *= factor
+        self._lot_cost *= factor
+        self._totals()
+
+    def average_price(self):
+        return self.total_invested / self.total_quantity if self.total_quantity > 0 else 0
@@ -0,0 +1,163 @@
+import itertools
+import numpy as np
+import pandas as pd
+from strategies import GridStrategy, LevelGridStrategy
+import engine
+import performance
+from costs import NO_COSTS
+
+
+def expand_grid(param_grid):
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def simulate_vectors(prices, buy_step, sell_step, max_drawdown, n, budget_usd, invest_fraction,
+                     record_equity=False, costs=None, liquidity=None):
+    # n independent backtests advanced together, one vectorized update per
+    # step. Each item of prices is a scalar shared by all n runs (one series,
+    # many configs) or a length-n vector (many series, one config); the
+    # strategy parameters broadcast the same way. record_equity also returns
+    # the n x steps equity and in-market matrices for performance.py. Fills
+    # are priced by costs like the engine's; liquidity is the per-step quote
+    # volume for its impact term.
+    costs = costs or NO_COSTS
+    if liquidity is None:
+        liquidity = itertools.repeat(None)
+    budget = np.full(n, float(budget_usd))
+    coin = np.zeros(n)
+    invested = np.zeros(n)
+    quantity = np.zeros(n)
+    last_buy = np.zeros(n)
+    holding = np.zeros(n, dtype=bool)
+    trades = np.zeros(n, dtype=np.int64)
+    peak = budget.copy()
+    worst_drawdown = np.zeros(n)
+    traded = np.zeros(n)
+    gross_profit = np.zeros(n)
+    gross_loss = np.zeros(n)
+    round_trips = np.zeros(n, dtype=np.int64)
+    wins = np.zeros(n, dtype=np.int64)
+    equity_rows = []
+    in_market_rows = []
+    price = 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for price, volume in zip(prices, liquidity):
+            buy_signal = ~holding | ((last_buy - price) / last_buy >= buy_step)
+            amount = budget * invest_fraction
+            buy = buy_signal & (amount > engine.MIN_ORDER_USD)
+
+            avg_price = invested / quantity
+            sell = ~buy_signal & ((price - avg_price) / avg_price >= sell_step)
+            exit_ = ~buy_signal & ~sell & ((avg_price - price) / avg_price >= max_drawdown)
+
+            fill = costs.buy_price(price, amount, volume)
+            qty = np.where(buy, amount / fill, 0.0)
+            coin += qty
+            budget -= np.where(buy, amount, 0.0)
+            quantity += qty
+            invested += fill * qty
+            last_buy = np.where(buy, fill, last_buy)
+            holding |= buy
+
+            close_out = sell | exit_
+            proceeds = np.where(close_out, coin * costs.sell_price(price, coin * price, volume), 0.0)
+            pnl = np.where(close_out, proceeds - invested, 0.0)
+            traded += np.where(buy, amount, 0.0) + proceeds
+            gross_profit += np.maximum(pnl, 0.0)
+            gross_loss -= np.minimum(pnl, 0.0)
+            round_trips += close_out
+            wins += pnl > 0
+            budget += proceeds
+            coin[close_out] = 0.0
+            invested[close_out] = 0.0
+            quantity[close_out] = 0.0
+            holding &= ~close_out
+            trades += buy | close_out
+
+            equity = budget + coin * price
+            np.maximum(peak, equity, out=peak)
+            np.maximum(worst_drawdown, (peak - equity) / peak, out=worst_drawdown)
+            if record_equity:
+                equity_rows.append(equity)
+                in_market_rows.append(holding.copy())
+
+    run = {
+        "final_value": budget + coin * price,
+        "trades": trades,
+        "max_drawdown": worst_drawdown,
+        "traded_notional": traded,
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        "round_trips": round_trips,
+        "wins": wins,
+    }
+    if record_equity:
+        run["equity"] = np.array(equity_rows).T.reshape(n, -1)
+        run["in_market"] = np.array(in_market_rows).T.reshape(n, -1)
+    return run
+
+
+def run_sweep(close, param_grid, strategy_cls=GridStrategy, budget_usd=10000, invest_fraction=0.2, metrics=False,
+              periods_per_year=performance.PERIODS_PER_YEAR, costs=None, volume=None, high=None, low=None):
+    # Every config is one column of the state vectors, so each candle is a
+    # single vectorized update across all configs instead of one backtest each.
+    # metrics=True adds risk-adjusted columns, computed for all configs at once.
+    # high and low only feed the level grid's ATR spacing.
+    configs = expand_grid(param_grid)
+    if issubclass(strategy_cls, LevelGridStrategy):
+        # Per-lot grids do not fit the shared state vectors; each config is
+        # one compiled run instead.
+        ohlc = {"close": close, "volume": volume}
+        if high is not None and low is not None:
+            ohlc.update(high=high, low=low)
+        run = engine.run_grid_batch(ohlc, [strategy_cls(**c) for c in configs],
+                                    budget_usd, invest_fraction, costs, record_equity=metrics)
+        return sweep_results(configs, run, budget_usd, metrics, periods_per_year)
+    params = np.array([engine.strategy_params(strategy_cls(**c)) for c in configs], dtype=np.float64).reshape(-1, 3)
+    buy_step, sell_step, max_drawdown = params.T
+    prices = np.asarray(close, dtype=np.float64).tolist()
+    liquidity = costs.liquidity(close, volume) if costs is not None else None
+    run = simulate_vectors(prices, buy_step, sell_step, max_drawdown, len(configs), budget_usd, invest_fraction,
+                           record_equity=metrics, costs=costs,
+                           liquidity=None if liquidity is None else liquidity.tolist())
+    return sweep_results(configs, run, budget_usd, metrics, periods_per_year)
+
+
+def sweep_results(configs, run, budget_usd, metrics=False, periods_per_year=performance.PERIODS_PER_YEAR):
+    results = pd.DataFrame(configs)
+    results["final_value"] = run["final_value"]
+    results["profit"] = run["final_value"] - budget_usd
+    results["trades"] = run["trades"]
+    results["max_drawdown_pct"] = run["max_drawdown"] * 100
+    if metrics:
+        add_metrics(results, run, periods_per_year)
+    return results
+
+
+def add_metrics(results, run, periods_per_year=performance.PERIODS_PER_YEAR):
+    stats = performance.equity_metrics(run["equity"], periods_per_year, run["in_market"])
+    for key in ("sharpe", "sortino", "calmar", "cagr", "max_drawdown_duration", "exposure"):
+        results[key] = stats[key]
+    results["profit_factor"] = performance.profit_factor(run["gross_profit"], run["gross_loss"])
+    results["win_rate"] = performance.ratio(run["wins"], run["round_trips"])
+    results["turnover"] = performance.ratio(run["traded_notional"], run["equity"].mean(axis=1))
+    return results
+
+
+if __name__ == "__main__":
+    import cli
+    # Binance taker fees and a typical BTC/USDT spread; without them the
+    # smallest grid sizes look far better than they trade.
+    cli.show({
+        "data": "btc_usdt_5y.csv",
+        "mode": "sweep",
+        "param_grid": {
+            "grid_size": {"start": 0.01, "stop": 0.205, "step": 0.01},
+            "max_levels": [5, 10, 20],
+            "max_drawdown": {"start": 0.05, "stop": 1.005, "step": 0.05},
+        },
+        "budget_usd": 10000,
+        "costs": {"spread": 0.0002},
+    })
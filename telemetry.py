@@ -0,0 +1,152 @@
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds, from a fast strategy decision up to a slow exchange round trip.
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.max = max(self.max, value)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        with self.lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                if seen >= target:
+                    return min(bound, self.max)
+            return self.max
+
+    def render(self):
+        with self.lock:
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+            seen = 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {seen}')
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+            lines.append(f"{self.name}_sum {self.sum}")
+            lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+    def render(self):
+        with self.lock:
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+            for value, n in sorted(self.values.items()):
+                lines.append(f'{self.name}{{{self.label}="{value}"}} {n}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.price_fetch = Histogram("bot_price_fetch_seconds", "Latency of a price update, REST fetch or stream delivery")
+        self.decision = Histogram("bot_decision_seconds", "Time spent in the strategy decision for one price")
+        self.order_roundtrip = Histogram("bot_order_roundtrip_seconds", "Order submission to exchange acknowledgement")
+        self.loop_jitter = Histogram("bot_loop_jitter_seconds", "Delay of a loop cycle past its scheduled time")
+        self.errors = Counter("bot_errors_total", "Errors raised in the trading loop", "type")
+
+    def metrics(self):
+        return [self.price_fetch, self.decision, self.order_roundtrip, self.loop_jitter, self.errors]
+
+    def render(self):
+        return "\n".join(line for metric in self.metrics() for line in metric.render()) + "\n"
+
+    def summary(self):
+        parts = []
+        for label, h in [("fetch", self.price_fetch), ("decide", self.decision),
+                         ("order", self.order_roundtrip), ("jitter", self.loop_jitter)]:
+            if h.count:
+                parts.append(f"{label} p50={h.quantile(0.5) * 1000:.2f}ms p99={h.quantile(0.99) * 1000:.2f}ms "
+                             f"max={h.max * 1000:.2f}ms n={h.count}")
+        errors = ", ".join(f"{k}={v}" for k, v in sorted(self.errors.values.items()))
+        parts.append(f"errors={self.errors.total()}" + (f" ({errors})" if errors else ""))
+        return "📈 " + " | ".join(parts)
+
+
+METRICS = Registry()
+
+
+def serve(port=9108, host="0.0.0.0", registry=METRICS):
+    # Prometheus scrape endpoint on /metrics, served from a daemon thread.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def watch_loop(interval=1.0, registry=METRICS):
+    # Event-loop lag: how late a sleep of `interval` wakes up.
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        registry.loop_jitter.observe(max(0.0, loop.time() - expected))
+
+
+async def report(log, interval=60, registry=METRICS):
+    while True:
+        await asyncio.sleep(interval)
+        log(registry.summary())
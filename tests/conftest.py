@@ -0,0 +1,26 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# The modules live flat in the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def ohlc():
+    # Two years of a seeded random walk, with enough swings for every
+    # strategy to trade.
+    rng = np.random.default_rng(7)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.03, 730)))
+    spread = close * rng.uniform(0.0, 0.02, len(close))
+    return {"open": np.concatenate([[close[0]], close[:-1]]), "high": close + spread, "low": close - spread,
+            "close": close, "volume": rng.uniform(1e3, 1e4, len(close))}
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Backtesters cache by default; keep their results out of the user's
+    # cache directory.
+    monkeypatch.setenv("BACKTEST_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import cache
+from cache import ResultCache
+from costs import CostModel
+from strategies import GridStrategy
+
+
+def key_for(ohlc, strategy, costs=None, budget=1000):
+    return cache.make_key("backtest", data=cache.fingerprint(ohlc["close"]), strategy=cache.strategy_config(strategy),
+                          budget=budget, **cache.cost_parts(costs, ohlc["close"], ohlc["volume"]))
+
+
+def test_default_directory_is_configured_not_cwd(cache_dir, tmp_path, monkeypatch):
+    assert ResultCache().directory == str(cache_dir)
+    monkeypatch.delenv("BACKTEST_CACHE_DIR")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assert ResultCache().directory == str(tmp_path / "xdg" / "trading-bot")
+
+
+def test_hit_and_miss(ohlc, cache_dir):
+    results = ResultCache()
+    calls = []
+
+    def run():
+        calls.append(1)
+        return cache.run_backtest(ohlc, GridStrategy(grid_size=0.04), 1000, 0.2)
+
+    strategy = GridStrategy(grid_size=0.04)
+    first = cache.run_backtest(ohlc, strategy, 1000, 0.2, cache=results)
+    second = cache.run_backtest(ohlc, strategy, 1000, 0.2, cache=results)
+    assert second["final_value"] == first["final_value"]
+    assert np.array_equal(second["trade_action"], first["trade_action"])
+    assert len(results.entries()) == 1
+    key = key_for(ohlc, strategy)
+    assert results.cached(key, run) is not None and calls == [1]
+    assert results.cached(key, run) is not None and calls == [1]
+    assert os.path.dirname(os.path.dirname(results.path(key))) == str(cache_dir)
+
+
+def test_key_changes_with_inputs(ohlc, monkeypatch):
+    strategy = GridStrategy(grid_size=0.04)
+    key = key_for(ohlc, strategy)
+    assert key == key_for(dict(ohlc), GridStrategy(grid_size=0.04))
+    edited = {**ohlc, "close": ohlc["close"].copy()}
+    edited["close"][100] *= 1.01
+    others = [key_for(edited, strategy), key_for(ohlc, GridStrategy(grid_size=0.05)),
+              key_for(ohlc, strategy, budget=2000), key_for(ohlc, strategy, CostModel(spread=0.001))]
+    monkeypatch.setattr(cache, "CACHE_VERSION", cache.CACHE_VERSION + 1)
+    others.append(key_for(ohlc, strategy))
+    assert len({key, *others}) == len(others) + 1
+
+
+def test_evicts_least_recently_used(monkeypatch):
+    results = ResultCache(max_bytes=2500)
+    payload = b"x" * 1000
+    for i, key in enumerate(["aa1", "bb2"]):
+        results.put(key, payload)
+        os.utime(results.path(key), (i, i))
+    assert results.get("aa1") == payload  # touched: now the most recent
+    walks = []
+    entries = results.entries
+    monkeypatch.setattr(results, "entries", lambda: walks.append(1) or entries())
+    results.put("cc3", b"y" * 100)  # still under the limit: no walk
+    assert walks == []
+    results.put("dd4", payload)
+    assert walks == [1]
+    assert results.get("bb2") is None
+    assert results.get("aa1") == payload and results.get("dd4") == payload
+    assert results.total <= 2500
+    assert results.total == sum(size for _, size, _ in entries())
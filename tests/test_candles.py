@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import candles
+from candles import CandleStore, load_data, open_store
+
+
+def write_csv(path, days=10, start="2024-01-01", base=100.0):
+    dates = pd.date_range(start, periods=days, freq="D")
+    close = base + np.arange(days, dtype=float)
+    df = pd.DataFrame({"date": dates, "open": close - 0.5, "high": close + 1, "low": close - 1, "close": close,
+                       "volume": np.arange(days, dtype=float) * 10})
+    # Exports are not always in order; the store is.
+    df.iloc[::-1].to_csv(path, index=False)
+    return df
+
+
+def test_csv_is_converted_once(tmp_path):
+    csv = tmp_path / "btc.csv"
+    expected = write_csv(csv)
+    df = load_data(str(csv))
+    store = tmp_path / "btc.candles"
+    assert store.exists()
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_freq=False)
+    mtime = os.path.getmtime(store)
+    assert isinstance(open_store(str(csv)).close, np.memmap)
+    assert os.path.getmtime(store) == mtime
+    # A store path opens directly.
+    assert len(CandleStore(str(store))) == 10
+
+
+def test_newer_csv_rebuilds_store(tmp_path):
+    csv = tmp_path / "btc.csv"
+    write_csv(csv)
+    load_data(str(csv))
+    store = tmp_path / "btc.candles"
+    old = os.path.getmtime(store)
+    write_csv(csv, days=12, base=200.0)
+    os.utime(csv, (old + 10, old + 10))
+    df = load_data(str(csv))
+    assert len(df) == 12 and df["close"].iloc[0] == 200.0
+
+
+@pytest.mark.parametrize("start, end, first, rows", [
+    (None, None, "2024-01-01", 10),
+    ("2024-01-03", None, "2024-01-03", 8),
+    (None, "2024-01-05", "2024-01-01", 4),  # end is exclusive
+    ("2024-01-03 12:00", "2024-01-06", "2024-01-04", 2),
+    ("2023-06-01", "2025-01-01", "2024-01-01", 10),
+])
+def test_date_range_slicing(tmp_path, start, end, first, rows):
+    csv = tmp_path / "btc.csv"
+    write_csv(csv)
+    df = load_data(str(csv), start, end)
+    assert len(df) == rows
+    assert df["date"].iloc[0] == pd.Timestamp(first)
+    assert df["close"].iloc[0] == 100.0 + (pd.Timestamp(first) - pd.Timestamp("2024-01-01")).days
+
+
+def test_empty_range_and_bad_file(tmp_path):
+    csv = tmp_path / "btc.csv"
+    write_csv(csv)
+    assert len(load_data(str(csv), "2025-01-01")) == 0
+    assert len(load_data(str(csv), "2024-01-05", "2024-01-02")) == 0
+    bad = tmp_path / "bad.candles"
+    bad.write_bytes(b"nope")
+    with pytest.raises(ValueError, match="not a candle store"):
+        CandleStore(str(bad))
+    candles.write_store(str(bad), [], {col: [] for col in candles.COLUMNS})
+    assert len(CandleStore(str(bad)).to_frame()) == 0
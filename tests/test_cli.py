@@ -0,0 +1,42 @@
+import json
+import os
+import pytest
+import cli
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "btc_usdt_1y.csv")
+
+
+def test_job_without_data_is_reported_by_name():
+    with pytest.raises(ValueError, match="'orphan'.*symbols"):
+        cli.expand([{**cli.DEFAULTS, "name": "orphan"}])
+    with pytest.raises(ValueError, match="'job2'.*param_grid"):
+        cli.expand([{**cli.DEFAULTS, "data": DATA}, {**cli.DEFAULTS, "mode": "sweep", "data": DATA}])
+
+
+def test_symbols_expand_to_one_run_each():
+    runs = cli.expand([{**cli.DEFAULTS, "name": "grid", "symbols": ["BTCUSDT", "ETHUSDT"], "data_dir": "stores"}])
+    assert [run["name"] for run in runs] == ["grid_BTCUSDT", "grid_ETHUSDT"]
+    assert runs[1]["data"] == os.path.join("stores", "ETHUSDT_1d.candles")
+
+
+def test_broken_job_does_not_stop_the_batch(tmp_path, capsys):
+    spec = tmp_path / "jobs.json"
+    spec.write_text(json.dumps({"defaults": {"budget_usd": 1000}, "jobs": [
+        {"name": "orphan", "mode": "single"},
+        {"name": "grid", "data": DATA, "params": {"grid_size": 0.05, "max_levels": 5}},
+    ]}))
+    out = tmp_path / "results"
+    assert cli.main([str(spec), "--out", str(out), "--workers", "1"]) == 1
+    index = json.loads((out / "results.json").read_text())
+    assert [entry["name"] for entry in index] == ["orphan", "grid"]
+    assert "symbols" in index[0]["error"] and "error" not in index[1]
+    assert (out / "grid.json").exists()
+    assert "1/2 runs written" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("mode", cli.GRID_ONLY)
+def test_window_modes_reject_other_strategies(mode):
+    with pytest.raises(ValueError, match=f"'tails'.*{mode} only runs GridStrategy.*LevelGridStrategy"):
+        cli.expand([{**cli.DEFAULTS, "name": "tails", "mode": mode, "strategy": "LevelGridStrategy",
+                     "data": DATA}])
+    assert cli.expand([{**cli.DEFAULTS, "mode": mode, "data": DATA}])[0]["strategy"] == "GridStrategy"
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+import engine
+from bot import TradingBot
+from costs import CostModel
+from strategies import AdaptiveDCARecoveryStrategy, GridStrategy, SimpleStrategy, LevelGridStrategy, BUY, EXIT
+from sweep import run_sweep
+
+COSTS = [None, CostModel(spread=0.001, slippage=0.0005)]
+POSITION_STRATEGIES = [
+    lambda: AdaptiveDCARecoveryStrategy(buy_threshold=0.05, sell_threshold=0.08, max_drawdown=0.25),
+    lambda: GridStrategy(grid_size=0.04, max_levels=5, max_drawdown=0.2),
+    lambda: SimpleStrategy(buy_threshold=0.03, sell_threshold=0.05),
+]
+
+
+def paper_loop(close, strategy, budget_usd, costs):
+    # The live bot's paper-trading step over every close, as the reference
+    # the kernels have to reproduce (TradingBot invests half its cash per buy).
+    trades = []
+    bot = TradingBot(None, None, strategy, budget_usd=budget_usd, client=object(), costs=costs)
+    for price in close.tolist():
+        before = bot.coin
+        bot.step(price, lambda message: None)
+        if bot.coin != before:
+            trades.append((BUY if bot.coin > before else -1, abs(bot.coin - before)))
+    return bot, trades
+
+
+def engine_trades(result):
+    return [(BUY if a == BUY else -1, q) for a, q in zip(result["trade_action"].tolist(),
+                                                         result["trade_quantity"].tolist())]
+
+
+def assert_same(bot, trades, result):
+    assert len(trades) == len(result["trade_action"]) > 0
+    for (action, qty), (expected_action, expected_qty) in zip(trades, engine_trades(result)):
+        assert action == expected_action
+        assert qty == pytest.approx(expected_qty, rel=1e-9)
+    assert bot.budget == pytest.approx(result["budget"], rel=1e-9)
+    assert bot.coin == pytest.approx(result["coin"], rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("costs", COSTS)
+@pytest.mark.parametrize("make", POSITION_STRATEGIES)
+def test_kernel_matches_bot_loop(ohlc, make, costs):
+    close = ohlc["close"]
+    result = engine.run_backtest(close, make(), 1000, 0.5, costs)
+    bot, trades = paper_loop(close, make(), 1000, costs)
+    assert_same(bot, trades, result)
+
+
+@pytest.mark.parametrize("costs", COSTS)
+@pytest.mark.parametrize("params", [{"grid_size": 0.03, "max_levels": 8, "max_drawdown": 0.25},
+                                    {"grid_size": 0.05, "max_levels": 20, "max_drawdown": 1.0}])
+def test_grid_kernel_matches_bot_loop(ohlc, params, costs):
+    close = ohlc["close"]
+    result = engine.run_backtest_grid({"close": close}, LevelGridStrategy(**params), 1000, 0.5, costs)
+    strategy = LevelGridStrategy(**params)
+    bot, trades = paper_loop(close, strategy, 1000, costs)
+    assert_same(bot, trades, result)
+    assert strategy.lots() == pytest.approx(result["strategy_state"]["lots"])
+
+
+def test_sync_strategy_leaves_loop_state(ohlc):
+    strategy = AdaptiveDCARecoveryStrategy(buy_threshold=0.05, sell_threshold=0.08, max_drawdown=0.25)
+    result = engine.run_backtest(ohlc["close"], strategy, 1000, 0.5)
+    engine.sync_strategy(strategy, result)
+    bot, _ = paper_loop(ohlc["close"], AdaptiveDCARecoveryStrategy(buy_threshold=0.05, sell_threshold=0.08,
+                                                                   max_drawdown=0.25), 1000, None)
+    assert strategy.state() == pytest.approx(bot.strategy.state())
+
+
+@pytest.mark.parametrize("costs", COSTS)
+def test_rolling_matches_window_runs(ohlc, costs):
+    close = ohlc["close"]
+    strategy = GridStrategy(grid_size=0.04, max_levels=5, max_drawdown=0.2)
+    starts = list(range(0, len(close) - 60 + 1, 7))
+    rolling = engine.run_rolling(close, starts, 60, strategy, 1000, 0.2, costs)
+    for start, result in zip(starts, rolling):
+        expected = engine.run_backtest(close[start:start + 60], strategy, 1000, 0.2, costs)
+        assert result["final_value"] == pytest.approx(expected["final_value"], rel=1e-9)
+        assert np.array_equal(result["trade_action"], expected["trade_action"])
+
+
+def test_sweep_matches_single_runs(ohlc):
+    close = ohlc["close"]
+    grid = {"grid_size": [0.02, 0.05, 0.1], "max_levels": [3, 10], "max_drawdown": [0.2, 0.5]}
+    table = run_sweep(close, grid, GridStrategy, 1000, 0.2)
+    for row in table.to_dict("records"):
+        params = {key: row[key] for key in grid}
+        result = engine.run_backtest(close, GridStrategy(**params), 1000, 0.2)
+        assert row["final_value"] == pytest.approx(result["final_value"], rel=1e-9)
+        assert row["trades"] == len(result["trade_action"])
+
+
+def test_position_closed_on_the_open_waits_for_next_open():
+    # Bar 1 gaps under the stop: the exit fills on the open, and the rest
+    # of that bar (down to 70, up to 130) must not buy back in.
+    ohlc = {"open": np.array([200.0, 100.0, 90.0]), "high": np.array([200.0, 130.0, 90.0]),
+            "low": np.array([200.0, 70.0, 90.0]), "close": np.array([200.0, 110.0, 90.0])}
+    result = engine.run_backtest_ohlc(ohlc, GridStrategy(grid_size=0.6, max_drawdown=0.3), 1000, 0.5)
+    trades = list(zip(result["trade_index"].tolist(), result["trade_action"].tolist(),
+                      result["trade_price"].tolist()))
+    assert trades == [(0, BUY, 200.0), (1, EXIT, 100.0), (2, BUY, 90.0)]
+
+
+@pytest.mark.parametrize("spacing", ["fixed", "atr", "volatility"])
+def test_level_grid_sweep_matches_single_runs(ohlc, spacing):
+    grid = {"grid_size": [0.02, 0.05], "max_levels": [5, 10], "spacing": [spacing]}
+    costs = CostModel(spread=0.001)
+    table = run_sweep(ohlc["close"], grid, LevelGridStrategy, 1000, 0.2, costs=costs, volume=ohlc["volume"],
+                      high=ohlc["high"], low=ohlc["low"])
+    for row in table.to_dict("records"):
+        params = {key: row[key] for key in grid}
+        result = engine.run_backtest_grid(ohlc, LevelGridStrategy(**params), 1000, 0.2, costs)
+        assert row["final_value"] == pytest.approx(result["final_value"], rel=1e-9)
+        assert row["trades"] == len(result["trade_action"])
+
+
+def test_level_grid_refuses_a_buy_with_every_level_held():
+    strategy = LevelGridStrategy(grid_size=0.05, max_levels=3)
+    price = 100.0
+    while strategy.decide(price) == BUY:
+        strategy.on_buy(price, 1.0)
+        price *= 0.94
+    assert strategy.buy_count == 3
+    # A fill nobody signalled for, e.g. an order settled after a restart.
+    strategy.on_buy(price, 1.0)
+    assert strategy.buy_count == 3
+    assert strategy.total_quantity == pytest.approx(3.0)
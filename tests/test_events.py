@@ -0,0 +1,35 @@
+import numpy as np
+from events import EventQueue, Series, coalesce
+
+
+def test_queue_drops_oldest_when_full():
+    queue = EventQueue(maxsize=3)
+    for i in range(5):
+        queue.put(("log", i, f"line {i}"))
+    assert queue.dropped == 2
+    assert [event[1] for event in queue.drain(limit=2)] == [2, 3]
+    assert [event[1] for event in queue.drain()] == [4]
+    assert len(queue) == 0 and queue.drain() == []
+
+
+def test_coalesce_keeps_every_line_and_last_tick_per_bot():
+    events = [("log", 1, "a"), ("tick", 2, "BTC", "BTCUSDT", 100.0, 0.1), ("tick", 3, "ETH", "ETHUSDT", 10.0, 0),
+              ("log", 4, "b"), ("tick", 5, "BTC", "BTCUSDT", 101.0, 0.1)]
+    lines, ticks = coalesce(events)
+    assert lines == [(1, "a"), (4, "b")]
+    assert sorted(tick[1] for tick in ticks) == [3, 5]
+
+
+def test_series_stays_within_its_points_and_keeps_spikes():
+    series = Series(max_points=100)
+    values = np.sin(np.arange(100_000) / 500.0)
+    values[54_321] = 5.0  # a one-point spike
+    for t, value in enumerate(values.tolist()):
+        series.append(float(t), value)
+        assert len(series) <= 100
+    t, value, low, high = series.arrays()
+    assert len(t) > 50
+    assert np.all(np.diff(t) > 0)
+    assert t[-1] == 99_999 and value[-1] == values[-1]
+    assert high.max() == 5.0
+    assert low.min() == values.min()
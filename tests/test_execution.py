@@ -0,0 +1,254 @@
+import asyncio
+from decimal import Decimal
+import pytest
+import requests
+import execution
+from bot import TradingBot
+from execution import OrderExecutor
+from strategies import AdaptiveDCARecoveryStrategy, BUY, SELL, EXIT
+
+SYMBOL_INFO = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "filters": [
+    {"filterType": "LOT_SIZE", "stepSize": "0.00001", "minQty": "0.00001"},
+    {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+    {"filterType": "NOTIONAL", "minNotional": "5"},
+]}
+
+
+class ApiError(Exception):
+    # What python-binance raises for an error answer.
+    def __init__(self, status_code, code):
+        super().__init__(f"APIError(code={code})")
+        self.status_code = status_code
+        self.code = code
+
+
+class FakeClient:
+    # Answers create_order with the queued responses (or raises the queued
+    # exceptions) in turn, and get_order from the orders it has seen.
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.sent = []
+        self.known = {}
+
+    def get_exchange_info(self):
+        return {"symbols": [SYMBOL_INFO]}
+
+    def create_order(self, **params):
+        self.sent.append(params)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        self.known[params["newClientOrderId"]] = response
+        return response
+
+    def get_order(self, symbol, origClientOrderId):
+        if origClientOrderId not in self.known:
+            raise ApiError(400, execution.ORDER_NOT_FOUND)
+        return self.known[origClientOrderId]
+
+
+def executor_for(client):
+    executor = OrderExecutor(client)
+    executor.exchange_info.refresh()
+    executor.queue = asyncio.Queue()
+    return executor
+
+
+def filled(qty, quote, fills=()):
+    return {"status": "FILLED", "executedQty": str(qty), "cummulativeQuoteQty": str(quote), "fills": list(fills)}
+
+
+def test_buy_fill_leaves_out_commission_taken_in_coin():
+    async def scenario():
+        client = FakeClient([filled(0.01, 500.0, [
+            {"price": "50000", "qty": "0.006", "commission": "0.000006", "commissionAsset": "BTC", "tradeId": 1},
+            {"price": "50000", "qty": "0.004", "commission": "0.000004", "commissionAsset": "BTC", "tradeId": 2},
+        ])])
+        executor = executor_for(client)
+        bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(), budget_usd=1000, client=client,
+                         executor=executor)
+        bot.step(50000.0, lambda message: None)
+        order = executor.queue.get_nowait()
+        # The stream reports one of the same trades again.
+        executor._on_event({"e": "executionReport", "c": order.client_order_id, "X": "PARTIALLY_FILLED",
+                            "x": "TRADE", "z": "0.006", "Z": "300", "t": 1, "n": "0.000006", "N": "BTC"})
+        await executor._send(order, lambda message: None)
+        return bot, order
+
+    bot, order = asyncio.run(scenario())
+    assert order.base_commission == pytest.approx(0.00001)
+    assert bot.coin == pytest.approx(0.01 - 0.00001)
+    assert bot.strategy.total_quantity == pytest.approx(bot.coin)
+    assert bot.strategy.total_invested == pytest.approx(500.0)
+    assert bot.budget == pytest.approx(500.0)
+
+
+def test_commission_in_another_asset_is_ignored():
+    async def scenario():
+        client = FakeClient([filled(0.01, 500.0, [
+            {"price": "50000", "qty": "0.01", "commission": "0.0004", "commissionAsset": "BNB", "tradeId": 3},
+        ])])
+        executor = executor_for(client)
+        order = executor.submit("BTCUSDT", "BUY", 0.01, 50000.0)
+        await executor._send(executor.queue.get_nowait(), lambda message: None)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order.quantity == Decimal("0.01000")
+    assert order.base_commission == 0
+
+
+@pytest.fixture
+def no_wait(monkeypatch):
+    monkeypatch.setattr(execution, "LOOKUP_DELAYS", [0])
+
+
+def send_one(client, keep=None):
+    # Sends one market buy and waits for the executor's follow-up tasks.
+    # keep, when given, receives the response create_order lost, as if it
+    # reached the exchange before the connection dropped.
+    async def scenario():
+        executor = executor_for(client)
+        done = []
+        order = executor.submit("BTCUSDT", "BUY", 0.01, 50000.0, on_done=done.append)
+        await executor._send(executor.queue.get_nowait(), lambda message: None)
+        if keep is not None:
+            client.known[order.client_order_id] = keep
+        while executor.in_flight:
+            await asyncio.gather(*executor.in_flight)
+        return order, done
+
+    return asyncio.run(scenario())
+
+
+def test_api_error_rejects_order():
+    order, done = send_one(FakeClient([ApiError(400, -2010)]))
+    assert order.status == "REJECTED" and done == [order]
+
+
+def test_timeout_keeps_order_and_looks_it_up(no_wait):
+    order, done = send_one(FakeClient([requests.exceptions.ReadTimeout("read timed out")]),
+                           keep=filled(0.01, 500.0))
+    assert order.status == "FILLED" and done == [order]
+    assert order.executed_qty == pytest.approx(0.01)
+    assert order.quote_qty == pytest.approx(500.0)
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ConnectionError("reset"), ApiError(503, -1000),
+                                   ApiError(408, execution.STATUS_UNKNOWN)])
+def test_unknown_order_is_rejected_once_lookups_cannot_find_it(no_wait, error):
+    client = FakeClient([error])
+    order, done = send_one(client)
+    assert order.status == "REJECTED" and done == [order]
+    assert len(client.sent) == 1  # looked up, never sent twice
+
+
+def report(order, status, executed, quote, **extra):
+    return {"e": "executionReport", "c": order.client_order_id, "X": status, "z": str(executed), "Z": str(quote),
+            **extra}
+
+
+def test_fills_only_move_forward_and_settle_once():
+    async def scenario():
+        executor = executor_for(FakeClient())
+        done = []
+        order = executor.submit("BTCUSDT", "BUY", 0.02, 50000.0, limit_price=49999.999, on_done=done.append)
+        executor._on_event(report(order, "PARTIALLY_FILLED", 0.005, 250))
+        executor._on_event(report(order, "PARTIALLY_FILLED", 0.012, 600))
+        executor._on_event(report(order, "PARTIALLY_FILLED", 0.005, 250))  # late duplicate
+        partial = (order.status, order.executed_qty, order.done)
+        executor._on_event(report(order, "FILLED", 0.02, 1000))
+        executor._on_event(report(order, "FILLED", 0.02, 1000))
+        return executor, order, done, partial
+
+    executor, order, done, partial = asyncio.run(scenario())
+    assert order.price == Decimal("49999.99")
+    assert partial == ("PARTIALLY_FILLED", 0.012, False)
+    assert (order.status, order.executed_qty, order.avg_price) == ("FILLED", 0.02, 50000.0)
+    assert done == [order]
+    assert order.client_order_id not in executor.orders
+
+
+def test_cancel_report_is_matched_by_original_id():
+    async def scenario():
+        executor = executor_for(FakeClient())
+        done = []
+        order = executor.submit("BTCUSDT", "SELL", 0.01, 50000.0, limit_price=51000, on_done=done.append)
+        executor._on_event({**report(order, "CANCELED", 0.004, 204), "c": "web-cancel-1", "C": order.client_order_id})
+        return order, done
+
+    order, done = asyncio.run(scenario())
+    assert (order.status, order.executed_qty, done) == ("CANCELED", 0.004, [order])
+
+
+def test_orders_under_the_filters_are_not_sent():
+    async def scenario():
+        executor = executor_for(FakeClient())
+        return (executor.submit("BTCUSDT", "BUY", 0.000004, 50000.0),  # under the lot step
+                executor.submit("BTCUSDT", "BUY", 0.00005, 50000.0),  # $2.50, under min notional
+                executor.queue.qsize())
+
+    assert asyncio.run(scenario()) == (None, None, 0)
+
+
+def test_live_bot_position_follows_fills():
+    async def scenario():
+        client = FakeClient([filled(0.01, 500.0), {**filled(0.004, 220.0), "status": "EXPIRED"}])
+        executor = executor_for(client)
+        bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(sell_threshold=0.05), budget_usd=1000,
+                         client=client, executor=executor)
+        log = []
+        bot.step(50000.0, log.append)
+        await executor._send(executor.queue.get_nowait(), log.append)
+        bot.step(55000.0, log.append)
+        sell = executor.queue.get_nowait()
+        bot.step(56000.0, log.append)  # waits for the open sell
+        blocked = executor.queue.empty()
+        # Only part of the sell fills before it expires.
+        await executor._send(sell, log.append)
+        return bot, blocked
+
+    bot, blocked = asyncio.run(scenario())
+    assert blocked
+    assert bot.pending is None
+    assert bot.coin == pytest.approx(0.006)
+    assert bot.budget == pytest.approx(720.0)
+    # The unsold coin is still an open position for the strategy.
+    assert bot.strategy.buy_count == 1
+    assert bot.strategy.total_quantity == pytest.approx(0.006)
+    assert bot.strategy.total_invested == pytest.approx(300.0)
+    assert bot.strategy.decide(56000.0) != BUY
+
+
+def test_sell_proceeds_leave_out_commission_taken_in_quote():
+    async def scenario():
+        client = FakeClient([filled(0.01, 500.0), filled(0.01, 550.0, [
+            {"price": "55000", "qty": "0.01", "commission": "0.55", "commissionAsset": "USDT", "tradeId": 4},
+        ])])
+        executor = executor_for(client)
+        bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(sell_threshold=0.05), budget_usd=1000,
+                         client=client, executor=executor)
+        bot.step(50000.0, lambda message: None)
+        await executor._send(executor.queue.get_nowait(), lambda message: None)
+        bot.step(55000.0, lambda message: None)
+        order = executor.queue.get_nowait()
+        await executor._send(order, lambda message: None)
+        return bot, order
+
+    bot, order = asyncio.run(scenario())
+    assert order.quote_commission == pytest.approx(0.55)
+    assert order.base_commission == 0
+    assert bot.coin == 0 and bot.strategy.buy_count == 0
+    assert bot.budget == pytest.approx(500.0 + 550.0 - 0.55)
+
+
+@pytest.mark.parametrize("action", [SELL, EXIT])
+def test_paper_sell_while_flat_does_nothing(action):
+    # A strategy restored with an open position the account no longer
+    # holds, e.g. after state.reconcile() found no coin.
+    strategy = AdaptiveDCARecoveryStrategy(buy_threshold=0.5, sell_threshold=0.05, max_drawdown=0.2)
+    strategy.on_buy(40000.0 if action == SELL else 70000.0, 0.01)
+    bot = TradingBot(None, None, strategy, budget_usd=1000, client=object())
+    assert strategy.decide(50000.0) == action
+    bot.step(50000.0, lambda message: None)
+    assert (bot.coin, bot.budget) == (0, 1000)
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import candles
+import export_data
+from export_data import KlineClient, RateLimiter, update_stores
+
+DAY = export_data.INTERVAL_MS["1d"]
+SINCE = 1_600_000_000_000 // DAY * DAY
+NOW = SINCE + 2500 * DAY + DAY // 2  # the last candle is still open
+DATES = {"since": pd.Timestamp(SINCE, unit="ms"), "now": pd.Timestamp(NOW, unit="ms")}
+
+
+def kline(open_ms):
+    price = str(1000.0 + (open_ms - SINCE) / DAY)
+    return [open_ms, price, price, price, price, "1.5", open_ms + DAY - 1]
+
+
+class Exchange:
+    # KlineClient stand-in that serves a candle per day and can fail on a
+    # chosen page.
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.requested = []
+
+    def fetch(self, symbol, interval, start_ms, end_ms, limit=export_data.PAGE_LIMIT):
+        self.requested.append(start_ms)
+        if start_ms == self.fail_at:
+            raise RuntimeError("page failed")
+        return [kline(t) for t in range(start_ms, min(end_ms, NOW) + 1, DAY)][:limit]
+
+
+def stored(data_dir):
+    return candles.CandleStore(export_data.store_path(data_dir, "BTCUSDT", "1d"))
+
+
+def test_pages_cover_range_once():
+    pages = export_data.plan_pages(SINCE, SINCE + 2499 * DAY, DAY)
+    assert len(pages) == 3
+    assert pages[0][0] == SINCE and pages[-1][1] == SINCE + 2499 * DAY
+    assert all(b[0] == a[1] + 1 for a, b in zip(pages, pages[1:]))
+
+
+def test_update_keeps_closed_candles_in_order(tmp_path):
+    update_stores(["BTCUSDT"], ["1d"], data_dir=str(tmp_path), client=Exchange(), workers=3, **DATES)
+    store = stored(str(tmp_path))
+    assert len(store) == 2500
+    assert np.array_equal(store.timestamp, SINCE + DAY * np.arange(2500))
+    assert store.close[-1] == 1000.0 + 2499
+    assert not os.path.exists(store.path + ".part")
+
+
+def test_failed_page_keeps_earlier_pages_and_rerun_resumes(tmp_path):
+    data_dir = str(tmp_path)
+    with pytest.raises(RuntimeError):
+        update_stores(["BTCUSDT"], ["1d"], data_dir=data_dir, client=Exchange(fail_at=SINCE + 2000 * DAY),
+                      workers=1, **DATES)
+    assert len(stored(data_dir)) == 2000
+
+    exchange = Exchange()
+    update_stores(["BTCUSDT"], ["1d"], data_dir=data_dir, client=exchange, **DATES)
+    assert exchange.requested == [SINCE + 2000 * DAY]
+    assert np.array_equal(stored(data_dir).timestamp, SINCE + DAY * np.arange(2500))
+
+
+def test_rerun_folds_in_part_left_by_crash(tmp_path):
+    path = export_data.store_path(str(tmp_path), "BTCUSDT", "1d")
+    timestamp, columns = export_data.to_columns([kline(SINCE + k * DAY) for k in range(10)])
+    export_data.append_part(path, timestamp, columns)
+    with open(path + ".part", "ab") as f:
+        f.write(b"\0" * 20)  # a row cut off mid-write
+    exchange = Exchange()
+    update_stores(["BTCUSDT"], ["1d"], data_dir=str(tmp_path), client=exchange, **DATES)
+    assert exchange.requested[0] == SINCE + 10 * DAY
+    assert len(stored(str(tmp_path))) == 2500
+
+
+class Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+
+class Session:
+    # Plays back responses (or raises exceptions) in turn.
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class Clock:
+    # Time that only moves when something sleeps.
+    def __init__(self):
+        self.now = 0.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+
+
+def client_for(session, clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    return KlineClient(limiter=limiter, session=session, backoff=1.0, sleep=clock.sleep)
+
+
+@pytest.mark.parametrize("failure", [Response(502), Response(503),
+                                     requests.exceptions.ConnectionError("reset"),
+                                     requests.exceptions.ReadTimeout("timed out")])
+def test_transient_errors_are_retried_with_backoff(failure):
+    clock = Clock()
+    session = Session(failure, failure, Response(200, [kline(SINCE)]))
+    assert client_for(session, clock).fetch("BTCUSDT", "1d", SINCE, SINCE) == [kline(SINCE)]
+    assert session.calls == 3
+    assert clock.waits == [1.0, 2.0]
+
+
+def test_rate_limit_waits_retry_after():
+    clock = Clock()
+    session = Session(Response(429, headers={"Retry-After": "7"}), Response(200, []))
+    client_for(session, clock).fetch("BTCUSDT", "1d", SINCE, SINCE)
+    assert clock.waits == [7.0]
+
+
+def test_gives_up_after_max_retries():
+    clock = Clock()
+    session = Session(*[Response(500)] * 3)
+    client = client_for(session, clock)
+    client.max_retries = 3
+    with pytest.raises(RuntimeError, match="HTTP 500"):
+        client.fetch("BTCUSDT", "1d", SINCE, SINCE)
+    assert clock.waits == [1.0, 2.0]
+
+
+def test_client_errors_are_not_retried():
+    session = Session(Response(400), Response(200, []))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client_for(session, Clock()).fetch("BTCUSDT", "1d", SINCE, SINCE)
+    assert session.calls == 1
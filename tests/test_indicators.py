@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import indicators
+from indicators import IndicatorStream, NAMES
+
+PERIODS = [{}, {"ema_fast": 3, "ema_slow": 7, "rsi_period": 5, "atr_period": 4, "bb_period": 6, "bb_width": 1.5,
+                "vol_period": 9}]
+
+
+def streamed(ohlc, periods, warm=0):
+    # Warms a stream up on the first warm candles, then feeds the rest one
+    # at a time as the live bot does.
+    stream = IndicatorStream(**periods)
+    head = stream.warm_up({col: ohlc[col][:warm] for col in ("high", "low", "close")})
+    rows = [stream.update(h, l, c).copy() for h, l, c in zip(ohlc["high"][warm:], ohlc["low"][warm:],
+                                                               ohlc["close"][warm:])]
+    return {name: np.concatenate([head[name], [row[j] for row in rows]]) for j, name in enumerate(NAMES)}
+
+
+@pytest.mark.parametrize("warm", [0, 1, 50, 729])
+@pytest.mark.parametrize("periods", PERIODS)
+@pytest.mark.parametrize("name", NAMES)
+def test_stream_matches_batch(ohlc, name, periods, warm):
+    batch = indicators.compute(ohlc, **periods)[name]
+    stream = streamed(ohlc, periods, warm)[name]
+    assert len(stream) == len(batch)
+    assert np.array_equal(np.isnan(stream), np.isnan(batch))
+    assert not np.isnan(batch[-1])
+    np.testing.assert_allclose(stream, batch, rtol=1e-12, equal_nan=True)
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pytest
+import backtest
+import engine
+import jobs
+import parallel
+import paths
+import strategies
+from candles import load_data
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "btc_usdt_1y.csv")
+PARAMS = {"grid_size": 0.03, "max_levels": 5, "max_drawdown": 0.2}
+
+
+def run_inline(spec, workers=2):
+    # Every chunk of a spec in this process, in chunk order.
+    return [func(task) for func, task in jobs.split(spec, workers)]
+
+
+def test_history_montecarlo_chunks_match_parallel_run():
+    spec = {"kind": "montecarlo", "data": DATA, "params": PARAMS, "budget_usd": 1000, "window_days": 30,
+            "simulations": 600, "seed": 11}
+    profits = np.concatenate(run_inline(spec))
+    close = engine.ohlcv_arrays(load_data(DATA))["close"]
+    assert np.array_equal(profits, parallel.monte_carlo(close, 600, 30, PARAMS, 1000, seed=11))
+
+
+def test_path_montecarlo_chunks_match_paths_run():
+    spec = {"kind": "montecarlo", "data": DATA, "params": PARAMS, "budget_usd": 1000, "window_days": 30,
+            "simulations": 300, "seed": 5, "method": "gbm"}
+    chunks = run_inline(spec)
+    close = engine.ohlcv_arrays(load_data(DATA))["close"]
+    expected = paths.monte_carlo(close, 300, 30, PARAMS, 1000, method="gbm", seed=5)
+    for key, values in expected.items():
+        assert np.array_equal(np.concatenate([chunk[key] for chunk in chunks]), values)
+
+
+def test_backtest_job_uses_the_spec_backtester_and_invest_fraction():
+    spec = {"kind": "backtest", "data": DATA, "strategy": "AdaptiveDCARecoveryStrategy", "budget_usd": 1000,
+            "params": {"buy_threshold": 0.05, "sell_threshold": 0.05, "max_drawdown": 0.3},
+            "backtester": backtest.Backtester, "invest_fraction": 0.35}
+    result, = run_inline(spec)
+    runner = backtest.Backtester(load_data(DATA), strategies.AdaptiveDCARecoveryStrategy(**spec["params"]),
+                                 budget_usd=1000, invest_fraction=0.35, use_cache=False)
+    runner.run()
+    assert result["final_value"] == pytest.approx(runner.final_value)
+    assert result["trades"] == len(runner.ledger)
+
+    spec.pop("invest_fraction")
+    default, = run_inline(spec)
+    assert default["final_value"] != pytest.approx(runner.final_value)
@@ -0,0 +1,43 @@
+import gc
+import os
+import numpy as np
+import pytest
+import engine
+from ledger import ColumnLog, Ledger, EQUITY_COLUMNS
+from strategies import GridStrategy
+
+
+def test_in_memory_log_spills_to_disk_past_its_limit():
+    log = ColumnLog(EQUITY_COLUMNS, spill_rows=10)
+    rows = [np.arange(4) + 4 * k for k in range(4)]
+    for values in rows[:2]:
+        log.append(equity=values, drawdown=values / 10, in_market=values % 2)
+    assert log.directory is None and len(log) == 8
+    for values in rows[2:]:
+        log.append(equity=values, drawdown=values / 10, in_market=values % 2)
+    directory = log.directory
+    assert directory is not None and log.chunks["equity"] == []
+    assert isinstance(log.column("equity"), np.memmap)
+    assert np.array_equal(log.column("equity"), np.arange(16))
+    assert np.array_equal(log.column("in_market"), np.arange(16) % 2)
+    assert len(log) == 16
+    del log
+    gc.collect()
+    assert not os.path.exists(directory)
+
+
+def test_spilled_ledger_reports_the_same(ohlc):
+    close = ohlc["close"]
+    result = engine.run_backtest(close, GridStrategy(grid_size=0.03, max_levels=5, max_drawdown=0.2), 1000, 0.5)
+    memory, spilled = Ledger(), Ledger()
+    spilled.trades.spill_rows = len(result["trade_index"]) + 1
+    spilled.equity.spill_rows = 50
+    for ledger in (memory, spilled):
+        for run in range(3):
+            ledger.record(result, close, 1000, run=run)
+    assert spilled.equity.directory is not None and spilled.trades.directory is not None
+    assert memory.equity.directory is None
+    assert len(spilled) == len(memory) == 3 * len(result["trade_index"])
+    assert spilled.max_drawdown() == memory.max_drawdown()
+    assert spilled.metrics() == pytest.approx(memory.metrics())
+    assert np.array_equal(spilled.counts(3), memory.counts(3))
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import websockets
+from bot import TradingBot
+from live import StreamRunner, parse_trade
+from strategies import SimpleStrategy
+
+
+class TickerClient:
+    # REST stand-in for the polling fallback.
+    def __init__(self, prices):
+        self.prices = prices
+
+    def get_symbol_ticker(self, symbol=None):
+        if symbol is not None:
+            return {"symbol": symbol, "price": str(self.prices[symbol])}
+        return [{"symbol": s, "price": str(p)} for s, p in self.prices.items()]
+
+
+def trade(symbol, price):
+    return json.dumps({"stream": f"{symbol.lower()}@trade",
+                       "data": {"e": "trade", "E": 1_700_000_000_000, "s": symbol, "p": str(price)}})
+
+
+def test_parse_trade_and_kline():
+    assert parse_trade(trade("BTCUSDT", 50000.5)) == ("BTCUSDT", 50000.5, 1_700_000_000_000)
+    kline = json.dumps({"e": "kline", "E": 5, "s": "ETHUSDT", "k": {"c": "3000.25"}})
+    assert parse_trade(kline) == ("ETHUSDT", 3000.25, 5)
+    assert parse_trade(json.dumps({"result": None, "id": 1})) == (None, None, None)
+
+
+def test_stream_drives_bots_then_falls_back_to_rest():
+    # A local stand-in for the exchange streams a few trades and hangs up;
+    # the runner must hand every trade to its symbol's bot in order, then
+    # keep them trading off REST until stopped.
+    seen = {"BTCUSDT": [], "ETHUSDT": []}
+    rest = {"BTCUSDT": 48000.0, "ETHUSDT": 2900.0}
+
+    def on_tick(bot, price):
+        seen[bot.symbol].append(price)
+        if price == rest[bot.symbol]:
+            bot.stop()
+
+    async def exchange(ws, path=None):
+        for symbol, price in [("BTCUSDT", 50000), ("ETHUSDT", 3000), ("BTCUSDT", 50100), ("BTCUSDT", 49900)]:
+            await ws.send(trade(symbol, price))
+        await ws.send(json.dumps({"result": None, "id": 1}))
+
+    async def scenario():
+        client = TickerClient(rest)
+        bots = [TradingBot(None, None, SimpleStrategy(), symbol=symbol, client=client, on_tick=on_tick)
+                for symbol in rest]
+        async with websockets.serve(exchange, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            runner = StreamRunner(bots, url=f"ws://127.0.0.1:{port}", poll_interval=0.01, stale_timeout=5)
+            log = []
+            await asyncio.wait_for(runner.run(log.append), timeout=10)
+        return log
+
+    log = asyncio.run(scenario())
+    assert seen == {"BTCUSDT": [50000.0, 50100.0, 49900.0, 48000.0], "ETHUSDT": [3000.0, 2900.0]}
+    assert any("Price stream connected" in line for line in log)
+    assert any("polling REST" in line for line in log)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+import parallel
+from costs import CostModel
+
+PARAMS = {"grid_size": 0.04, "max_levels": 5, "max_drawdown": 0.2}
+
+
+@pytest.mark.parametrize("costs", [None, CostModel(spread=0.001, slippage=0.0005)])
+def test_monte_carlo_does_not_depend_on_workers(ohlc, costs):
+    simulations = 3 * parallel.CHUNK_SIZE + 17
+    run = lambda workers, seed=5: parallel.monte_carlo(ohlc["close"], simulations, 30, PARAMS, 1000,
+                                                      workers=workers, seed=seed, costs=costs,
+                                                      volume=ohlc["volume"])
+    single = run(1)
+    assert len(single) == simulations
+    assert np.array_equal(single, run(3))
+    assert not np.array_equal(single, run(1, seed=6))
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_rolling_does_not_depend_on_workers(ohlc, incremental):
+    starts = list(range(0, len(ohlc["close"]) - 30 + 1, 5))
+    run = lambda workers: parallel.rolling(ohlc["close"], starts, 30, PARAMS, 1000, workers=workers,
+                                           incremental=incremental)
+    single, pooled = run(1), run(3)
+    assert len(single) == len(pooled) == len(starts)
+    for a, b in zip(single, pooled):
+        assert a["final_value"] == b["final_value"]
+        assert np.array_equal(a["trade_action"], b["trade_action"])
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import engine
+import performance
+from costs import CostModel
+from ledger import Ledger
+from strategies import LevelGridStrategy, SmartStrategy, BUY, SELL, EXIT
+
+
+@pytest.mark.parametrize("params, costs", [
+    ({"grid_size": 0.05, "max_levels": 20, "max_drawdown": 1.0}, None),
+    ({"grid_size": 0.02, "max_levels": 10, "max_drawdown": 0.3}, CostModel(spread=0.001, slippage=0.0005)),
+    ({"grid_size": 0.03, "max_levels": 5, "max_drawdown": 0.2}, None),
+])
+def test_partial_sells_match_grid_kernel(ohlc, params, costs):
+    strategy = LevelGridStrategy(**params)
+    batch = engine.run_grid_batch(ohlc, [strategy], 1000, 0.2, costs)
+    result = engine.run_backtest_grid(ohlc, strategy, 1000, 0.2, costs)
+    # The run has to sell part of a grid for this to test anything.
+    assert (result["trade_action"] == SELL).any()
+
+    ledger = Ledger()
+    ledger.record(result, ohlc["close"], 1000)
+    for stats in (ledger.metrics(), performance.backtest_metrics(ohlc["close"], result, 1000)):
+        assert stats["round_trips"] == batch["round_trips"][0]
+        assert stats["win_rate"] * stats["round_trips"] == pytest.approx(batch["wins"][0])
+        assert stats["avg_trade"] * stats["round_trips"] == pytest.approx(
+            batch["gross_profit"][0] - batch["gross_loss"][0])
+        assert stats["profit_factor"] == pytest.approx(
+            performance.profit_factor(batch["gross_profit"][0], batch["gross_loss"][0]))
+
+
+def test_partial_sell_closes_lowest_lots():
+    # Lots on levels 3, 2 and 1; a sell up to level 2 closes two of them
+    # at 110, the exit the last one at 80.
+    action = np.array([BUY, BUY, BUY, SELL, EXIT])
+    price = np.array([100.0, 95.0, 90.0, 110.0, 80.0])
+    quantity = np.array([1.0, 1.0, 1.0, 2.0, 1.0])
+    level = np.array([3, 2, 1, 2, 3])
+    stats = performance.trade_metrics(action, price, quantity, level=level)
+    assert stats["round_trips"] == 3
+    assert stats["win_rate"] == pytest.approx(2 / 3)
+    assert stats["avg_win"] == pytest.approx((20.0 + 15.0) / 2)
+    assert stats["avg_loss"] == pytest.approx(20.0)
+
+
+def test_levels_do_not_change_whole_position_stats(ohlc):
+    result = engine.run_backtest_indicators(ohlc, SmartStrategy(), 1000, 0.2)
+    positions = performance.trade_metrics(result["trade_action"], result["trade_price"], result["trade_quantity"])
+    ledger = Ledger()
+    ledger.record(result, ohlc["close"], 1000)
+    lots = ledger.metrics()
+    assert positions["round_trips"] > 0
+    for key, value in positions.items():
+        assert lots[key] == pytest.approx(value)
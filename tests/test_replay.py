@@ -0,0 +1,20 @@
+from replay import Replay
+from strategies import AdaptiveDCARecoveryStrategy
+
+
+def replay_log(path):
+    lines = []
+    strategy = AdaptiveDCARecoveryStrategy(buy_threshold=0.05, sell_threshold=0.10, max_drawdown=0.30)
+    summary = Replay(path, strategy, budget_usd=1000, interval=3600).run(lines.append)
+    return lines, summary
+
+
+def test_replay_log_is_the_same_every_run(tmp_path):
+    path = tmp_path / "ticks.csv"
+    prices = [100, 97, 94, 90, 96, 103, 110, 104, 95, 88, 92, 101, 112, 99]
+    path.write_text("timestamp,price\n" + "".join(f"{i * 86_400_000},{p}\n" for i, p in enumerate(prices)))
+    first, summary = replay_log(str(path))
+    second, _ = replay_log(str(path))
+    assert first == second
+    assert any("BUY" in line for line in first)
+    assert summary["cycles"] > len(prices)
@@ -0,0 +1,102 @@
+import json
+import pytest
+from bot import TradingBot
+from portfolio import SharedBudget
+from state import StateStore, reconcile, BUDGET_KEY
+from strategies import AdaptiveDCARecoveryStrategy
+
+
+def test_journal_is_replayed_on_open(tmp_path):
+    store = StateStore(tmp_path, snapshot_every=100, fsync=False)
+    for i in range(5):
+        store.record({"bot": {"coin": i}, "other": {"n": -i}} if i % 2 else {"bot": {"coin": i}})
+    store.journal.close()  # a crash: no snapshot on the way out
+    reopened = StateStore(tmp_path, fsync=False)
+    assert reopened.get("bot") == {"coin": 4}
+    assert reopened.get("other") == {"n": -3}
+    assert reopened.seq == 5
+
+
+def test_snapshot_and_journal_tail_are_restored(tmp_path):
+    store = StateStore(tmp_path, snapshot_every=3, fsync=False)
+    for i in range(7):
+        store.record({"bot": {"coin": i}})
+    with open(tmp_path / "snapshot.json") as f:
+        assert json.load(f)["seq"] == 6
+    store.journal.close()
+    reopened = StateStore(tmp_path, fsync=False)
+    assert (reopened.get("bot"), reopened.seq) == ({"coin": 6}, 7)
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    store = StateStore(tmp_path, snapshot_every=100, fsync=False)
+    store.record({"bot": {"coin": 1}})
+    store.record({"bot": {"coin": 2}})
+    store.journal.write('{"seq": 3, "states": {"bot": {"co')  # killed mid-write
+    store.journal.close()
+    reopened = StateStore(tmp_path, fsync=False)
+    assert (reopened.get("bot"), reopened.seq) == ({"coin": 2}, 2)
+    # New lines do not end up behind the torn one.
+    reopened.record({"bot": {"coin": 3}})
+    reopened.journal.close()
+    assert StateStore(tmp_path, fsync=False).get("bot") == {"coin": 3}
+
+
+def test_bot_restores_position_and_shared_budget(tmp_path):
+    def start():
+        pool = SharedBudget(1000)
+        pool.set_limit("BTCUSDT", 600)
+        store = StateStore(tmp_path, fsync=False)
+        if store.get(BUDGET_KEY) is not None:
+            pool.restore(store.get(BUDGET_KEY))
+        bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(), account=pool.account("BTCUSDT"),
+                         client=object(), store=store)
+        return bot, pool, store
+
+    bot, pool, store = start()
+    bot.step(50000.0, lambda message: None)
+    store.journal.close()
+    restored, restored_pool, _ = start()
+    assert restored.restored
+    assert restored.coin == pytest.approx(bot.coin)
+    assert restored.strategy.state() == bot.strategy.state()
+    assert restored_pool.state() == pool.state()
+    assert restored.account.invested == pytest.approx(300.0)
+
+
+class BalanceClient:
+    def __init__(self, held):
+        self.held = held
+
+    def get_symbol_info(self, symbol):
+        return {"symbol": symbol, "baseAsset": "BTC"}
+
+    def get_asset_balance(self, asset):
+        return {"asset": asset, "free": str(self.held), "locked": "0"}
+
+
+def test_reconcile_scales_position_and_account():
+    pool = SharedBudget(1000)
+    pool.set_limit("BTCUSDT", 600)
+    bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(), account=pool.account("BTCUSDT"), client=object())
+    bot.step(50000.0, lambda message: None)  # 300 USD for 0.006 BTC
+    reconcile([bot], BalanceClient(0.0045), log=lambda message: None)
+    assert bot.coin == pytest.approx(0.0045)
+    assert bot.strategy.total_quantity == pytest.approx(0.0045)
+    assert bot.strategy.total_invested == pytest.approx(225.0)
+    assert bot.account.invested == pytest.approx(225.0)
+    assert pool.invested["BTCUSDT"] == pytest.approx(225.0)
+    assert pool.realized["BTCUSDT"] == pytest.approx(-75.0)
+    assert pool.cash == pytest.approx(700.0)
+    # Selling the rest settles exactly what is left invested.
+    bot.strategy.on_sell()
+    bot.account.receive(0.0045 * 60000.0)
+    assert pool.invested["BTCUSDT"] == pytest.approx(0.0)
+    assert pool.realized["BTCUSDT"] == pytest.approx(-75.0 + 270.0 - 225.0)
+
+
+def test_reconcile_leaves_extra_coin_alone():
+    bot = TradingBot(None, None, AdaptiveDCARecoveryStrategy(), budget_usd=1000, client=object())
+    bot.step(50000.0, lambda message: None)
+    reconcile([bot], BalanceClient(1.0), log=lambda message: None)
+    assert bot.coin == pytest.approx(0.01)
@@ -0,0 +1,68 @@
+import pytest
+from bot import TradingBot
+from strategies import SimpleStrategy
+from telemetry import Counter, Histogram, Registry, METRICS
+
+
+def test_histogram_buckets():
+    h = Histogram("latency_seconds", "test", buckets=(0.01, 0.1, 1.0))
+    for value in [0.005, 0.01, 0.05, 0.1, 0.5, 3.0]:
+        h.observe(value)
+    # A value on a bound counts in that bucket (le is "less or equal").
+    assert h.counts == [2, 2, 1, 1]
+    assert (h.count, h.max) == (6, 3.0)
+    assert h.sum == pytest.approx(3.665)
+    lines = h.render()
+    assert 'latency_seconds_bucket{le="0.01"} 2' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 4' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 5' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 6' in lines
+    assert h.quantile(0.5) == 0.1
+    assert h.quantile(0.99) == 3.0
+    assert Histogram("empty", "test").quantile(0.5) == 0.0
+
+
+def test_error_counter_render():
+    errors = Counter("errors_total", "test", "type")
+    errors.inc("Timeout")
+    errors.inc("ValueError", 2)
+    errors.inc("Timeout")
+    assert errors.total() == 4
+    assert errors.render()[2:] == ['errors_total{type="Timeout"} 2', 'errors_total{type="ValueError"} 2']
+    registry = Registry()
+    registry.errors.values = dict(errors.values)
+    assert registry.summary().endswith("errors=4 (Timeout=2, ValueError=2)")
+
+
+class FlakyClient:
+    # Fails every other price fetch.
+    def __init__(self):
+        self.calls = 0
+
+    def get_symbol_ticker(self, symbol):
+        self.calls += 1
+        if self.calls % 2:
+            raise ConnectionError("reset")
+        return {"price": "50000"}
+
+
+def test_bot_loop_counts_errors_and_times_steps():
+    before_errors = METRICS.errors.values.get("ConnectionError", 0)
+    before_fetches = METRICS.price_fetch.count
+    before_cycles = METRICS.loop_jitter.count
+    bot = TradingBot(None, None, SimpleStrategy(), budget_usd=1000, client=FlakyClient(),
+                     clock=lambda: 0.0)
+    cycles = []
+
+    def sleep(seconds):
+        cycles.append(seconds)
+        if len(cycles) == 4:
+            bot.stop()
+
+    bot.sleep = sleep
+    log = []
+    bot.run(log.append, summary_every=0)
+    assert METRICS.errors.values["ConnectionError"] - before_errors == 2
+    assert METRICS.price_fetch.count - before_fetches == 4  # failed fetches are timed too
+    assert METRICS.loop_jitter.count - before_cycles == 4
+    assert log.count("Error: reset") == 2
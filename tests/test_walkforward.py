@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+import engine
+from strategies import GridStrategy
+from sweep import run_sweep
+from walkforward import WalkForwardOptimizer
+
+GRID = {"grid_size": [0.02, 0.04, 0.08], "max_levels": [5], "max_drawdown": [0.1, 0.3]}
+
+
+def frame(ohlc):
+    return pd.DataFrame({"date": pd.date_range("2022-01-01", periods=len(ohlc["close"]), freq="D"), **ohlc})
+
+
+@pytest.mark.parametrize("anchored", [False, True])
+def test_folds_do_not_overlap(ohlc, anchored):
+    optimizer = WalkForwardOptimizer(frame(ohlc), GRID, GridStrategy, in_sample_days=120, out_sample_days=30,
+                                     anchored=anchored, use_cache=False)
+    windows = optimizer.fold_windows()
+    assert len(windows) == (730 - 120) // 30
+    for k, (train_start, test_start, test_end) in enumerate(windows):
+        # In-sample [train_start, test_start) ends where out-of-sample begins.
+        assert train_start == (0 if anchored else test_start - 120)
+        assert test_end - test_start == 30
+        if k:
+            assert test_start == windows[k - 1][2]
+    assert windows[-1][2] <= 730
+
+
+def test_configs_are_picked_in_sample_and_traded_out_of_sample(ohlc):
+    df = frame(ohlc)
+    optimizer = WalkForwardOptimizer(df, GRID, GridStrategy, in_sample_days=120, out_sample_days=30,
+                                     budget_usd=1000, use_cache=False)
+    optimizer.run()
+    windows = optimizer.fold_windows()
+    assert len(optimizer.folds) == len(windows)
+    budget = 1000
+    for fold, (train_start, test_start, test_end) in zip(optimizer.folds, windows):
+        assert fold["train_start"] < fold["test_start"] <= fold["test_end"]
+        assert fold["test_start"] == df["date"][test_start] and fold["test_end"] == df["date"][test_end - 1]
+        table = run_sweep(ohlc["close"][train_start:test_start], GRID, GridStrategy, 1000, 0.2)
+        best = table.loc[table["profit"].idxmax(), list(GRID)].to_dict()
+        assert fold["config"] == best
+        result = engine.run_backtest(ohlc["close"][test_start:test_end], GridStrategy(**best), budget, 0.2)
+        assert fold["out_sample_return"] == pytest.approx(result["final_value"] / budget - 1)
+        budget = result["final_value"]
+    # The stitched curve covers the out-of-sample days only, once each.
+    assert len(optimizer.equity) == windows[-1][2] - windows[0][1]
+    assert optimizer.equity["date"].is_unique
+    assert optimizer.equity["strategy"].iloc[-1] == pytest.approx(budget)
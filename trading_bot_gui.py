@@ -1,9 +1,27 @@
 import sys
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, QPushButton, QLineEdit, QTextEdit, QVBoxLayout, QHBoxLayout, QTabWidget, QComboBox, QSpinBox, QMessageBox)
-from bot import TradingBot
-from strategies import SimpleStrategy, SmartStrategy
-from utils import log_action
 import threading
+import time
+import numpy as np
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, QPushButton, QLineEdit, QPlainTextEdit, QVBoxLayout, QHBoxLayout, QTabWidget, QComboBox, QSpinBox, QMessageBox,
+                             QDoubleSpinBox, QCheckBox, QFormLayout, QListWidget, QProgressBar)
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from portfolio import Portfolio
+from state import StateStore
+from strategies import SimpleStrategy, SmartStrategy
+from events import EventQueue, Series, coalesce, CHART_POINTS
+from jobs import JobRunner
+from costs import CostModel
+from utils import log_line
+
+LOG_LINES = 5000     # older log lines are dropped
+DRAIN_MS = 100       # how often bot events are moved into the widgets
+DRAIN_BATCH = 5000   # most events handled per drain
+CHART_MS = 1000      # how often the chart redraws, if anything changed
+JOBS_MS = 200        # how often backtest job progress is polled
+COSTS = CostModel(spread=0.0002)  # Binance taker fees and a typical spread, for paper trades and backtests
 
 class LoginWidget(QWidget):
     def __init__(self, parent):
@@ -36,14 +54,73 @@ class LoginWidget(QWidget):
         else:
             QMessageBox.warning(self, "Error", "API credentials are required")
 
+class ChartWidget(QWidget):
+    # Price of one symbol and the portfolio's equity. Both come from
+    # events.Series, so the number of points drawn stays the same however
+    # long the bots run; the shaded band is each point's low/high range.
+    def __init__(self):
+        super().__init__()
+        self.figure = Figure(figsize=(6, 4), layout="constrained")
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.canvas.setMinimumHeight(250)
+        self.price_ax = self.figure.add_subplot(211)
+        self.equity_ax = self.figure.add_subplot(212, sharex=self.price_ax)
+        self.price_line, = self.price_ax.plot([], [], color="tab:blue")
+        self.equity_line, = self.equity_ax.plot([], [], color="tab:green")
+        self.price_ax.set_ylabel("Price ($)")
+        self.equity_ax.set_ylabel("Equity ($)")
+        self.bands = []
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+    def draw(self, price, equity):
+        for band in self.bands:
+            band.remove()
+        self.bands = []
+        for ax, line, series in ((self.price_ax, self.price_line, price), (self.equity_ax, self.equity_line, equity)):
+            if series is None or not len(series):
+                line.set_data([], [])
+                continue
+            t, value, low, high = series.arrays()
+            hours = (t - t[0]) / 3600
+            line.set_data(hours, value)
+            self.bands.append(ax.fill_between(hours, low, high, color=line.get_color(), alpha=0.2, linewidth=0))
+            ax.relim()
+            ax.autoscale_view()
+        self.equity_ax.set_xlabel("Hours")
+        self.canvas.draw_idle()
+
+
 class BotControlWidget(QWidget):
+    # Bot threads never touch widgets: their log lines and prices go into
+    # an EventQueue, and timers on the GUI thread drain it in batches and
+    # redraw the chart at most once a second.
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
-        self.log_output = QTextEdit()
+        self.events = EventQueue()
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(LOG_LINES)
+        self.chart = ChartWidget()
+        self.prices = {}  # symbol -> Series
+        self.last_price = {}  # symbol -> latest price
+        self.coins = {}  # bot key -> (symbol, coin)
+        self.equity = Series()
+        self.chart_dirty = False
+        self.starter = None  # thread setting the bot up; kept once the bot runs, so it only starts once
         self.init_ui()
 
+        self.drain_timer = QTimer(self)
+        self.drain_timer.timeout.connect(self.drain)
+        self.drain_timer.start(DRAIN_MS)
+        self.chart_timer = QTimer(self)
+        self.chart_timer.timeout.connect(self.redraw)
+        self.chart_timer.start(CHART_MS)
+
     def init_ui(self):
         layout = QVBoxLayout()
 
@@ -55,8 +132,15 @@ class BotControlWidget(QWidget):
         self.sell_threshold = QSpinBox()
         self.sell_threshold.setValue(10)
 
-        start_btn = QPushButton("Start Bot")
-        start_btn.clicked.connect(self.start_bot)
+        self.fees = QCheckBox("Binance fees and spread")
+        self.fees.setChecked(True)
+
+        self.start_btn = QPushButton("Start Bot")
+        self.start_btn.clicked.connect(self.start_bot)
+
+        self.chart_symbol = QComboBox()
+        self.chart_symbol.currentTextChanged.connect(lambda _: self.redraw(force=True))
+        self.status = QLabel("")
 
         layout.addWidget(QLabel("Strategy"))
         layout.addWidget(self.strategy_selector)
@@ -64,36 +148,318 @@ class BotControlWidget(QWidget):
         layout.addWidget(self.buy_threshold)
         layout.addWidget(QLabel("Sell Threshold % (Simple)"))
         layout.addWidget(self.sell_threshold)
-        layout.addWidget(start_btn)
+        layout.addWidget(self.fees)
+        layout.addWidget(self.start_btn)
+        chart_row = QHBoxLayout()
+        chart_row.addWidget(QLabel("Chart"))
+        chart_row.addWidget(self.chart_symbol, 1)
+        layout.addLayout(chart_row)
+        layout.addWidget(self.chart, 2)
         layout.addWidget(QLabel("Log"))
-        layout.addWidget(self.log_output)
+        layout.addWidget(self.log_output, 1)
+        layout.addWidget(self.status)
 
         self.setLayout(layout)
 
     def log(self, msg):
-        log_action(self.log_output, msg)
+        self.events.log(msg)
+
+    def drain(self):
+        lines, ticks = coalesce(self.events.drain(DRAIN_BATCH))
+        if lines:
+            self.log_output.appendPlainText("\n".join(log_line(message, when) for when, message in lines))
+        if not ticks:
+            return
+        latest = {}
+        for _, when, key, symbol, price, coin in ticks:
+            if when >= latest.get(symbol, (0,))[0]:
+                latest[symbol] = (when, price)
+            self.coins[key] = (symbol, coin)
+        for symbol, (when, price) in latest.items():
+            if symbol not in self.prices:
+                self.prices[symbol] = Series()
+                self.chart_symbol.addItem(symbol)
+            self.prices[symbol].append(when, price)
+            self.last_price[symbol] = price
+        portfolio = self.parent.portfolio
+        if portfolio is not None:
+            held = sum(coin * self.last_price[symbol] for symbol, coin in self.coins.values())
+            self.equity.append(time.time(), portfolio.budget.cash + held)
+        self.chart_dirty = True
+
+    def redraw(self, force=False):
+        self.start_btn.setEnabled(self.starter is None)
+        self.fees.setEnabled(self.starter is None)
+        self.status.setText(f"{len(self.coins)} bots | {len(self.events)} events queued | "
+                            f"{self.events.dropped} dropped")
+        if not (self.chart_dirty or force) or not self.isVisible():
+            return
+        self.chart_dirty = False
+        self.chart.draw(self.prices.get(self.chart_symbol.currentText()), self.equity)
 
     def start_bot(self):
-        strat_name = self.strategy_selector.currentText()
-        if strat_name == "Simple":
-            strategy = SimpleStrategy(
-                buy_threshold=self.buy_threshold.value() / 100,
-                sell_threshold=self.sell_threshold.value() / 100
-            )
+        # Loading candles and connecting to Binance can take seconds, so the
+        # setup runs on a thread; the button stays off until it fails.
+        if self.starter is not None:
+            return
+        self.start_btn.setEnabled(False)
+        settings = (self.strategy_selector.currentText(), self.buy_threshold.value() / 100,
+                    self.sell_threshold.value() / 100, COSTS if self.fees.isChecked() else None)
+        self.starter = threading.Thread(target=self.setup_bot, args=settings, daemon=True)
+        self.starter.start()
+
+    def setup_bot(self, strat_name, buy_threshold, sell_threshold, costs):
+        try:
+            if strat_name == "Simple":
+                strategy = SimpleStrategy(buy_threshold=buy_threshold, sell_threshold=sell_threshold)
+            else:
+                from candles import load_data
+                df = load_data("btc_usdt_1y.csv")
+                strategy = SmartStrategy(df)
+
+            # Every bot runs on the window's shared portfolio runtime: one thread,
+            # one price stream and one HTTP connection pool for all of them. Its
+            # state is journaled, so restarting the GUI resumes open positions.
+            # Paper fills pay the same fees and spread as the backtests.
+            if self.parent.portfolio is None:
+                self.parent.portfolio = Portfolio(self.parent.api_key, self.parent.api_secret, store=StateStore(),
+                                                  on_tick=self.events.tick, costs=costs)
+            self.parent.portfolio.add("BTCUSDT", strategy, limit_usd=1000, deposit_usd=1000)
+            self.parent.portfolio.start(self.log)
+        except Exception as e:
+            self.log(f"❌ Could not start the bot: {e}")
+            self.starter = None
+
+class BacktestWidget(QWidget):
+    # Backtests, rolling windows, Monte Carlo runs and sweeps on a JobRunner
+    # process pool. The GUI thread only submits specs and polls the jobs on
+    # a timer; progress and the summary follow each job's results as they
+    # come in, the chart at most once a second.
+    def __init__(self):
+        super().__init__()
+        self.runner = JobRunner()
+        self.seen = {}  # job id -> (version, status) shown in the list
+        self.shown = None  # (job id, version) in the summary and chart
+        self.latest = None  # summary the chart has not drawn yet
+        self.init_ui()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(JOBS_MS)
+        self.chart_timer = QTimer(self)
+        self.chart_timer.timeout.connect(self.redraw)
+        self.chart_timer.start(CHART_MS)
+
+    def init_ui(self):
+        form = QFormLayout()
+        self.mode = QComboBox()
+        self.mode.addItems(["Backtest", "Rolling", "Monte Carlo", "Sweep"])
+        self.data_file = QLineEdit("btc_usdt_5y.csv")
+        self.strategy = QComboBox()
+        self.strategy.addItems(["LevelGridStrategy", "GridStrategy"])
+        self.grid_size = QDoubleSpinBox()
+        self.grid_size.setRange(0.1, 50)
+        self.grid_size.setValue(5)
+        self.max_levels = QSpinBox()
+        self.max_levels.setRange(1, 1000)
+        self.max_levels.setValue(20)
+        self.max_drawdown = QDoubleSpinBox()
+        self.max_drawdown.setRange(1, 100)
+        self.max_drawdown.setValue(30)
+        self.window_days = QSpinBox()
+        self.window_days.setRange(2, 100000)
+        self.window_days.setValue(30)
+        self.step_days = QSpinBox()
+        self.step_days.setRange(1, 100000)
+        self.step_days.setValue(15)
+        self.simulations = QSpinBox()
+        self.simulations.setRange(1, 10000000)
+        self.simulations.setValue(1000)
+        self.method = QComboBox()
+        self.method.addItems(["history", "bootstrap", "gbm", "garch"])
+        self.seed = QLineEdit()
+        self.sweep_grid_sizes = QLineEdit("1, 2, 3, 5, 8, 10")
+        self.sweep_levels = QLineEdit("5, 10, 20")
+        self.sweep_drawdowns = QLineEdit("10, 30, 50, 100")
+        self.fees = QCheckBox("Binance fees and spread")
+        self.fees.setChecked(True)
+
+        form.addRow("Mode", self.mode)
+        form.addRow("Data file", self.data_file)
+        form.addRow("Strategy (Backtest, Sweep)", self.strategy)
+        form.addRow("Grid size %", self.grid_size)
+        form.addRow("Max levels", self.max_levels)
+        form.addRow("Max drawdown %", self.max_drawdown)
+        form.addRow("Window (candles)", self.window_days)
+        form.addRow("Step (candles, Rolling)", self.step_days)
+        form.addRow("Simulations", self.simulations)
+        form.addRow("Paths (Monte Carlo)", self.method)
+        form.addRow("Seed (optional)", self.seed)
+        form.addRow("Sweep grid sizes %", self.sweep_grid_sizes)
+        form.addRow("Sweep max levels", self.sweep_levels)
+        form.addRow("Sweep drawdowns %", self.sweep_drawdowns)
+        form.addRow(self.fees)
+
+        run_btn = QPushButton("Run")
+        run_btn.clicked.connect(self.run_job)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.cancel_job)
+        buttons = QHBoxLayout()
+        buttons.addWidget(run_btn)
+        buttons.addWidget(cancel_btn)
+
+        self.job_list = QListWidget()
+        self.job_list.currentRowChanged.connect(self.select_job)
+        self.progress = QProgressBar()
+        self.summary = QPlainTextEdit()
+        self.summary.setReadOnly(True)
+        self.summary.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))  # sweep tables line up
+        self.figure = Figure(figsize=(6, 3), layout="constrained")
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.canvas.setMinimumHeight(200)
+        self.ax = self.figure.add_subplot(111)
+
+        left = QVBoxLayout()
+        left.addLayout(form)
+        left.addLayout(buttons)
+        left.addWidget(QLabel("Jobs"))
+        left.addWidget(self.job_list, 1)
+        right = QVBoxLayout()
+        right.addWidget(self.progress)
+        right.addWidget(self.canvas, 2)
+        right.addWidget(self.summary, 1)
+        layout = QHBoxLayout()
+        layout.addLayout(left)
+        layout.addLayout(right, 1)
+        self.setLayout(layout)
+
+    def spec(self):
+        mode = self.mode.currentText()
+        params = {"grid_size": self.grid_size.value() / 100, "max_levels": self.max_levels.value(),
+                  "max_drawdown": self.max_drawdown.value() / 100}
+        spec = {"data": self.data_file.text().strip(), "budget_usd": 1000, "params": params,
+                "costs": COSTS if self.fees.isChecked() else None}
+        if mode == "Backtest":
+            spec.update(kind="backtest", strategy=self.strategy.currentText())
+        elif mode == "Rolling":
+            spec.update(kind="rolling", window_days=self.window_days.value(), step_days=self.step_days.value())
+        elif mode == "Monte Carlo":
+            seed = self.seed.text().strip()
+            spec.update(kind="montecarlo", window_days=self.window_days.value(), simulations=self.simulations.value(),
+                        method=self.method.currentText(), seed=int(seed) if seed else None)
         else:
-            from backtest import load_data
-            df = load_data()
-            strategy = SmartStrategy(df)
+            numbers = lambda box, scale: [float(v) / scale for v in box.text().replace(",", " ").split()]
+            grid = {"grid_size": numbers(self.sweep_grid_sizes, 100),
+                    "max_levels": [int(v) for v in numbers(self.sweep_levels, 1)],
+                    "max_drawdown": numbers(self.sweep_drawdowns, 100)}
+            spec.update(kind="sweep", strategy=self.strategy.currentText(), param_grid=grid)
+        return spec
+
+    def run_job(self):
+        try:
+            spec = self.spec()
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", f"Invalid number: {e}")
+            return
+        job = self.runner.submit(spec)
+        self.job_list.addItem(f"#{job.id} {self.mode.currentText()}")
+        self.job_list.setCurrentRow(self.job_list.count() - 1)
+
+    def selected_job(self):
+        row = self.job_list.currentRow()
+        if row < 0:
+            return None
+        return list(self.runner.jobs.values())[row]
+
+    def select_job(self, row):
+        self.poll()
+        self.redraw()
+
+    def cancel_job(self):
+        job = self.selected_job()
+        if job is not None:
+            job.cancel()
 
-        bot = TradingBot(self.parent.api_key, self.parent.api_secret, strategy)
-        thread = threading.Thread(target=bot.run, args=(self.log,), daemon=True)
-        thread.start()
+    def poll(self):
+        for row, job in enumerate(self.runner.jobs.values()):
+            if self.seen.get(job.id) != (job.version, job.status):
+                self.seen[job.id] = (job.version, job.status)
+                self.job_list.item(row).setText(f"#{job.id} {job.spec['kind']} — {job.status} "
+                                                f"({job.done}/{job.total or '?'})")
+        job = self.selected_job()
+        if job is None or self.shown == (job.id, job.version) or not self.isVisible():
+            return
+        self.shown = (job.id, job.version)
+        summary = job.summary()
+        self.progress.setMaximum(job.total or 0)
+        self.progress.setValue(job.done)
+        self.summary.setPlainText(self.describe(summary))
+        self.latest = summary
+
+    def redraw(self):
+        if self.latest is None or not self.isVisible():
+            return
+        self.plot(self.latest)
+        self.latest = None
+
+    def describe(self, summary):
+        lines = [f"{summary['kind']} — {summary['status']}, {summary['chunks']}/{summary['total'] or '?'} chunks "
+                 f"in {summary['elapsed']:.1f}s"]
+        if "error" in summary:
+            lines.append(f"❌ {summary['error']}")
+        kind = summary["kind"]
+        if kind == "backtest" and "profit" in summary:
+            lines.append(f"Net profit: ${summary['profit']:.2f} | Trades: {summary['trades']} | "
+                         f"Max drawdown: {summary['max_drawdown'] * 100:.1f}% | Sharpe: {summary['sharpe']:.2f} | "
+                         f"Win rate: {summary['win_rate'] * 100:.1f}%")
+        elif kind == "rolling" and "windows" in summary:
+            lines.append(f"Windows: {len(summary['windows'])} | Total profit: ${summary['total_profit']:.2f} | "
+                         f"Profitable: {summary['win_rate'] * 100:.1f}%")
+        elif kind == "montecarlo" and "profits" in summary:
+            lines.append(f"Simulations: {summary['simulations']} | Avg: ${summary['mean']:.2f} | "
+                         f"Median: ${summary['median']:.2f} | Win rate: {summary['win_rate'] * 100:.1f}%")
+            for level, tail in summary["tails"].items():
+                lines.append(f"VaR {level:.0%}: ${tail['var']:.2f} (expected shortfall ${tail['cvar']:.2f})")
+        elif kind == "sweep" and "table" in summary:
+            lines.append(f"Configs: {summary['configs']}, best first:")
+            lines.append(summary["table"].head(20).to_string(index=False))
+        return "\n".join(lines)
+
+    def plot(self, summary):
+        ax = self.ax
+        ax.clear()
+        kind = summary["kind"]
+        if kind == "backtest" and "equity" in summary:
+            stride = max(1, len(summary["equity"]) // CHART_POINTS)
+            ax.plot(summary["dates"][::stride], summary["equity"][::stride], color="tab:green")
+            ax.set_ylabel("Equity ($)")
+        elif kind == "rolling" and "windows" in summary:
+            windows = summary["windows"]
+            profits = windows["profit"].to_numpy()
+            ax.bar(np.arange(len(profits)), profits, color=np.where(profits >= 0, "green", "red"))
+            ax.set_xlabel(f"Window ({windows['start'].iloc[0]:%Y-%m-%d} onwards)")
+            ax.set_ylabel("Net Profit ($)")
+        elif kind == "montecarlo" and "profits" in summary:
+            counts, edges = np.histogram(summary["profits"], bins=40)
+            ax.stairs(counts, edges, fill=True, color="skyblue", edgecolor="k")
+            ax.axvline(summary["mean"], color="green", linestyle="--", label=f"Mean (${summary['mean']:.2f})")
+            ax.legend()
+            ax.set_xlabel("Net Profit ($)")
+        elif kind == "sweep" and "table" in summary:
+            table = summary["table"]
+            ax.scatter(table["grid_size"] * 100, table["profit"], c=table["max_drawdown"] * 100, s=12)
+            ax.set_xlabel("Grid size %")
+            ax.set_ylabel("Net Profit ($)")
+        ax.grid(True)
+        self.canvas.draw_idle()
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.api_key = None
         self.api_secret = None
+        self.portfolio = None
+        self.backtest_widget = None
         self.init_ui()
 
     def init_ui(self):
@@ -104,11 +470,22 @@ class MainWindow(QMainWindow):
     def show_main(self):
         self.tabs = QTabWidget()
         self.tabs.addTab(BotControlWidget(self), "Live Trading")
+        self.backtest_widget = BacktestWidget()
+        self.tabs.addTab(self.backtest_widget, "Backtest")
         self.setCentralWidget(self.tabs)
 
+    def closeEvent(self, event):
+        if self.backtest_widget is not None:
+            self.backtest_widget.runner.shutdown()
+        # Stops the bots and writes a final state snapshot before the
+        # process (and the portfolio's daemon thread) goes away.
+        if self.portfolio is not None:
+            self.portfolio.stop()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
-    window.resize(600, 400)
+    window.resize(800, 800)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
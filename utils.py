@@ -1,5 +1,6 @@
 from datetime import datetime
 
-def log_action(widget, message):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    widget.append(f"[{timestamp}] {message}")
+def log_line(message, when=None):
+    # when is a time.time() stamp, e.g. from events.EventQueue.log; now if missing.
+    stamp = datetime.now() if when is None else datetime.fromtimestamp(when)
+    return f"[{stamp.strftime('%Y-%m-%d %H:%M:%S')}] {message}"
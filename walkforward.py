@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from strategies import GridStrategy, AdaptiveDCARecoveryStrategy
+import engine
+import parallel
+import cache
+from sweep import run_sweep
+from candles import load_data
+
+
+def _search_fold(task):
+    start, end, param_grid, strategy_cls, budget_usd, invest_fraction, costs = task
+    close = parallel.get_array("close")
+    volume = parallel.get_volume()
+    return run_sweep(close[start:end], param_grid, strategy_cls, budget_usd, invest_fraction, costs=costs,
+                     volume=None if volume is None else volume[start:end])
+
+
+class WalkForwardOptimizer:
+    # At every step the whole parameter grid is swept on the in-sample window
+    # and the best config is traded on the out-of-sample window right after
+    # it. Out-of-sample folds are chained, each starting with the previous
+    # fold's final value, to give one stitched equity curve.
+    def __init__(self, df, param_grid, strategy_cls=GridStrategy, in_sample_days=180, out_sample_days=30,
+                 budget_usd=1000, invest_fraction=0.2, objective="profit", anchored=False, workers=1,
+                 use_cache=True, costs=None):
+        self.df = df
+        self.param_grid = param_grid
+        self.strategy_cls = strategy_cls
+        self.in_sample_days = in_sample_days
+        self.out_sample_days = out_sample_days
+        self.initial_budget = budget_usd
+        self.invest_fraction = invest_fraction
+        self.objective = objective  # sweep column to maximize
+        self.anchored = anchored  # in-sample windows all start at the first candle
+        self.workers = workers  # None or 0 uses every core
+        self.costs = costs  # costs.CostModel charged on every fill, in and out of sample
+        ohlc = engine.ohlcv_arrays(df)
+        self.close = ohlc["close"]
+        self.volume = ohlc.get("volume")
+        # Full sweep tables by in-sample window, kept across runs so
+        # overlapping fold layouts or another objective cost no new sweeps.
+        # The disk cache also lets an interrupted run pick up where it stopped.
+        self.searches = {}
+        self.cache = cache.ResultCache() if use_cache else None
+        self.folds = []
+        self.equity = None
+
+    def fold_windows(self):
+        windows = []
+        test_start = self.in_sample_days
+        while test_start + self.out_sample_days <= len(self.close):
+            train_start = 0 if self.anchored else test_start - self.in_sample_days
+            windows.append((train_start, test_start, test_start + self.out_sample_days))
+            test_start += self.out_sample_days
+        return windows
+
+    def search_key(self, start, end):
+        return cache.make_key("sweep", data=cache.fingerprint(self.close[start:end]), grid=self.param_grid,
+                              strategy=self.strategy_cls.__name__, budget=self.initial_budget,
+                              invest_fraction=self.invest_fraction,
+                              **cache.cost_parts(self.costs, self.close[start:end],
+                                                 None if self.volume is None else self.volume[start:end]))
+
+    def search(self, windows):
+        missing = sorted({(start, end) for start, end, _ in windows} - set(self.searches))
+        if self.cache is not None:
+            for window in list(missing):
+                table = self.cache.get(self.search_key(*window))
+                if table is not None:
+                    self.searches[window] = table
+                    missing.remove(window)
+
+        tasks = [(start, end, self.param_grid, self.strategy_cls, self.initial_budget, self.invest_fraction,
+                  self.costs) for start, end in missing]
+        arrays = parallel.series_arrays(self.close, self.volume, self.costs)
+        tables = parallel.map_shared(_search_fold, tasks, arrays, self.workers)
+        for window, table in zip(missing, tables):
+            self.searches[window] = table
+            if self.cache is not None:
+                self.cache.put(self.search_key(*window), table)
+
+    def run(self):
+        windows = self.fold_windows()
+        self.search(windows)
+        dates = self.df["date"].array
+        budget = self.initial_budget
+        curves = []
+        self.folds = []
+
+        for train_start, test_start, test_end in windows:
+            table = self.searches[(train_start, test_start)]
+            best = table[self.objective].idxmax()
+            config = table.loc[[best], list(self.param_grid)].to_dict("records")[0]
+
+            close = self.close[test_start:test_end]
+            volume = None if self.volume is None else self.volume[test_start:test_end]
+            result = cache.run_backtest({"close": close, "volume": volume}, self.strategy_cls(**config), budget,
+                                        self.invest_fraction, costs=self.costs)
+            curves.append(engine.equity_curve(close, result, budget)["equity"])
+            self.folds.append({
+                "train_start": dates[train_start],
+                "test_start": dates[test_start],
+                "test_end": dates[test_end - 1],
+                "config": config,
+                "in_sample_return": table.at[best, "profit"] / self.initial_budget,
+                "out_sample_return": result["final_value"] / budget - 1,
+                "trades": len(result["trade_index"]),
+            })
+            # Open positions are marked to market at the end of the fold.
+            budget = result["final_value"]
+
+        if not windows:
+            self.equity = pd.DataFrame(columns=["date", "strategy", "buy_hold"])
+            return
+        first, last = windows[0][1], windows[-1][2]
+        self.equity = pd.DataFrame({
+            "date": dates[first:last],
+            "strategy": np.concatenate(curves),
+            "buy_hold": self.initial_budget * self.close[first:last] / self.close[first],
+        })
+
+    def report(self):
+        print(f"📊 Walk-Forward Report ({len(self.folds)} folds, {self.strategy_cls.__name__})")
+        print("--------------------------------------------------")
+        for i, fold in enumerate(self.folds):
+            params = ", ".join(f"{k}={v}" for k, v in fold["config"].items())
+            print(f"Fold {i+1}: {fold['test_start'].date()} → {fold['test_end'].date()} | {params} | "
+                  f"In-sample: {fold['in_sample_return'] * 100:.1f}% | Out-of-sample: {fold['out_sample_return'] * 100:.1f}% | "
+                  f"Trades: {fold['trades']}")
+        print("--------------------------------------------------")
+        if self.folds:
+            final = self.equity["strategy"].iloc[-1]
+            print(f"Walk-forward final value: ${final:.2f} ({(final / self.initial_budget - 1) * 100:.1f}%)")
+            print(f"Buy & hold final value:   ${self.equity['buy_hold'].iloc[-1]:.2f}")
+            self.plot()
+
+    def plot(self, path=None):
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(14, 6))
+        plt.plot(self.equity["date"], self.equity["strategy"], label="Walk-forward (out-of-sample)")
+        plt.plot(self.equity["date"], self.equity["buy_hold"], label="Buy & hold", alpha=0.6)
+        for fold in self.folds:
+            plt.axvline(fold["test_start"], color="gray", alpha=0.2)
+        plt.title("Walk-Forward Equity Curve")
+        plt.xlabel("Date")
+        plt.ylabel("Value ($)")
+        plt.grid(True)
+        plt.legend()
+        plt.tight_layout()
+        if path is None:
+            plt.show()
+        else:
+            plt.savefig(path)
+            plt.close()
+
+
+if __name__ == "__main__":
+    df = load_data("btc_usdt_5y.csv")
+    param_grid = {
+        "grid_size": np.round(np.arange(0.01, 0.21, 0.01), 2),
+        "max_levels": [20],
+        "max_drawdown": np.round(np.arange(0.05, 1.01, 0.05), 2),
+    }
+    optimizer = WalkForwardOptimizer(df, param_grid, GridStrategy, in_sample_days=180, out_sample_days=30, workers=None)
+    optimizer.run()
+    optimizer.report()
+
+    dca_grid = {
+        "buy_threshold": np.round(np.arange(0.02, 0.21, 0.02), 2),
+        "sell_threshold": np.round(np.arange(0.02, 0.21, 0.02), 2),
+        "max_drawdown": [0.2, 0.3, 0.5],
+    }
+    optimizer = WalkForwardOptimizer(df, dca_grid, AdaptiveDCARecoveryStrategy, invest_fraction=0.5, workers=None)
+    optimizer.run()
+    optimizer.report()